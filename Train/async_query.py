@@ -0,0 +1,102 @@
+from asgiref.sync import sync_to_async
+from .models import Train, RailwayCompany, TrainHall, Station
+from .pagination import apaginate, page_size, TRAIN_ORDERING, ID_ORDERING, MAX_PAGE_SIZE
+from .loaders import get_loaders
+from .search import search_trains, search_trains_by_place
+from .reference_data import reference_data
+from .station_suggest import station_index
+from .inventory import availability
+from .query import (
+    TrainQueries, RailwayCompanyQueries, TrainHallQueries, StationQueries, SeatInventoryQueries, JourneyQueries,
+    TrainConnection, RailwayCompanyConnection, TrainHallConnection, StationConnection,
+    TrainSortField, with_selected_columns, plan_journeys,
+)
+
+
+# Async Query Classes: same fields as the sync ones, resolved with Django's async ORM.
+# Used by the async GraphQL endpoint, where sibling fields resolve concurrently.
+class AsyncTrainQueries(TrainQueries):
+    async def resolve_all_trains(self, info, first=None, after=None):
+        queryset = with_selected_columns(Train.objects.all(), info, 'edges', 'node')
+        connection = await apaginate(queryset, TrainConnection, TRAIN_ORDERING, first=first, after=after)
+        get_loaders(info).prime_trains(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_train_by_number(self, info, train_number):
+        try:
+            return await with_selected_columns(Train.objects.all(), info).aget(train_number=train_number)
+        except Train.DoesNotExist:
+            return None
+
+    async def resolve_search_trains(self, info, departure_station, arrival_station, date,
+                                    time_window=None, sort_by=TrainSortField.DEPARTURE_TIME.value, first=None):
+        time_window = time_window or {}
+        queryset = search_trains(
+            departure_station, arrival_station, date,
+            start_time=time_window.get('start'),
+            end_time=time_window.get('end'),
+            sort_by=sort_by,
+        )
+        queryset = with_selected_columns(queryset, info)
+        return get_loaders(info).prime_trains([train async for train in queryset[:page_size(first)]])
+
+    async def resolve_search_trains_by_place(self, info, date, time_window=None,
+                                             sort_by=TrainSortField.DEPARTURE_TIME.value, first=None, **places):
+        time_window = time_window or {}
+        queryset = search_trains_by_place(
+            date,
+            start_time=time_window.get('start'),
+            end_time=time_window.get('end'),
+            sort_by=sort_by,
+            **places,
+        )
+        queryset = with_selected_columns(queryset, info)
+        return get_loaders(info).prime_trains([train async for train in queryset[:page_size(first)]])
+
+
+class AsyncRailwayCompanyQueries(RailwayCompanyQueries):
+    async def resolve_all_railway_companies(self, info, first=None, after=None):
+        connection = await apaginate(RailwayCompany.objects.all(), RailwayCompanyConnection, ID_ORDERING, first=first, after=after)
+        get_loaders(info).prime_railway_companies(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_railway_company_by_name(self, info, railway_name):
+        return await sync_to_async(reference_data.railway_company_by_name)(railway_name)
+
+
+class AsyncTrainHallQueries(TrainHallQueries):
+    async def resolve_all_train_halls(self, info, first=None, after=None):
+        connection = await apaginate(TrainHall.objects.all(), TrainHallConnection, ID_ORDERING, first=first, after=after)
+        get_loaders(info).prime_train_halls(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_train_hall_by_name(self, info, hall_name):
+        return await sync_to_async(reference_data.train_hall_by_name)(hall_name)
+
+
+class AsyncStationQueries(StationQueries):
+    async def resolve_all_stations(self, info, first=None, after=None):
+        connection = await apaginate(Station.objects.all(), StationConnection, ID_ORDERING, first=first, after=after)
+        get_loaders(info).prime_stations(edge.node for edge in connection.edges)
+        return connection
+
+    async def resolve_station_by_name(self, info, station_name):
+        return await sync_to_async(reference_data.station_by_name)(station_name)
+
+    async def resolve_station_suggest(self, info, prefix, limit=10):
+        return await sync_to_async(station_index.suggest)(prefix, limit)
+
+
+class AsyncSeatInventoryQueries(SeatInventoryQueries):
+    async def resolve_seat_availability(self, info, train_ids):
+        if len(train_ids) > MAX_PAGE_SIZE:
+            raise Exception(f"At most {MAX_PAGE_SIZE} trains can be checked at once.")
+        inventories = await sync_to_async(availability)(train_ids)
+        return [inventories[train_id] for train_id in train_ids if train_id in inventories]
+
+
+class AsyncJourneyQueries(JourneyQueries):
+    async def resolve_plan_journey(self, info, from_station, to_station, depart_after, max_transfers=2, min_transfer_time=15):
+        return await sync_to_async(plan_journeys)(
+            info, from_station, to_station, depart_after, max_transfers, min_transfer_time
+        )
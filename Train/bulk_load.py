@@ -0,0 +1,153 @@
+import csv
+import io
+from functools import partial
+from itertools import islice
+from django.db import connection, transaction
+from .inventory import ensure_inventory
+from .models import Train
+from .timetable import timetable_replaced
+
+# Train columns written by the bulk loader, in the order of the row tuples
+TRAIN_COLUMNS = (
+    'train_number', 'departure_datetime', 'arrival_datetime',
+    'departure_station_id', 'arrival_station_id', 'railway_company_id',
+    'train_type', 'capacity', 'hall_id', 'stars',
+    'base_price', 'tax', 'discount', 'final_price',
+)
+
+# Rows serialized per buffer refill and bytes handed to COPY per read
+COPY_BUFFER_ROWS = 2000
+COPY_READ_SIZE = 1 << 16
+
+
+class CopyBuffer:
+    """
+    File-like object streaming rows as CSV text for COPY ... FROM STDIN.
+
+    Rows are serialized COPY_BUFFER_ROWS at a time, so memory stays flat
+    however many rows the iterator yields.
+    """
+    def __init__(self, rows, progress=None):
+        self.rows = iter(rows)
+        self.progress = progress
+        self.count = 0
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.pending = ''
+
+    def _fill(self):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        written = 0
+        for row in self.rows:
+            self.writer.writerow(row)
+            written += 1
+            if written >= COPY_BUFFER_ROWS:
+                break
+        if written:
+            self.count += written
+            if self.progress is not None:
+                self.progress(self.count)
+        return self.buffer.getvalue()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            chunk = self._fill()
+            if not chunk:
+                break
+            self.pending += chunk
+        if size < 0:
+            data, self.pending = self.pending, ''
+        else:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def chunks(self):
+        while True:
+            chunk = self._fill()
+            if not chunk:
+                return
+            yield chunk
+
+
+def copy_supported():
+    return connection.vendor == 'postgresql'
+
+
+def _copy_trains(rows, progress):
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(Train._meta.get_field(name).column) for name in TRAIN_COLUMNS)
+    sql = f"COPY {quote(Train._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    stream = CopyBuffer(rows, progress)
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            # psycopg2
+            raw_cursor.copy_expert(sql, stream, size=COPY_READ_SIZE)
+        else:
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                for chunk in stream.chunks():
+                    copy.write(chunk)
+    return stream.count
+
+
+def _adapter(field):
+    """Return the function converting a Python value to a database parameter for `field`."""
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateTimeField':
+        return connection.ops.adapt_datetimefield_value
+    if internal_type == 'DecimalField':
+        return partial(connection.ops.adapt_decimalfield_value,
+                       max_digits=field.max_digits, decimal_places=field.decimal_places)
+    return None
+
+
+def _insert_trains(rows, chunk_size, progress):
+    # executemany() with values adapted per column: the per-object work of
+    # bulk_create() (model instances, SQL compiled per batch) dominates at this volume
+    quote = connection.ops.quote_name
+    fields = [Train._meta.get_field(name) for name in TRAIN_COLUMNS]
+    adapters = [(index, adapter) for index, adapter in enumerate(map(_adapter, fields)) if adapter]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(Train._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+
+    def adapt(row):
+        row = list(row)
+        for index, adapter in adapters:
+            row[index] = adapter(row[index])
+        return row
+
+    count = 0
+    with connection.cursor() as cursor:
+        while True:
+            chunk = [adapt(row) for row in islice(rows, chunk_size)]
+            if not chunk:
+                return count
+            cursor.executemany(sql, chunk)
+            count += len(chunk)
+            if progress is not None:
+                progress(count)
+
+
+def load_trains(rows, chunk_size=5000, progress=None):
+    """
+    Insert train rows (tuples in TRAIN_COLUMNS order, `final_price` included)
+    in one transaction and return how many were loaded.
+
+    On PostgreSQL the rows are streamed with COPY; other databases (SQLite
+    in development) fall back to chunked bulk inserts. Model signals do not
+    run, so the search index and search table have to be refreshed afterwards; seat inventories
+    are created and journey planner timetables rebuilt here.
+    """
+    with transaction.atomic():
+        if copy_supported():
+            count = _copy_trains(rows, progress)
+        else:
+            count = _insert_trains(iter(rows), chunk_size, progress)
+        ensure_inventory()
+        timetable_replaced()
+    return count
@@ -1,123 +1,113 @@
-# from django_elasticsearch_dsl import Document, fields
-# from django_elasticsearch_dsl.registries import registry
-# from .models import Train, TrainHall, RailwayCompany, Station
-#
-#
-# @registry.register_document
-# class StationDocument(Document):
-#     """
-#     Elasticsearch Document for Station Model
-#     """
-#     class Index:
-#         name = 'stations'  # Index name in Elasticsearch
-#
-#     class Django:
-#         model = Station  # Model being mapped to this Document
-#
-#         # Fields to be indexed in Elasticsearch
-#         fields = [
-#             'station_name',
-#             'station_city',
-#             'station_province',
-#         ]
-#
-#         ignore_signals = False  # Enable signals to sync changes
-#         auto_refresh = True  # Automatically refresh the index
-#
-#
-# @registry.register_document
-# class RailwayCompanyDocument(Document):
-#     """
-#     Elasticsearch Document for RailwayCompany Model
-#     """
-#     class Index:
-#         name = 'railway_companies'  # Index name in Elasticsearch
-#
-#     class Django:
-#         model = RailwayCompany  # Model being mapped to this Document
-#
-#         # Fields to be indexed in Elasticsearch
-#         fields = [
-#             'railway_name',
-#             'railway_description',
-#             'refund_policy',
-#         ]
-#
-#         ignore_signals = False  # Enable signals to sync changes
-#         auto_refresh = True  # Automatically refresh the index
-#
-#
-# @registry.register_document
-# class TrainHallDocument(Document):
-#     """
-#     Elasticsearch Document for TrainHall Model
-#     """
-#     class Index:
-#         name = 'train_halls'  # Index name in Elasticsearch
-#
-#     class Django:
-#         model = TrainHall  # Model being mapped to this Document
-#
-#         # Fields to be indexed in Elasticsearch
-#         fields = [
-#             'hall_name',
-#             'hall_description',
-#         ]
-#
-#         ignore_signals = False  # Enable signals to sync changes
-#         auto_refresh = True  # Automatically refresh the index
-#
-#
-# @registry.register_document
-# class TrainDocument(Document):
-#     """
-#     Elasticsearch Document for Train Model
-#     """
-#     # Related fields using ObjectField for foreign key relationships
-#     departure_station = fields.ObjectField(properties={
-#         'station_name': fields.TextField(),
-#         'station_code': fields.KeywordField(),
-#         'station_city': fields.TextField(),
-#     })
-#
-#     arrival_station = fields.ObjectField(properties={
-#         'station_name': fields.TextField(),
-#         'station_code': fields.KeywordField(),
-#         'station_city': fields.TextField(),
-#     })
-#
-#     railway_company = fields.ObjectField(properties={
-#         'railway_name': fields.TextField(),
-#         'railway_code': fields.KeywordField(),
-#     })
-#
-#     hall = fields.ObjectField(properties={
-#         'hall_name': fields.TextField(),
-#         'hall_description': fields.TextField(),
-#     })
-#
-#     class Index:
-#         name = 'trains'  # Index name in Elasticsearch
-#
-#     class Django:
-#         model = Train  # Model being mapped to this Document
-#
-#         # Fields to be indexed in Elasticsearch (including final_price)
-#         fields = [
-#             'train_number',
-#             'train_type',
-#             'capacity',
-#             'stars',
-#             'base_price',
-#             'tax',
-#             'discount',
-#             'final_price',
-#             'departure_datetime',
-#             'arrival_datetime',
-#         ]
-#
-#         # Related models that we want to include in the index
-#         related_models = ['Station', 'RailwayCompany', 'TrainHall']
-#
-#         ignore_signals = False  # Enable signals to sync changes to Elasticsearch
-#         auto_refresh = True  # Automatically refresh the index after changes
\ No newline at end of file
+from .models import Train, TrainHall, RailwayCompany, Station
+
+
+class Document:
+    """
+    Base search Document: maps one model to one search index.
+    """
+    index = None  # Index name in the search backend
+    model = None  # Model being mapped to this Document
+    fields = []  # Fields to be indexed
+
+    @classmethod
+    def get_queryset(cls):
+        return cls.model.objects.all()
+
+    @classmethod
+    def to_document(cls, instance):
+        return {field: getattr(instance, field) for field in cls.fields}
+
+
+class StationDocument(Document):
+    """
+    Search Document for Station Model
+    """
+    index = 'stations'
+    model = Station
+    fields = [
+        'station_name',
+        'station_city',
+        'station_province',
+    ]
+
+
+class RailwayCompanyDocument(Document):
+    """
+    Search Document for RailwayCompany Model
+    """
+    index = 'railway_companies'
+    model = RailwayCompany
+    fields = [
+        'railway_name',
+        'railway_description',
+        'refund_policy',
+    ]
+
+
+class TrainHallDocument(Document):
+    """
+    Search Document for TrainHall Model
+    """
+    index = 'train_halls'
+    model = TrainHall
+    fields = [
+        'hall_name',
+        'hall_description',
+    ]
+
+
+class TrainDocument(Document):
+    """
+    Search Document for Train Model
+    """
+    index = 'trains'
+    model = Train
+    # Fields to be indexed (including final_price)
+    fields = [
+        'train_number',
+        'train_type',
+        'capacity',
+        'stars',
+        'base_price',
+        'tax',
+        'discount',
+        'final_price',
+        'departure_datetime',
+        'arrival_datetime',
+    ]
+
+    @classmethod
+    def get_queryset(cls):
+        return Train.objects.select_related('departure_station', 'arrival_station', 'railway_company', 'hall')
+
+    @classmethod
+    def to_document(cls, instance):
+        document = super().to_document(instance)
+        # Related objects are embedded like ObjectFields
+        document['departure_station'] = {
+            'station_name': instance.departure_station.station_name,
+            'station_city': instance.departure_station.station_city,
+        }
+        document['arrival_station'] = {
+            'station_name': instance.arrival_station.station_name,
+            'station_city': instance.arrival_station.station_city,
+        }
+        document['railway_company'] = {
+            'railway_name': instance.railway_company.railway_name,
+        }
+        document['hall'] = {
+            'hall_name': instance.hall.hall_name,
+            'hall_description': instance.hall.hall_description,
+        }
+        return document
+
+
+# Documents by model label, and the Train foreign keys that embed each related model
+DOCUMENTS = {document.model._meta.label: document for document in (
+    StationDocument, RailwayCompanyDocument, TrainHallDocument, TrainDocument
+)}
+EMBEDDED_IN_TRAIN = {
+    Station._meta.label: ('departure_station', 'arrival_station'),
+    RailwayCompany._meta.label: ('railway_company',),
+    TrainHall._meta.label: ('hall',),
+}
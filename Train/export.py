@@ -0,0 +1,93 @@
+import csv
+import io
+import zlib
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Train
+
+# Rows fetched per round trip of the server-side cursor, and written per response chunk
+EXPORT_CHUNK_SIZE = getattr(settings, 'TIMETABLE_EXPORT_CHUNK_SIZE', 2000)
+
+# Export column -> Train lookup
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'train_number': 'train_number',
+    'departure_datetime': 'departure_datetime',
+    'arrival_datetime': 'arrival_datetime',
+    'departure_station_id': 'departure_station_id',
+    'departure_station': 'departure_station__station_name',
+    'departure_city': 'departure_station__station_city',
+    'arrival_station_id': 'arrival_station_id',
+    'arrival_station': 'arrival_station__station_name',
+    'arrival_city': 'arrival_station__station_city',
+    'railway_company_id': 'railway_company_id',
+    'railway_company': 'railway_company__railway_name',
+    'hall_id': 'hall_id',
+    'hall': 'hall__hall_name',
+    'train_type': 'train_type',
+    'capacity': 'capacity',
+    'stars': 'stars',
+    'base_price': 'base_price',
+    'tax': 'tax',
+    'discount': 'discount',
+    'final_price': 'final_price',
+    'updated_at': 'updated_at',
+}
+
+
+def export_rows(using, updated_since=None):
+    """
+    Yield the trains (changed since `updated_since`) as tuples in
+    EXPORT_COLUMNS order, with their station, company and hall names, from
+    a server-side cursor: memory stays flat whatever the number of rows.
+    """
+    trains = Train.objects.using(using)
+    if updated_since is not None:
+        trains = trains.filter(updated_at__gte=updated_since)
+    rows = trains.order_by('id').values_list(*EXPORT_COLUMNS.values())
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_chunks(rows):
+    """One JSON object per line."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    names = list(EXPORT_COLUMNS)
+    for batch in _batches(rows):
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in batch).encode('utf-8')
+
+
+def csv_chunks(rows):
+    """A header line, then one line per row (datetimes in ISO 8601)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _batches(rows):
+        writer.writerows(
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in row] for row in batch
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')  # Header of an empty export
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into one gzip stream, chunk by chunk."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
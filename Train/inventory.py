@@ -0,0 +1,226 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, router, transaction
+from django.db.models import BinaryField, Case, F, IntegerField, Value, When
+from django.utils import timezone
+from .models import Train, SeatInventory, SeatHold
+from .seat_map import decode, encode, mask_of, numbers_of
+
+# Seconds a hold keeps its seats before the sweeper returns them
+HOLD_TTL = getattr(settings, 'SEAT_HOLD_TTL', 600)
+# Longest hold a client may ask for (seconds)
+MAX_HOLD_TTL = getattr(settings, 'SEAT_HOLD_MAX_TTL', 3600)
+# Expired holds released per sweep step
+SWEEP_BATCH_SIZE = getattr(settings, 'SEAT_HOLD_SWEEP_BATCH_SIZE', 1000)
+
+
+# Every counter change below is a single conditional UPDATE (the condition
+# keeps the counters non-negative), never a read followed by a write, so
+# concurrent bookings cannot lose updates nor fail on a lost race. Bookings by
+# seat count only move counters; only bookings of chosen seats touch the seat
+# map, read with SELECT ... FOR UPDATE after their counter UPDATE has locked
+# the inventory row, so no other booking changes the map in between. The row
+# lock on a popular train is held only until the commit right after it.
+
+
+def ensure_inventory(train_ids=None):
+    """
+    Create missing inventory rows (all seats available), for the given trains
+    or for every train. Needed for trains inserted without signals (bulk loads).
+    Returns the number of rows created.
+    """
+    quote = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {quote(SeatInventory._meta.db_table)} (train_id, available, held, sold) "
+        f"SELECT t.id, t.capacity, 0, 0 FROM {quote(Train._meta.db_table)} t "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {quote(SeatInventory._meta.db_table)} i WHERE i.train_id = t.id)"
+    )
+    params = []
+    if train_ids is not None:
+        train_ids = list(train_ids)
+        if not train_ids:
+            return 0
+        sql += f" AND t.id IN ({', '.join(['%s'] * len(train_ids))})"
+        params = train_ids
+    if connection.vendor in ('postgresql', 'sqlite'):
+        sql += " ON CONFLICT DO NOTHING"  # Another request created the row meanwhile
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _move(train_id, seats, source, target):
+    """Move `seats` from one counter to another if `source` has enough of them."""
+    return SeatInventory.objects.filter(train_id=train_id, **{f"{source}__gte": seats}).update(**{
+        source: F(source) - seats,
+        target: F(target) + seats,
+    })
+
+
+def _take_seats(train_id, seats, target, seat_numbers=None):
+    """
+    Move `seats` from `available` to `target` and, when `seat_numbers` are
+    given, mark them taken on the seat map. Returns the mask of the marked seats.
+    """
+    moved = _move(train_id, seats, 'available', target)
+    if not moved and ensure_inventory([train_id]):
+        moved = _move(train_id, seats, 'available', target)  # A train loaded without its inventory row
+    if not moved:
+        if not Train.objects.filter(id=train_id).exists():
+            raise Exception("Train with this ID does not exist.")
+        raise Exception("Not enough seats available.")
+    if not seat_numbers:
+        return 0
+
+    seat_map, capacity = SeatInventory.objects.select_for_update(of=('self',)).filter(train_id=train_id).values_list(
+        'seat_map', 'train__capacity'
+    ).get()
+    taken = decode(seat_map)
+    mask = mask_of(seat_numbers, capacity)
+    if taken & mask:
+        raise Exception(f"Seat {numbers_of(taken & mask)[0]} is already taken.")
+    SeatInventory.objects.filter(train_id=train_id).update(seat_map=encode(taken | mask, capacity))
+    return mask
+
+
+def _free_seats(train_id, mask):
+    """Clear the seats of `mask` on a train's seat map."""
+    if not mask:
+        return
+    seat_map = SeatInventory.objects.select_for_update().filter(train_id=train_id).values_list(
+        'seat_map', flat=True
+    ).first()
+    SeatInventory.objects.filter(train_id=train_id).update(
+        seat_map=encode(decode(seat_map) & ~mask, len(seat_map or b'') * 8)
+    )
+
+
+def _seat_count(seats, seat_numbers):
+    if seat_numbers:
+        if seats is not None and seats != len(seat_numbers):
+            raise Exception("Seats does not match the number of selected seats.")
+        return len(seat_numbers)
+    if seats is None or seats <= 0:
+        raise Exception("Seats must be a positive number.")
+    return seats
+
+
+def _hold_ttl(ttl):
+    if ttl is None:
+        return HOLD_TTL
+    if not 1 <= ttl <= MAX_HOLD_TTL:
+        raise Exception(f"Hold TTL must be between 1 and {MAX_HOLD_TTL} seconds.")
+    return ttl
+
+
+def hold_seats(train_id, seats=None, ttl=None, seat_numbers=None):
+    """
+    Reserve seats on a train until the hold is confirmed, released or expires:
+    `seats` seats without seat numbers, or exactly `seat_numbers`.
+    """
+    seats = _seat_count(seats, seat_numbers)
+    expires_at = timezone.now() + timedelta(seconds=_hold_ttl(ttl))
+    with transaction.atomic():
+        mask = _take_seats(train_id, seats, 'held', seat_numbers)
+        return SeatHold.objects.create(train_id=train_id, seats=seats, seat_map=encode(mask), expires_at=expires_at)
+
+
+def sell_seats(train_id, seats=None, seat_numbers=None):
+    """Sell seats directly, without a hold. Returns the sold seat numbers (none for a sale by seat count)."""
+    seats = _seat_count(seats, seat_numbers)
+    with transaction.atomic():
+        return numbers_of(_take_seats(train_id, seats, 'sold', seat_numbers))
+
+
+def _finish_hold(hold_id, target, only_active):
+    """Delete a hold and move its seats from `held` to `target` (freeing them on the seat map for `available`)."""
+    hold = SeatHold.objects.filter(pk=hold_id).first()
+    if hold is None:
+        raise Exception("Seat hold does not exist.")
+    holds = SeatHold.objects.filter(pk=hold_id)
+    if only_active:
+        holds = holds.filter(expires_at__gt=timezone.now())
+    with transaction.atomic():
+        # The conditional DELETE decides which of concurrent confirm, release
+        # and sweep gets to move the seats
+        deleted, _ = holds.delete()
+        if not deleted:
+            raise Exception("Seat hold expired." if only_active else "Seat hold does not exist.")
+        if not _move(hold.train_id, hold.seats, 'held', target):
+            raise Exception("Seat inventory has fewer held seats than the hold.")
+        if target == 'available':
+            _free_seats(hold.train_id, decode(hold.seat_map))
+    return hold
+
+
+def confirm_hold(hold_id):
+    """Turn an unexpired hold into sold seats."""
+    return _finish_hold(hold_id, 'sold', only_active=True)
+
+
+def release_hold(hold_id):
+    """Give the seats of a hold back before it expires."""
+    return _finish_hold(hold_id, 'available', only_active=False)
+
+
+def sweep_expired_holds(batch_size=None):
+    """
+    Release one batch of expired holds.
+
+    Holds are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    sweepers can run side by side, and the seats of the batch go back with a
+    single UPDATE (the inventory rows are locked while their seat maps are
+    rewritten). Returns the number of holds released.
+    """
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    with transaction.atomic():
+        holds = list(
+            SeatHold.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=timezone.now())
+            .order_by('expires_at')
+            .only('id', 'train', 'seats', 'seat_map')[:batch_size]
+        )
+        if not holds:
+            return 0
+        SeatHold.objects.filter(pk__in=[hold.pk for hold in holds]).delete()
+
+        seats = Counter()
+        masks = Counter()
+        for hold in holds:
+            seats[hold.train_id] += hold.seats
+            masks[hold.train_id] |= decode(hold.seat_map)
+        # Locked in train order, so concurrent sweepers cannot deadlock
+        seat_maps = SeatInventory.objects.select_for_update().filter(train_id__in=list(seats)).order_by('train_id')
+        seat_maps = {
+            train_id: encode(decode(seat_map) & ~masks[train_id], len(seat_map or b'') * 8)
+            for train_id, seat_map in seat_maps.values_list('train_id', 'seat_map')
+        }
+        released = Case(
+            *[When(train_id=train_id, then=Value(count)) for train_id, count in seats.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        SeatInventory.objects.filter(train_id__in=list(seat_maps)).update(
+            held=F('held') - released,
+            available=F('available') + released,
+            seat_map=Case(
+                *[When(train_id=train_id, then=Value(seat_map)) for train_id, seat_map in seat_maps.items()],
+                output_field=BinaryField(),
+            ),
+        )
+    return len(holds)
+
+
+def availability(train_ids):
+    """
+    Return {train id: SeatInventory} for the given trains with one query
+    (plus one INSERT when some trains have no inventory row yet).
+    """
+    train_ids = set(train_ids)
+    inventories = SeatInventory.objects.in_bulk(train_ids)
+    missing = train_ids - set(inventories)
+    if missing and ensure_inventory(missing):
+        # Rows just created on the primary are not on a read replica yet
+        inventories.update(SeatInventory.objects.db_manager(router.db_for_write(SeatInventory)).in_bulk(missing))
+    return inventories
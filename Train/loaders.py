@@ -0,0 +1,176 @@
+import inspect
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from .inventory import availability
+from .models import Train
+from .pagination import TRAIN_ORDERING, decode_cursor, seek_filter
+from .reference_data import reference_data
+
+
+class BatchLoader:
+    """
+    Per-request batching loader.
+
+    Keys are collected with `prime()` while a list is being resolved; the first
+    `load()` then fetches every pending key with a single `IN (...)` query and
+    caches the results for the rest of the request.
+
+    In async requests `load()` returns an awaitable instead. The async executor
+    calls the resolvers of all sibling items before awaiting any of them, so
+    every key is pending by the time the first flush runs.
+    """
+    def __init__(self, batch_load, default=None, is_async=False):
+        self.batch_load = batch_load  # callable(keys) -> {key: value}
+        self.default = default
+        self.is_async = is_async
+        self.cache = {}
+        self.pending = set()
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def load(self, key):
+        if key in self.cache:
+            return self.cache[key]
+        self.pending.add(key)
+        if self.is_async:
+            return self._load_async(key)
+        self.flush()
+        return self.cache[key]
+
+    async def _load_async(self, key):
+        if key not in self.cache:
+            # thread_sensitive flushes run one at a time, so a later flush sees earlier results
+            await sync_to_async(self.flush)()
+        return self.cache[key]
+
+    def flush(self):
+        keys, self.pending = list(self.pending), set()
+        if not keys:
+            return
+        results = self.batch_load(keys)
+        for key in keys:
+            self.cache[key] = results.get(key, self.default() if callable(self.default) else self.default)
+
+
+def then(value, callback):
+    """Apply `callback` to a loaded value, which is an awaitable in async requests."""
+    if inspect.isawaitable(value):
+        async def chained():
+            return callback(await value)
+        return chained()
+    return callback(value)
+
+
+def _trains_by(field, keys, limit, after):
+    """
+    Return {key: trains} with the first `limit` + 1 trains of each key in
+    TRAIN_ORDERING (after the `after` cursor), numbered per key in one query.
+    """
+    trains = Train.objects.filter(**{f"{field}__in": keys})
+    if after:
+        trains = trains.filter(seek_filter(TRAIN_ORDERING, decode_cursor(after, TRAIN_ORDERING)))
+    trains = trains.annotate(position=Window(
+        RowNumber(), partition_by=F(field), order_by=[F(column).asc() for column in TRAIN_ORDERING],
+    )).filter(position__lte=limit + 1).order_by(field, *TRAIN_ORDERING)
+    grouped = defaultdict(list)
+    for train in trains:
+        grouped[getattr(train, field)].append(train)
+    return grouped
+
+
+class TrainPageLoader:
+    """
+    Loader of one page of trains per related object (a station's departures,
+    a company's trains...).
+
+    Related objects are primed before the page arguments are known, so one
+    BatchLoader is kept per (limit, after) and each starts with every primed key.
+    """
+    def __init__(self, field, is_async=False):
+        self.field = field
+        self.is_async = is_async
+        self.keys = set()
+        self.loaders = {}  # {(limit, after): BatchLoader}
+
+    def prime(self, keys):
+        keys = set(keys)
+        self.keys.update(keys)
+        for loader in self.loaders.values():
+            loader.prime(keys)
+
+    def load(self, key, limit, after=None):
+        loader = self.loaders.get((limit, after))
+        if loader is None:
+            loader = self.loaders[(limit, after)] = BatchLoader(
+                lambda keys: _trains_by(self.field, keys, limit, after), default=list, is_async=self.is_async
+            )
+            loader.prime(self.keys)
+        return loader.load(key)
+
+
+class Loaders:
+    """Container for all loaders of one GraphQL request."""
+    def __init__(self, is_async=False):
+        # Train -> related objects (served from the in-memory reference snapshot)
+        self.station = BatchLoader(reference_data.stations_by_ids, is_async=is_async)
+        self.railway_company = BatchLoader(reference_data.railway_companies_by_ids, is_async=is_async)
+        self.hall = BatchLoader(reference_data.train_halls_by_ids, is_async=is_async)
+        # Related objects -> a page of their trains
+        self.departures = TrainPageLoader('departure_station_id', is_async=is_async)
+        self.arrivals = TrainPageLoader('arrival_station_id', is_async=is_async)
+        self.company_trains = TrainPageLoader('railway_company_id', is_async=is_async)
+        self.hall_trains = TrainPageLoader('hall_id', is_async=is_async)
+        # Train -> seat inventory
+        self.inventory = BatchLoader(availability, is_async=is_async)
+
+    def prime_trains(self, trains):
+        """Queue the foreign keys of a list of trains for batch loading."""
+        trains = list(trains)
+        self.station.prime(train.departure_station_id for train in trains)
+        self.station.prime(train.arrival_station_id for train in trains)
+        self.railway_company.prime(train.railway_company_id for train in trains)
+        self.hall.prime(train.hall_id for train in trains)
+        self.inventory.prime(train.id for train in trains)
+        return trains
+
+    def prime_stations(self, stations):
+        stations = list(stations)
+        self.departures.prime(station.id for station in stations)
+        self.arrivals.prime(station.id for station in stations)
+        return stations
+
+    def prime_railway_companies(self, companies):
+        companies = list(companies)
+        self.company_trains.prime(company.id for company in companies)
+        return companies
+
+    def prime_train_halls(self, halls):
+        halls = list(halls)
+        self.hall_trains.prime(hall.id for hall in halls)
+        return halls
+
+
+def get_loaders(info):
+    """
+    Return the loaders bound to the current request.
+
+    Loaders live on `info.context` (the Django request for `/graphql/`), so
+    batching and caching never leak between requests. Without a context a
+    fresh set is returned and no batching happens. The async GraphQL view
+    marks its requests with `graphql_async`.
+    """
+    context = info.context
+    if context is None:
+        return Loaders()
+    if isinstance(context, dict):
+        if '_train_loaders' not in context:
+            context['_train_loaders'] = Loaders(is_async=context.get('graphql_async', False))
+        return context['_train_loaders']
+    loaders = getattr(context, '_train_loaders', None)
+    if loaders is None:
+        loaders = Loaders(is_async=getattr(context, 'graphql_async', False))
+        setattr(context, '_train_loaders', loaders)
+    return loaders
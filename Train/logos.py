@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import RailwayCompany
+from .versioning import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Threads resizing logos in each process
+LOGO_WORKERS = getattr(settings, 'LOGO_WORKERS', 2)
+# WebP quality of the variants (0-100)
+LOGO_QUALITY = getattr(settings, 'LOGO_QUALITY', 80)
+
+# Variant name -> bounding box; the logo is scaled down (never up) keeping its aspect ratio
+LOGO_VARIANTS = {
+    'thumbnail': (64, 64),
+    'small': (128, 128),
+    'medium': (256, 256),
+}
+VARIANTS_DIR = 'railway_company_logos/variants'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LOGO_WORKERS, thread_name_prefix='logos')
+        return _executor
+
+
+def _variant(source, name, size):
+    """
+    Store one WebP variant of the logo bytes `source` and return its description.
+
+    The file name contains a hash of the logo and of the variant settings,
+    so it never changes content and can be cached forever; a variant that
+    already exists is reused.
+    """
+    digest = hashlib.sha256(source + repr((size, LOGO_QUALITY)).encode()).hexdigest()[:16]
+    path = f"{VARIANTS_DIR}/{name}-{digest}.webp"
+    if default_storage.exists(path):
+        with default_storage.open(path, 'rb') as file:
+            width, height = Image.open(file).size
+        return {'name': path, 'width': width, 'height': height}
+
+    image = ImageOps.exif_transpose(Image.open(BytesIO(source)))
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail(size, Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, 'WEBP', quality=LOGO_QUALITY, method=6)
+    # Another worker may have stored the same variant meanwhile: keep the name storage returns
+    path = default_storage.save(path, ContentFile(output.getvalue()))
+    return {'name': path, 'width': image.width, 'height': image.height}
+
+
+def generate_variants(company_id):
+    """
+    Generate the variants of a company's logo and save them on the company.
+    Returns {variant name: {'name', 'width', 'height'}}.
+    """
+    company = RailwayCompany.objects.filter(id=company_id).first()
+    if company is None or not company.railway_logo:
+        return {}
+    logo = company.railway_logo.name
+    with company.railway_logo.open('rb') as file:
+        source = file.read()
+    variants = {name: _variant(source, name, size) for name, size in LOGO_VARIANTS.items()}
+    # Skip the update if the logo was replaced while we were working
+    if RailwayCompany.objects.filter(id=company_id, railway_logo=logo).update(railway_logo_variants=variants):
+        bump_version(RailwayCompany)  # Invalidate cached reference data and responses
+    return variants
+
+
+def _generate_in_worker(company_id):
+    try:
+        generate_variants(company_id)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as error:
+        logger.warning("Could not generate logo variants of railway company %s: %s", company_id, error)
+    except Exception:
+        logger.exception("Logo variants of railway company %s failed.", company_id)
+    finally:
+        connections.close_all()  # This thread's connections would otherwise stay open
+
+
+def schedule_variants(company_id):
+    """Generate the variants of a company's logo in the worker pool once the current transaction commits."""
+    transaction.on_commit(lambda: _pool().submit(_generate_in_worker, company_id))
+
+
+def variant_list(company):
+    """Return the variants of a company's logo, smallest first, with their URLs."""
+    variants = company.railway_logo_variants or {}
+    return [
+        {'variant': name, 'url': default_storage.url(variants[name]['name']),
+         'width': variants[name]['width'], 'height': variants[name]['height']}
+        for name in LOGO_VARIANTS if name in variants
+    ]
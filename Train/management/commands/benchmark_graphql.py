@@ -0,0 +1,304 @@
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from Train import synthetic
+from Train.models import Station, RailwayCompany, TrainHall, Train
+from Train.pagination import encode_cursor, TRAIN_ORDERING
+from Train.reference_data import reference_data
+from TrainsService.schema import schema
+
+# Train numbers of the trains created by the `create_train` benchmark
+BENCHMARK_TRAIN_PREFIX = 'BENCH-'
+
+ALL_TRAINS_QUERY = """
+query AllTrains($first: Int, $after: String) {
+  allTrains(first: $first, after: $after) {
+    edges { node { trainNumber departureDatetime finalPrice
+      departureStation { stationName } arrivalStation { stationName }
+      railwayCompany { railwayName } hall { hallName } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+TRAIN_BY_NUMBER_QUERY = """
+query TrainByNumber($trainNumber: String!) {
+  trainByNumber(trainNumber: $trainNumber) {
+    trainNumber departureDatetime arrivalDatetime finalPrice
+    departureStation { stationName } arrivalStation { stationName } railwayCompany { railwayName }
+  }
+}
+"""
+
+SEARCH_TRAINS_QUERY = """
+query SearchTrains($from: Int!, $to: Int!, $date: Date!) {
+  searchTrains(departureStation: $from, arrivalStation: $to, date: $date, sortBy: PRICE) {
+    trainNumber departureDatetime finalPrice railwayCompany { railwayName }
+  }
+}
+"""
+
+CREATE_TRAIN_MUTATION = """
+mutation CreateTrain($trainNumber: String!, $departure: String!, $arrival: String!,
+                     $from: Int!, $to: Int!, $company: Int!, $hall: Int!, $basePrice: Float!) {
+  createTrain(trainNumber: $trainNumber, departureDatetime: $departure, arrivalDatetime: $arrival,
+              departureStation: $from, arrivalStation: $to, railwayCompany: $company,
+              trainType: "BUS_STYLE", capacity: 300, hall: $hall, stars: 3,
+              basePrice: $basePrice, tax: 9, discount: 5) {
+    id finalPrice
+  }
+}
+"""
+
+UPDATE_TRAIN_MUTATION = """
+mutation UpdateTrain($trainId: Int!, $basePrice: Float!) {
+  updateTrain(trainId: $trainId, basePrice: $basePrice) { id finalPrice }
+}
+"""
+
+
+class Workload:
+    """
+    Variables for the benchmarked operations, drawn from a sample of the seeded trains.
+    """
+    def __init__(self, random_seed):
+        self.rng = random.Random(random_seed)
+        self.trains = list(
+            Train.objects.order_by('id').values(
+                'id', 'train_number', 'departure_station_id', 'arrival_station_id',
+                'railway_company_id', 'hall_id', 'departure_datetime',
+            )[:1000]
+        )
+        if not self.trains:
+            raise CommandError("The benchmark database has no trains.")
+        # Cursor of the train in the middle of `all_trains`, for a deep page
+        middle = Train.objects.order_by(*TRAIN_ORDERING)[Train.objects.count() // 2]
+        self.middle_cursor = encode_cursor(middle, TRAIN_ORDERING)
+        self.created = 0
+
+    def sample(self):
+        return self.rng.choice(self.trains)
+
+    def all_trains_first_page(self):
+        return ALL_TRAINS_QUERY, {'first': 50}
+
+    def all_trains_deep_page(self):
+        return ALL_TRAINS_QUERY, {'first': 50, 'after': self.middle_cursor}
+
+    def train_by_number(self):
+        return TRAIN_BY_NUMBER_QUERY, {'trainNumber': self.sample()['train_number']}
+
+    def search_trains(self):
+        train = self.sample()
+        return SEARCH_TRAINS_QUERY, {
+            'from': train['departure_station_id'],
+            'to': train['arrival_station_id'],
+            'date': train['departure_datetime'].date().isoformat(),
+        }
+
+    def create_train(self):
+        train = self.sample()
+        self.created += 1
+        departure = train['departure_datetime']
+        return CREATE_TRAIN_MUTATION, {
+            'trainNumber': f"{BENCHMARK_TRAIN_PREFIX}{self.created}",
+            'departure': departure.isoformat(),
+            'arrival': (departure + timedelta(hours=6)).isoformat(),
+            'from': train['departure_station_id'],
+            'to': train['arrival_station_id'],
+            'company': train['railway_company_id'],
+            'hall': train['hall_id'],
+            'basePrice': float(self.rng.randrange(500000, 50000000, 1000)),
+        }
+
+    def update_train(self):
+        return UPDATE_TRAIN_MUTATION, {
+            'trainId': self.sample()['id'],
+            'basePrice': float(self.rng.randrange(500000, 50000000, 1000)),
+        }
+
+
+OPERATIONS = [
+    'all_trains_first_page',
+    'all_trains_deep_page',
+    'train_by_number',
+    'search_trains',
+    'create_train',
+    'update_train',
+]
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def execute(query, variables):
+    # A fresh context per operation, like a new request: no loader state is shared
+    result = schema.execute(query, variables=variables, context_value={})
+    if result.errors:
+        raise CommandError(f"Benchmark operation failed: {result.errors[0]}")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark representative GraphQL operations in-process on a seeded "
+        "synthetic dataset and report latency percentiles, SQL queries and "
+        "allocations per operation as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('operations', nargs='*', help=f"Operations to run (default: {', '.join(OPERATIONS)}).")
+        parser.add_argument('--stations', type=int, default=synthetic.DEFAULT_STATIONS)
+        parser.add_argument('--companies', type=int, default=synthetic.DEFAULT_COMPANIES)
+        parser.add_argument('--halls', type=int, default=synthetic.DEFAULT_HALLS)
+        parser.add_argument('--trains', type=int, default=synthetic.DEFAULT_TRAINS)
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the dataset and of the workload.")
+        parser.add_argument('--iterations', type=int, default=200, help="Timed runs per operation.")
+        parser.add_argument('--warmup', type=int, default=20, help="Untimed runs per operation before timing.")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the benchmark database between runs (reseeded only if its size differs).")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+        parser.add_argument('--compare', help="Baseline JSON report to compare against.")
+        parser.add_argument('--max-regression', type=float, default=0.10,
+                            help="Allowed relative p95 slowdown against the baseline (default: 0.10).")
+
+    def handle(self, *args, **options):
+        operations = options['operations'] or OPERATIONS
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise CommandError(f"Unknown operations: {', '.join(sorted(unknown))}")
+
+        # Benchmarks run on Django's test database, never on the configured one
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'], serialized_aliases=[])
+        try:
+            self.prepare(options)
+            reference_data.invalidate()
+            workload = Workload(options['seed'])
+            results = {name: self.measure(workload, name, options['iterations'], options['warmup'])
+                       for name in operations}
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'dataset': {key: options[key] for key in ('stations', 'companies', 'halls', 'trains', 'seed')},
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            self.compare(report, options['compare'], options['max_regression'])
+
+    def prepare(self, options):
+        # Trains created by an earlier run (--keepdb) are not part of the dataset
+        Train.objects.filter(train_number__startswith=BENCHMARK_TRAIN_PREFIX).delete()
+        if Train.objects.count() == options['trains']:
+            return
+        for model in (Train, Station, RailwayCompany, TrainHall):
+            model.objects.all().delete()
+
+        started = time.monotonic()
+
+        def progress(inserted):
+            if inserted % 50000 == 0 or inserted == options['trains']:
+                self.stderr.write(f"Seeded {inserted}/{options['trains']} trains ({time.monotonic() - started:.1f}s)")
+
+        synthetic.seed(
+            stations=options['stations'], companies=options['companies'], halls=options['halls'],
+            trains=options['trains'], random_seed=options['seed'], progress=progress,
+        )
+
+    def measure(self, workload, name, iterations, warmup):
+        operation = getattr(workload, name)
+        for _ in range(warmup):
+            execute(*operation())
+
+        timings = []
+        for _ in range(iterations):
+            query, variables = operation()
+            started = time.perf_counter()
+            execute(query, variables)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Queries and allocations are measured in a separate pass: tracing slows execution down
+        profile_runs = max(1, min(iterations, 20))
+        queries = 0
+        allocated = 0
+        peak = 0
+        for _ in range(profile_runs):
+            query, variables = operation()
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as captured:
+                execute(query, variables)
+            snapshot_size, snapshot_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            queries += len(captured.captured_queries)
+            allocated += snapshot_size
+            peak = max(peak, snapshot_peak)
+
+        self.stderr.write(f"{name}: p50 {percentile(timings, 50):.2f} ms, p95 {percentile(timings, 95):.2f} ms")
+        return {
+            'iterations': iterations,
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': round(queries / profile_runs, 2),
+            'retained_kib': round(allocated / profile_runs / 1024, 1),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def compare(self, report, path, max_regression):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+
+        regressions = []
+        for name, result in report['results'].items():
+            previous = baseline.get('results', {}).get(name)
+            if previous is None:
+                continue
+            ratio = result['p95_ms'] / previous['p95_ms'] if previous['p95_ms'] else 1
+            self.stderr.write(
+                f"{name}: p95 {previous['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms ({ratio - 1:+.1%}), "
+                f"queries {previous['queries']} -> {result['queries']}"
+            )
+            if ratio > 1 + max_regression:
+                regressions.append(f"{name} p95 is {ratio - 1:+.1%} slower")
+            if result['queries'] > previous['queries']:
+                regressions.append(f"{name} runs more SQL queries ({previous['queries']} -> {result['queries']})")
+
+        if regressions:
+            raise CommandError("Performance regressions: " + "; ".join(regressions))
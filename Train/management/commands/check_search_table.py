@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from Train.search_table import inconsistent_trains, rebuild, refresh_trains
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the denormalised train search table with the Train, Station, "
+        "RailwayCompany and TrainHall tables, and optionally repair it."
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--fix', action='store_true', help="Rewrite the missing and stale rows.")
+        action.add_argument('--rebuild', action='store_true', help="Recreate the whole table.")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Search table rebuilt with {count} rows."))
+            return
+
+        train_ids = inconsistent_trains()
+        if not train_ids:
+            self.stdout.write(self.style.SUCCESS("Search table is consistent."))
+            return
+        if not options['fix']:
+            raise CommandError(f"{len(train_ids)} trains have a missing or stale search row (use --fix or --rebuild).")
+        train_ids = sorted(train_ids)
+        for start in range(0, len(train_ids), 1000):
+            refresh_trains(train_ids[start:start + 1000])
+        self.stdout.write(self.style.SUCCESS(f"Rewrote the search rows of {len(train_ids)} trains."))
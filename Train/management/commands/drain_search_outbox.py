@@ -0,0 +1,26 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from Train.outbox import drain, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Push pending search outbox rows to the search backend in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Outbox rows per bulk request.")
+        parser.add_argument('--interval', type=float, default=getattr(settings, 'SEARCH_OUTBOX_POLL_INTERVAL', 1.0),
+                            help="Seconds to wait when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain what is pending and exit.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = drain(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Drained {total} outbox rows."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from Train.logos import generate_variants
+from Train.models import RailwayCompany
+
+
+class Command(BaseCommand):
+    help = "Generate the resized WebP variants of railway company logos (e.g. logos uploaded through the admin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', help="Only this company id (repeatable).")
+        parser.add_argument('--missing', action='store_true', help="Skip companies that already have variants.")
+
+    def handle(self, *args, **options):
+        companies = RailwayCompany.objects.exclude(railway_logo='').exclude(railway_logo__isnull=True)
+        if options['company']:
+            companies = companies.filter(id__in=options['company'])
+        if options['missing']:
+            companies = companies.filter(railway_logo_variants={})
+        done = 0
+        for company_id in companies.values_list('id', flat=True).iterator():
+            try:
+                generate_variants(company_id)
+                done += 1
+            except Exception as error:
+                self.stderr.write(f"Company {company_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Generated logo variants of {done} railway companies."))
@@ -0,0 +1,163 @@
+import csv
+import os
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from Train import synthetic
+from Train.bulk_load import copy_supported, load_trains
+from Train.models import Train, Station, RailwayCompany, TrainHall, TrainType
+from Train.pricing import final_price
+from Train.versioning import bump_version
+
+# CSV files read from --source, with the columns each of them needs
+SOURCE_FILES = {
+    'stations.csv': (Station, 'station_name', ('station_name', 'station_city', 'station_province')),
+    'railway_companies.csv': (RailwayCompany, 'railway_name', ('railway_name', 'railway_description', 'refund_policy')),
+    'train_halls.csv': (TrainHall, 'hall_name', ('hall_name', 'hall_description')),
+}
+TRAIN_FILE = 'trains.csv'
+TRAIN_FILE_COLUMNS = (
+    'train_number', 'departure_datetime', 'arrival_datetime', 'departure_station', 'arrival_station',
+    'railway_company', 'train_type', 'capacity', 'hall', 'stars', 'base_price', 'tax', 'discount',
+)
+TRAIN_TYPE_NAMES = {tag.value: tag.name for tag in TrainType} | {tag.name: tag.name for tag in TrainType}
+
+
+def read_csv(path, columns):
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        missing = set(columns) - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(f"{os.path.basename(path)} is missing columns: {', '.join(sorted(missing))}")
+        for line, row in enumerate(reader, start=2):
+            yield line, row
+
+
+def aware_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"invalid datetime '{value}'")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load a timetable: generate a synthetic one or ingest CSV files. "
+        "Trains are streamed with PostgreSQL COPY (chunked bulk inserts on other "
+        "databases) and final_price is computed during the load."
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--generate', action='store_true', help="Generate a synthetic timetable.")
+        source.add_argument('--source', help=(
+            "Directory with stations.csv, railway_companies.csv, train_halls.csv and trains.csv "
+            "(trains reference stations, companies and halls by name)."
+        ))
+        parser.add_argument('--stations', type=int, default=synthetic.DEFAULT_STATIONS)
+        parser.add_argument('--companies', type=int, default=synthetic.DEFAULT_COMPANIES)
+        parser.add_argument('--halls', type=int, default=synthetic.DEFAULT_HALLS)
+        parser.add_argument('--trains', type=int, default=synthetic.DEFAULT_TRAINS)
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic timetable.")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="Rows per INSERT when COPY is not available.")
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        method = 'COPY' if copy_supported() else 'bulk INSERT'
+        self.stdout.write(f"Loading trains with {method}...")
+
+        if options['generate']:
+            synthetic.seed(
+                stations=options['stations'], companies=options['companies'], halls=options['halls'],
+                trains=options['trains'], random_seed=options['seed'],
+                chunk_size=options['chunk_size'], progress=self.progress,
+            )
+        else:
+            self.ingest(options['source'], options['chunk_size'])
+
+        bump_version(Train, Station, RailwayCompany, TrainHall)  # Invalidate cached reference data and responses
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.monotonic() - self.started:.1f}s. "
+            "Run rebuild_search_index and check_search_table --fix to index the loaded rows."
+        ))
+
+    def progress(self, count):
+        # Called once per batch written
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"  {count} trains ({count / elapsed:.0f} rows/s)")
+
+    def ingest(self, directory, chunk_size):
+        if not os.path.isfile(os.path.join(directory, TRAIN_FILE)):
+            raise CommandError(f"{TRAIN_FILE} not found in {directory}.")
+
+        with transaction.atomic():
+            ids = {}
+            for filename, (model, name_field, columns) in SOURCE_FILES.items():
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path):
+                    self.load_reference(path, model, name_field, columns)
+                ids[model] = dict(model.objects.values_list(name_field, 'id'))
+
+            rows = self.train_rows(os.path.join(directory, TRAIN_FILE), ids)
+            count = load_trains(rows, chunk_size=chunk_size, progress=self.progress)
+        self.stdout.write(f"  {count} trains loaded.")
+
+    def load_reference(self, path, model, name_field, columns):
+        filename = os.path.basename(path)
+        fields = [model._meta.get_field(column) for column in columns]
+        existing = set(model.objects.values_list(name_field, flat=True))
+        objects = []
+        errors = []
+        for line, row in read_csv(path, columns):
+            # Empty cells are NULL: report them (and values too long) per row instead of failing the INSERT
+            row_errors = []
+            for field in fields:
+                if not row[field.name] and not field.null:
+                    row_errors.append(f"{filename} line {line}: {field.name} is required.")
+                elif field.max_length and len(row[field.name] or '') > field.max_length:
+                    row_errors.append(f"{filename} line {line}: {field.name} is longer than {field.max_length} characters.")
+            if row_errors:
+                errors.extend(row_errors)
+                continue
+            if row[name_field] in existing:
+                continue  # Already loaded: rows are matched by name
+            existing.add(row[name_field])
+            objects.append(model(**{column: row[column] or None for column in columns}))
+        if errors:
+            raise CommandError("\n".join(errors))
+        model.objects.bulk_create(objects)
+        self.stdout.write(f"  {len(objects)} new rows from {filename}.")
+
+    def train_rows(self, path, ids):
+        stations, companies, halls = ids[Station], ids[RailwayCompany], ids[TrainHall]
+        for line, row in read_csv(path, TRAIN_FILE_COLUMNS):
+            try:
+                base_price = int(row['base_price'])
+                tax = Decimal(row['tax'] or 0)
+                discount = Decimal(row['discount'] or 0)
+                yield (
+                    row['train_number'],
+                    aware_datetime(row['departure_datetime']),
+                    aware_datetime(row['arrival_datetime']),
+                    stations[row['departure_station']],
+                    stations[row['arrival_station']],
+                    companies[row['railway_company']],
+                    TRAIN_TYPE_NAMES[row['train_type']],
+                    int(row['capacity']),
+                    halls[row['hall']],
+                    int(row['stars'] or 3),
+                    base_price,
+                    tax,
+                    discount,
+                    final_price(base_price, tax, discount),
+                )
+            except KeyError as error:
+                raise CommandError(f"{TRAIN_FILE} line {line}: unknown reference {error}.")
+            except Exception as error:
+                raise CommandError(f"{TRAIN_FILE} line {line}: {error}")
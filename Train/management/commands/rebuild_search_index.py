@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from Train.documents import DOCUMENTS
+from Train.models import SearchRebuild
+from Train.outbox import replay, requeue
+from Train.search_backend import get_backend
+
+# Outbox rows are assumed to commit within this long after they were written (seconds)
+REPLAY_GRACE = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild search indexes from the database into new versioned indexes "
+        "and atomically swap the index aliases when done. Changes drained "
+        "meanwhile are replayed into the new index before the swap."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('indexes', nargs='*',
+                            help="Indexes to rebuild (default: all of them).")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Rows fetched per cursor round trip and documents per bulk request.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Parallel bulk workers.")
+        parser.add_argument('--keep-old', action='store_true',
+                            help="Keep the previous indexes instead of deleting them after the swap.")
+
+    def handle(self, *args, **options):
+        documents = {document.index: document for document in DOCUMENTS.values()}
+        names = options['indexes'] or list(documents)
+        unknown = set(names) - set(documents)
+        if unknown:
+            raise CommandError(f"Unknown indexes: {', '.join(sorted(unknown))}")
+
+        backend = get_backend()
+        for name in names:
+            self.rebuild(backend, documents[name], options['chunk_size'], options['workers'], options['keep_old'])
+
+    def rebuild(self, backend, document, chunk_size, workers, keep_old):
+        alias = document.index
+        index = f"{alias}_{int(time.time() * 1000)}"
+        backend.create_index(index)
+        # From now on drainers keep the outbox rows they ship to the old index, for replay()
+        registration = SearchRebuild.objects.create(alias=alias, index=index)
+        try:
+            self.fill(backend, document, index, chunk_size, workers, keep_old)
+        finally:
+            registration.delete()
+
+    def fill(self, backend, document, index, chunk_size, workers, keep_old):
+        alias = document.index
+        queryset = document.get_queryset().order_by('pk')
+        total = queryset.count()
+        self.stdout.write(f"Rebuilding '{alias}' into '{index}' ({total} rows)...")
+
+        started = time.monotonic()
+        done = 0
+        done_lock = threading.Lock()
+        # At most two chunks per worker are in flight, so memory stays flat
+        in_flight = threading.BoundedSemaphore(workers * 2)
+
+        def ship(actions):
+            nonlocal done
+            try:
+                backend.bulk(actions)
+            finally:
+                in_flight.release()
+            with done_lock:
+                done += len(actions)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"  {alias}: {done}/{total} documents "
+                    f"({done / elapsed if elapsed else 0:.0f} docs/s)"
+                )
+
+        futures = []
+
+        def submit(actions):
+            in_flight.acquire()
+            futures.append(executor.submit(ship, actions))
+            # Forget finished chunks, re-raising the first worker error before touching the alias
+            for future in [future for future in futures if future.done()]:
+                future.result()
+                futures.remove(future)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            chunk = []
+            # iterator() streams rows with a server-side cursor on PostgreSQL
+            for instance in queryset.iterator(chunk_size=chunk_size):
+                chunk.append({'op': 'index', 'index': index, 'id': instance.pk, 'document': document.to_document(instance)})
+                if len(chunk) >= chunk_size:
+                    submit(chunk)
+                    chunk = []
+            if chunk:
+                submit(chunk)
+            for future in futures:
+                future.result()
+
+        # Rows changed while streaming went to the old index through the alias: catch up
+        # until a pass finds less than a chunk, then swap
+        last_id = 0
+        replayed = chunk_size
+        while replayed >= chunk_size:
+            replayed_at = timezone.now()
+            last_id, replayed = replay(document, index, backend, after_id=last_id, batch_size=chunk_size)
+
+        previous = backend.swap_alias(alias, index)
+        # Rows drained between the last pass and the swap also went to the old index (and rows
+        # with smaller ids may have committed late): queue them again for the new one
+        requeued = requeue(document, last_id, replayed_at - timedelta(seconds=REPLAY_GRACE))
+        if not keep_old:
+            for old_index in previous:
+                backend.delete_index(old_index)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"'{alias}' now points to '{index}': {done} documents in {elapsed:.1f}s "
+            f"({done / elapsed if elapsed else 0:.0f} docs/s), {requeued} changes queued again."
+        ))
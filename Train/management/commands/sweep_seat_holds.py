@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from Train.inventory import sweep_expired_holds, SWEEP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Return the seats of expired holds to the available inventory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help="Holds released per transaction.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to wait when no hold has expired.")
+        parser.add_argument('--once', action='store_true', help="Release what has expired and exit.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = sweep_expired_holds(batch_size=options['batch_size'])
+            total += released
+            if released:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f"Released {total} expired seat holds."))
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2025-02-10 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0004_alter_train_train_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='train',
+            index=models.Index(fields=['departure_datetime', 'id'], name='train_departure_keyset_idx'),
+        ),
+    ]
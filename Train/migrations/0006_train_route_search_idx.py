@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2025-02-12 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0005_train_departure_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='train',
+            index=models.Index(fields=['departure_station', 'arrival_station', 'departure_datetime'], name='train_route_search_idx'),
+        ),
+    ]
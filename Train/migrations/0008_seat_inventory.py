@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2025-02-20 09:40
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def create_inventories(apps, schema_editor):
+    # Every existing train starts with all of its capacity available
+    Train = apps.get_model('Train', 'Train')
+    SeatInventory = apps.get_model('Train', 'SeatInventory')
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(SeatInventory._meta.db_table)} (train_id, available, held, sold) "
+        f"SELECT id, capacity, 0, 0 FROM {quote(Train._meta.db_table)}"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0007_searchoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('seats', models.IntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('train', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='Train.train')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('train', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inventory', serialize=False, to='Train.train')),
+                ('available', models.IntegerField()),
+                ('held', models.IntegerField(default=0)),
+                ('sold', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('available__gte', 0), ('held__gte', 0), ('sold__gte', 0)), name='seat_inventory_non_negative')],
+            },
+        ),
+        migrations.RunPython(create_inventories, migrations.RunPython.noop),
+    ]
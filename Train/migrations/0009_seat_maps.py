@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2025-02-21 10:15
+
+from django.db import migrations, models
+
+
+def assign_seats(apps, schema_editor):
+    # Seats held or sold before seat maps existed get consecutive seat numbers:
+    # each hold its own range, sold seats after them
+    SeatInventory = apps.get_model('Train', 'SeatInventory')
+    SeatHold = apps.get_model('Train', 'SeatHold')
+    for inventory in SeatInventory.objects.filter(models.Q(held__gt=0) | models.Q(sold__gt=0)).select_related('train'):
+        next_seat = 0
+        for hold in SeatHold.objects.filter(train_id=inventory.train_id).order_by('created_at'):
+            mask = ((1 << hold.seats) - 1) << next_seat
+            hold.seat_map = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+            hold.save(update_fields=['seat_map'])
+            next_seat += hold.seats
+        taken = (1 << (next_seat + inventory.sold)) - 1
+        size = max(inventory.train.capacity, taken.bit_length())
+        inventory.seat_map = taken.to_bytes((size + 7) // 8, 'little')
+        inventory.save(update_fields=['seat_map'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0008_seat_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seathold',
+            name='seat_map',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='seatinventory',
+            name='seat_map',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(assign_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2025-02-22 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0009_seat_maps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimetableChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('train_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.5 on 2025-02-23 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_search_table(apps, schema_editor):
+    # One row per existing train (later changes are applied by Train/search_table.py)
+    Train = apps.get_model('Train', 'Train')
+    TrainSearchRow = apps.get_model('Train', 'TrainSearchRow')
+    trains = Train.objects.select_related('departure_station', 'arrival_station', 'railway_company', 'hall')
+    batch = []
+    for train in trains.iterator(chunk_size=2000):
+        batch.append(TrainSearchRow(
+            train_id=train.id,
+            train_number=train.train_number,
+            departure_datetime=train.departure_datetime,
+            arrival_datetime=train.arrival_datetime,
+            duration=train.arrival_datetime - train.departure_datetime,
+            departure_station_id=train.departure_station_id,
+            departure_station_name=train.departure_station.station_name,
+            departure_city=train.departure_station.station_city,
+            departure_province=train.departure_station.station_province,
+            arrival_station_id=train.arrival_station_id,
+            arrival_station_name=train.arrival_station.station_name,
+            arrival_city=train.arrival_station.station_city,
+            arrival_province=train.arrival_station.station_province,
+            railway_company_id=train.railway_company_id,
+            railway_name=train.railway_company.railway_name,
+            hall_id=train.hall_id,
+            hall_name=train.hall.hall_name,
+            train_type=train.train_type,
+            stars=train.stars,
+            final_price=train.final_price,
+        ))
+        if len(batch) >= 2000:
+            TrainSearchRow.objects.bulk_create(batch)
+            batch = []
+    TrainSearchRow.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0010_timetable_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainSearchRow',
+            fields=[
+                ('train', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_row', serialize=False, to='Train.train')),
+                ('train_number', models.CharField(max_length=50)),
+                ('departure_datetime', models.DateTimeField()),
+                ('arrival_datetime', models.DateTimeField()),
+                ('duration', models.DurationField()),
+                ('departure_station_id', models.BigIntegerField()),
+                ('departure_station_name', models.CharField(max_length=255)),
+                ('departure_city', models.CharField(max_length=255)),
+                ('departure_province', models.CharField(max_length=255)),
+                ('arrival_station_id', models.BigIntegerField()),
+                ('arrival_station_name', models.CharField(max_length=255)),
+                ('arrival_city', models.CharField(max_length=255)),
+                ('arrival_province', models.CharField(max_length=255)),
+                ('railway_company_id', models.BigIntegerField()),
+                ('railway_name', models.CharField(max_length=255)),
+                ('hall_id', models.BigIntegerField()),
+                ('hall_name', models.CharField(max_length=255)),
+                ('train_type', models.CharField(max_length=20)),
+                ('stars', models.IntegerField()),
+                ('final_price', models.BigIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['departure_city', 'arrival_city', 'departure_datetime'], name='search_city_route_idx'), models.Index(fields=['departure_province', 'arrival_province', 'departure_datetime'], name='search_province_route_idx'), models.Index(fields=['railway_name', 'departure_datetime'], name='search_company_idx')],
+            },
+        ),
+        migrations.RunPython(fill_search_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2025-02-24 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0011_train_search_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='railwaycompany',
+            name='railway_logo_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
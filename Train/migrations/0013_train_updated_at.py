@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2025-02-25 09:40
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0012_railway_logo_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='train',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now(), db_index=True),
+        ),
+    ]
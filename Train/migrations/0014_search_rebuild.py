@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2025-02-25 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Train', '0013_train_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchRebuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100)),
+                ('index', models.CharField(max_length=150)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='searchoutbox',
+            name='drained',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='searchoutbox',
+            index=models.Index(fields=['drained', 'id'], name='search_outbox_pending_idx'),
+        ),
+    ]
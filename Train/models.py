@@ -1,4 +1,6 @@
+import uuid
 from django.db import models
+from django.db.models.functions import Now
 from enum import Enum
 
 
@@ -24,6 +26,7 @@ class RailwayCompany(models.Model):
     railway_description = models.TextField()  # توضیحات شرکت
     refund_policy = models.TextField()  # قوانین استرداد بلیط
     railway_logo = models.ImageField(upload_to='railway_company_logos/', blank=True, null=True)  # لوگوی شرکت
+    railway_logo_variants = models.JSONField(default=dict, blank=True)  # نسخه‌های کوچک‌شده‌ی لوگو (Train/logos.py)
 
     def __str__(self):
         return self.railway_name
@@ -57,6 +60,16 @@ class Train(models.Model):
     tax = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # مالیات به صورت درصد
     discount = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # تخفیف به صورت درصد
     final_price = models.BigIntegerField()
+    # زمان آخرین تغییر؛ بارگذاری گروهی با COPY از مقدار پیش‌فرض پایگاه داده استفاده می‌کند
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination index for `all_trains` (departure_datetime, id)
+            models.Index(fields=['departure_datetime', 'id'], name='train_departure_keyset_idx'),
+            # Route search index for `search_trains` (station A -> station B on a date)
+            models.Index(fields=['departure_station', 'arrival_station', 'departure_datetime'], name='train_route_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.train_number} ({self.train_type})"
@@ -75,4 +88,107 @@ class Train(models.Model):
         Automatically calculate final price before saving the instance.
         """
         self.final_price = self.final_price_calculated  # محاسبه و ذخیره `final_price` در دیتابیس
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class TrainSearchRow(models.Model):
+    """Train Search Table (one denormalised row per train, kept current by search_table.py)"""
+    train = models.OneToOneField(Train, on_delete=models.CASCADE, primary_key=True, related_name='search_row')
+    train_number = models.CharField(max_length=50)
+    departure_datetime = models.DateTimeField()
+    arrival_datetime = models.DateTimeField()
+    duration = models.DurationField()  # مدت سفر
+    departure_station_id = models.BigIntegerField()
+    departure_station_name = models.CharField(max_length=255)
+    departure_city = models.CharField(max_length=255)
+    departure_province = models.CharField(max_length=255)
+    arrival_station_id = models.BigIntegerField()
+    arrival_station_name = models.CharField(max_length=255)
+    arrival_city = models.CharField(max_length=255)
+    arrival_province = models.CharField(max_length=255)
+    railway_company_id = models.BigIntegerField()
+    railway_name = models.CharField(max_length=255)
+    hall_id = models.BigIntegerField()
+    hall_name = models.CharField(max_length=255)
+    train_type = models.CharField(max_length=20)
+    stars = models.IntegerField()
+    final_price = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['departure_city', 'arrival_city', 'departure_datetime'], name='search_city_route_idx'),
+            models.Index(fields=['departure_province', 'arrival_province', 'departure_datetime'], name='search_province_route_idx'),
+            models.Index(fields=['railway_name', 'departure_datetime'], name='search_company_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.train_number}: {self.departure_city} -> {self.arrival_city}"
+
+
+class SearchOutbox(models.Model):
+    """Search Outbox Table (rows waiting to be synced to the search backend)"""
+    model_label = models.CharField(max_length=100)  # مدل تغییر کرده، مثلا Train.Train
+    object_id = models.BigIntegerField()  # شناسه‌ی رکورد تغییر کرده
+    created_at = models.DateTimeField(auto_now_add=True)
+    drained = models.BooleanField(default=False)  # ارسال شده ولی نگه داشته شده تا rebuild آن را دوباره اجرا کند
+
+    class Meta:
+        indexes = [
+            # Pending rows in drain order
+            models.Index(fields=['drained', 'id'], name='search_outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}#{self.object_id}"
+
+
+class SearchRebuild(models.Model):
+    """Search Rebuild Table (index rebuilds in progress; drained outbox rows are kept while one runs)"""
+    alias = models.CharField(max_length=100)  # نام alias ایندکس
+    index = models.CharField(max_length=150)  # ایندکس جدیدی که ساخته می‌شود
+    started_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.index}"
+
+
+class TimetableChange(models.Model):
+    """Timetable Change Table (trains whose schedule changed, read by every worker's in-memory timetable)"""
+    train_id = models.BigIntegerField()  # شناسه‌ی قطار تغییر کرده یا حذف شده
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Train#{self.train_id} at {self.created_at}"
+
+
+class SeatInventory(models.Model):
+    """Seat Inventory Table (seat counters of one train)"""
+    train = models.OneToOneField(Train, on_delete=models.CASCADE, primary_key=True, related_name='inventory')
+    available = models.IntegerField()  # صندلی‌های قابل فروش
+    held = models.IntegerField(default=0)  # صندلی‌های رزرو موقت
+    sold = models.IntegerField(default=0)  # صندلی‌های فروخته شده
+    seat_map = models.BinaryField(null=True)  # بیت‌مپ صندلی‌های رزرو یا فروخته شده (seat_map.py)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(available__gte=0, held__gte=0, sold__gte=0),
+                name='seat_inventory_non_negative',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.train_id}: {self.available} available, {self.held} held, {self.sold} sold"
+
+
+class SeatHold(models.Model):
+    """Seat Hold Table (seats reserved until a booking is confirmed or the hold expires)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='seat_holds')
+    seats = models.IntegerField()  # تعداد صندلی‌های رزرو شده
+    seat_map = models.BinaryField(null=True)  # بیت‌مپ شماره‌ی صندلی‌های این رزرو
+    expires_at = models.DateTimeField(db_index=True)  # زمان انقضای رزرو موقت
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.seats} seats on {self.train_id} until {self.expires_at}"
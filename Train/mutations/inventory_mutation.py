@@ -0,0 +1,60 @@
+import uuid
+import graphene
+from Train.inventory import hold_seats, sell_seats, confirm_hold, release_hold
+from Train.seat_map import decode, numbers_of
+
+
+# Define GraphQL Type for SeatHold
+class SeatHoldType(graphene.ObjectType):
+    id = graphene.ID()
+    train_id = graphene.Int()
+    seats = graphene.Int()
+    seat_numbers = graphene.List(graphene.Int)
+    expires_at = graphene.DateTime()
+
+    def resolve_seat_numbers(root, info):
+        return numbers_of(decode(root.seat_map))
+
+
+def _hold_id(hold_id):
+    try:
+        return uuid.UUID(hold_id)
+    except ValueError:
+        raise Exception("Seat hold does not exist.")
+
+
+# Define Mutation for seat inventory
+# No Command handler here: a hold, confirmation or sale is undone by a
+# release or a refund, not by the shared undo stack.
+class SeatInventoryMutations(graphene.ObjectType):
+    hold_seats = graphene.Field(
+        SeatHoldType,
+        train_id=graphene.Int(required=True),
+        seats=graphene.Int(),
+        seat_numbers=graphene.List(graphene.NonNull(graphene.Int)),
+        ttl_seconds=graphene.Int()
+    )
+
+    confirm_seat_hold = graphene.String(hold_id=graphene.ID(required=True))
+    release_seat_hold = graphene.String(hold_id=graphene.ID(required=True))
+
+    sell_seats = graphene.List(
+        graphene.Int,
+        train_id=graphene.Int(required=True),
+        seats=graphene.Int(),
+        seat_numbers=graphene.List(graphene.NonNull(graphene.Int))
+    )
+
+    def resolve_hold_seats(self, info, train_id, seats=None, seat_numbers=None, ttl_seconds=None):
+        return hold_seats(train_id, seats, ttl=ttl_seconds, seat_numbers=seat_numbers)
+
+    def resolve_confirm_seat_hold(self, info, hold_id):
+        hold = confirm_hold(_hold_id(hold_id))
+        return f"{hold.seats} seats sold."
+
+    def resolve_release_seat_hold(self, info, hold_id):
+        hold = release_hold(_hold_id(hold_id))
+        return f"{hold.seats} seats released."
+
+    def resolve_sell_seats(self, info, train_id, seats=None, seat_numbers=None):
+        return sell_seats(train_id, seats, seat_numbers=seat_numbers)
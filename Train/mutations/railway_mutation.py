@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
+from django.db import transaction
 from Train.models import RailwayCompany
+from Train.versioning import bump_version
+from Train.logos import schedule_variants
 import graphene
 from graphene_django.types import DjangoObjectType
 
@@ -30,6 +33,8 @@ class CreateRailwayCompanyCommand(RailwayCompanyCommand):
             refund_policy=refund_policy,
             railway_logo=railway_logo
         )
+        if railway_logo:
+            schedule_variants(self.company.id)  # Resized copies are made after the commit
         return self.company
 
     def undo(self):
@@ -48,11 +53,18 @@ class UpdateRailwayCompanyCommand(RailwayCompanyCommand):
             # Fetch the RailwayCompany and store its previous state
             self.company = RailwayCompany.objects.get(id=company_id)
             self.previous_data = {field: getattr(self.company, field) for field in kwargs}
+            logo_changed = 'railway_logo' in kwargs and kwargs['railway_logo'] != self.company.railway_logo.name
+            if logo_changed:
+                # The variants of the old logo no longer apply; undo restores them
+                self.previous_data['railway_logo_variants'] = self.company.railway_logo_variants
+                kwargs['railway_logo_variants'] = {}
 
             # Update the RailwayCompany
             for field, value in kwargs.items():
                 setattr(self.company, field, value)
             self.company.save()
+            if logo_changed and self.company.railway_logo:
+                schedule_variants(self.company.id)
             return self.company
         except RailwayCompany.DoesNotExist:
             raise Exception("Railway Company with this ID does not exist.")
@@ -77,7 +89,8 @@ class DeleteRailwayCompanyCommand(RailwayCompanyCommand):
                 "railway_name": company.railway_name,
                 "railway_description": company.railway_description,
                 "refund_policy": company.refund_policy,
-                "railway_logo": company.railway_logo
+                "railway_logo": company.railway_logo,
+                "railway_logo_variants": company.railway_logo_variants
             }
             company.delete()
             return f"Railway Company {company.railway_name} deleted successfully."
@@ -97,7 +110,9 @@ class RailwayCompanyCommandHandler:
 
     def execute(self, command, **kwargs):
         # Execute the Command and store it in the undo stack
-        result = command.execute(**kwargs)
+        with transaction.atomic():  # The change and its search outbox rows commit together
+            result = command.execute(**kwargs)
+        bump_version(RailwayCompany)  # Invalidate cached reference data
         self.undo_stack.append(command)
         self.redo_stack.clear()  # Clear redo stack since a new operation is performed
         return result
@@ -107,7 +122,9 @@ class RailwayCompanyCommandHandler:
         if not self.undo_stack:
             raise Exception("Nothing to undo.")
         command = self.undo_stack.pop()
-        command.undo()
+        with transaction.atomic():
+            command.undo()
+        bump_version(RailwayCompany)
         self.redo_stack.append(command)
 
     def redo(self):
@@ -115,7 +132,9 @@ class RailwayCompanyCommandHandler:
         if not self.redo_stack:
             raise Exception("Nothing to redo.")
         command = self.redo_stack.pop()
-        command.execute()
+        with transaction.atomic():
+            command.execute()
+        bump_version(RailwayCompany)
         self.undo_stack.append(command)
 
 
@@ -123,6 +142,7 @@ class RailwayCompanyCommandHandler:
 class RailwayCompanyType(DjangoObjectType):
     class Meta:
         model = RailwayCompany
+        exclude = ('railway_logo_variants',)
 
 
 # Shared handler instance
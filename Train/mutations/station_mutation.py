@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
+from django.db import transaction
 from Train.models import Station
+from Train.versioning import bump_version
 import graphene
 from graphene_django.types import DjangoObjectType
 
@@ -95,7 +97,9 @@ class StationCommandHandler:
 
     def execute(self, command, **kwargs):
         # Execute the Command and store it in the undo stack
-        result = command.execute(**kwargs)
+        with transaction.atomic():  # The change and its search outbox rows commit together
+            result = command.execute(**kwargs)
+        bump_version(Station)  # Invalidate cached reference data
         self.undo_stack.append(command)
         self.redo_stack.clear()  # Clear redo stack since a new operation is performed
         return result
@@ -105,7 +109,9 @@ class StationCommandHandler:
         if not self.undo_stack:
             raise Exception("Nothing to undo.")
         command = self.undo_stack.pop()
-        command.undo()
+        with transaction.atomic():
+            command.undo()
+        bump_version(Station)
         self.redo_stack.append(command)
 
     def redo(self):
@@ -113,7 +119,9 @@ class StationCommandHandler:
         if not self.redo_stack:
             raise Exception("Nothing to redo.")
         command = self.redo_stack.pop()
-        command.execute()
+        with transaction.atomic():
+            command.execute()
+        bump_version(Station)
         self.undo_stack.append(command)
         
         
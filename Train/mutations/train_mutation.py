@@ -1,8 +1,23 @@
 from abc import ABC, abstractmethod
-from Train.models import Train
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from Train.models import Train, Station, RailwayCompany, TrainHall, SeatInventory, TrainType as TrainKind
+from Train.pricing import final_price, percentage, reprice
+from Train.outbox import enqueue
+from Train.timetable import record_changes
+from Train.search_table import refresh_trains, refresh_prices
+from Train.versioning import bump_version
 import graphene
 from graphene_django.types import DjangoObjectType
 
+# Rows per INSERT statement for bulk creation
+BULK_CHUNK_SIZE = getattr(settings, 'TRAIN_BULK_CHUNK_SIZE', 1000)
+# Largest values of the integer and bigint columns
+MAX_INTEGER = 2 ** 31 - 1
+MAX_BIGINT = 2 ** 63 - 1
+
 
 class TrainCommand(ABC):
     """Base Command class for Train operations."""
@@ -30,12 +45,12 @@ class CreateTrainCommand(TrainCommand):
             train_number=train_number,
             departure_datetime=departure_datetime,
             arrival_datetime=arrival_datetime,
-            departure_station=departure_station,
-            arrival_station=arrival_station,
-            railway_company=railway_company,
+            departure_station_id=departure_station,
+            arrival_station_id=arrival_station,
+            railway_company_id=railway_company,
             train_type=train_type,
             capacity=capacity,
-            hall=hall,
+            hall_id=hall,
             stars=stars,
             base_price=base_price,
             tax=tax,
@@ -60,9 +75,9 @@ class UpdateTrainCommand(TrainCommand):
             self.train = Train.objects.get(id=train_id)
             self.previous_data = {field: getattr(self.train, field) for field in kwargs}
 
-            # Update the Train
+            # Update the Train (GraphQL Floats and Strings converted to the field types)
             for field, value in kwargs.items():
-                setattr(self.train, field, value)
+                setattr(self.train, field, Train._meta.get_field(field).to_python(value))
             self.train.save()
             return self.train
         except Train.DoesNotExist:
@@ -110,6 +125,190 @@ class DeleteTrainCommand(TrainCommand):
             Train.objects.create(**self.deleted_data)
 
 
+class BulkValidationError(Exception):
+    """Raised when rows of a bulk operation fail validation; nothing is written."""
+    def __init__(self, errors):
+        super().__init__("Some rows are invalid.")
+        self.errors = errors  # List of (row index, message)
+
+
+class CreateTrainsCommand(TrainCommand):
+    def __init__(self):
+        self.trains = None  # Input rows, kept for redo
+        self.train_ids = []  # To store the created Train ids for undo
+
+    def execute(self, trains=None):
+        if trains is not None:
+            self.trains = [dict(row) for row in trains]
+        instances = self._build(self.trains)
+        # Write the whole batch in one transaction with chunked INSERTs
+        with transaction.atomic():
+            created = Train.objects.bulk_create(instances, batch_size=BULK_CHUNK_SIZE)
+            self.train_ids = [train.id for train in created]
+            # bulk_create() sends no signals
+            enqueue(Train, self.train_ids)
+            record_changes(self.train_ids)
+            refresh_trains(self.train_ids)
+            SeatInventory.objects.bulk_create(
+                [SeatInventory(train_id=train.id, available=train.capacity) for train in created],
+                batch_size=BULK_CHUNK_SIZE
+            )
+        return created
+
+    def undo(self):
+        # Delete all Trains created by this batch
+        if self.train_ids:
+            Train.objects.filter(id__in=self.train_ids).delete()
+            self.train_ids = []
+
+    @staticmethod
+    def _build(rows):
+        """
+        Validate the batch in memory and build unsaved Train instances.
+
+        Foreign keys and existing train numbers are checked with one query per
+        model for the whole batch.
+        """
+        errors = []
+        stations = Station.objects.in_bulk({row[key] for row in rows for key in ('departure_station', 'arrival_station')})
+        companies = RailwayCompany.objects.in_bulk({row['railway_company'] for row in rows})
+        halls = TrainHall.objects.in_bulk({row['hall'] for row in rows})
+        numbers = list({row['train_number'] for row in rows})
+        existing = set()
+        for start in range(0, len(numbers), BULK_CHUNK_SIZE):
+            existing.update(Train.objects.filter(
+                train_number__in=numbers[start:start + BULK_CHUNK_SIZE]
+            ).values_list('train_number', flat=True))
+        train_types = {tag.name for tag in TrainKind}
+
+        seen = set()
+        instances = []
+        for index, row in enumerate(rows):
+            row_errors = []
+            if row['train_number'] in existing:
+                row_errors.append("Train with this number already exists.")
+            elif row['train_number'] in seen:
+                row_errors.append("Train number is duplicated in this batch.")
+            seen.add(row['train_number'])
+
+            try:
+                departure_datetime = parse_datetime(row['departure_datetime'])
+                arrival_datetime = parse_datetime(row['arrival_datetime'])
+            except ValueError:
+                departure_datetime = arrival_datetime = None
+            if departure_datetime is None or arrival_datetime is None:
+                row_errors.append("Invalid departure_datetime or arrival_datetime.")
+            else:
+                # A time without an offset is in the current time zone (naive and aware times do not compare)
+                if timezone.is_naive(departure_datetime):
+                    departure_datetime = timezone.make_aware(departure_datetime)
+                if timezone.is_naive(arrival_datetime):
+                    arrival_datetime = timezone.make_aware(arrival_datetime)
+                if arrival_datetime <= departure_datetime:
+                    row_errors.append("arrival_datetime must be after departure_datetime.")
+
+            for key in ('departure_station', 'arrival_station'):
+                if row[key] not in stations:
+                    row_errors.append(f"Station {row[key]} does not exist.")
+            if row['railway_company'] not in companies:
+                row_errors.append(f"Railway Company {row['railway_company']} does not exist.")
+            if row['hall'] not in halls:
+                row_errors.append(f"Train Hall {row['hall']} does not exist.")
+            if row['train_type'] not in train_types:
+                row_errors.append(f"Invalid train_type {row['train_type']}.")
+
+            # Values that do not fit their columns would fail the whole INSERT
+            for key, maximum in (('capacity', MAX_INTEGER), ('stars', MAX_INTEGER), ('base_price', MAX_BIGINT)):
+                value = row[key]
+                if not (isinstance(value, int) or float(value).is_integer()) or not 0 <= value <= maximum:
+                    row_errors.append(f"{key} must be a whole number between 0 and {maximum}.")
+            prices = {}
+            for key in ('tax', 'discount'):
+                try:
+                    prices[key] = percentage(row[key], key)
+                except Exception as error:
+                    row_errors.append(str(error))
+
+            if not row_errors:
+                price = final_price(int(row['base_price']), prices['tax'], prices['discount'])
+                if price > MAX_BIGINT:
+                    row_errors.append(f"final_price must not exceed {MAX_BIGINT}.")
+            if row_errors:
+                errors.extend((index, message) for message in row_errors)
+                continue
+
+            train = Train(
+                train_number=row['train_number'],
+                departure_datetime=departure_datetime,
+                arrival_datetime=arrival_datetime,
+                departure_station=stations[row['departure_station']],
+                arrival_station=stations[row['arrival_station']],
+                railway_company=companies[row['railway_company']],
+                train_type=row['train_type'],
+                capacity=row['capacity'],
+                hall=halls[row['hall']],
+                stars=row['stars'],
+                base_price=int(row['base_price']),
+                tax=prices['tax'],
+                discount=prices['discount'],
+                final_price=price  # bulk_create() does not call save(), so compute the price here
+            )
+            instances.append(train)
+
+        if errors:
+            raise BulkValidationError(errors)
+        return instances
+
+
+class RepriceTrainsCommand(TrainCommand):
+    def __init__(self):
+        self.filters = None  # Filter and new prices, kept for redo
+        self.tax = None
+        self.discount = None
+        self.previous_prices = []  # To store the previous prices of the changed Trains for undo
+
+    def execute(self, filters=None, tax=None, discount=None):
+        if filters is not None:
+            # Check the new prices before locking the matching rows
+            self.filters, self.tax, self.discount = filters, percentage(tax, 'tax'), percentage(discount, 'discount')
+        queryset = self._queryset(self.filters)
+        with transaction.atomic():
+            # Lock the matching rows so the saved prices are exactly what the UPDATE overwrites
+            self.previous_prices = list(queryset.select_for_update().only('id', 'tax', 'discount', 'final_price'))
+            changed = reprice(queryset, self.tax, self.discount)
+            if changed:
+                enqueue(Train, [train.id for train in self.previous_prices])  # update() sends no signals
+                refresh_prices(queryset)
+            return changed
+
+    def undo(self):
+        # Restore tax, discount and final_price of the changed Trains
+        if self.previous_prices:
+            now = timezone.now()
+            for train in self.previous_prices:
+                train.updated_at = now  # bulk_update() skips auto_now
+            with transaction.atomic():
+                Train.objects.bulk_update(
+                    self.previous_prices, ['tax', 'discount', 'final_price', 'updated_at'], batch_size=BULK_CHUNK_SIZE
+                )
+                enqueue(Train, [train.id for train in self.previous_prices])
+                refresh_prices(Train.objects.filter(id__in=[train.id for train in self.previous_prices]))
+
+    @staticmethod
+    def _queryset(filters):
+        lookups = {
+            'railway_company': 'railway_company_id',
+            'departure_station': 'departure_station_id',
+            'arrival_station': 'arrival_station_id',
+            'departure_from': 'departure_datetime__gte',
+            'departure_to': 'departure_datetime__lt',
+        }
+        conditions = {lookups[key]: value for key, value in filters.items() if value is not None}
+        if not conditions:
+            raise Exception("At least one filter is required to reprice trains.")
+        return Train.objects.filter(**conditions)
+
+
 class TrainCommandHandler:
     def __init__(self):
         self.undo_stack = []  # Stack to store executed Commands
@@ -117,7 +316,9 @@ class TrainCommandHandler:
 
     def execute(self, command, **kwargs):
         # Execute the Command and store it in the undo stack
-        result = command.execute(**kwargs)
+        with transaction.atomic():  # The change and its search outbox rows commit together
+            result = command.execute(**kwargs)
+        bump_version(Train)  # Invalidate cached responses
         self.undo_stack.append(command)
         self.redo_stack.clear()  # Clear redo stack since a new operation is performed
         return result
@@ -127,7 +328,9 @@ class TrainCommandHandler:
         if not self.undo_stack:
             raise Exception("Nothing to undo.")
         command = self.undo_stack.pop()
-        command.undo()
+        with transaction.atomic():
+            command.undo()
+        bump_version(Train)
         self.redo_stack.append(command)
 
     def redo(self):
@@ -135,7 +338,9 @@ class TrainCommandHandler:
         if not self.redo_stack:
             raise Exception("Nothing to redo.")
         command = self.redo_stack.pop()
-        command.execute()
+        with transaction.atomic():
+            command.execute()
+        bump_version(Train)
         self.undo_stack.append(command)
 
 
@@ -145,6 +350,42 @@ class TrainType(DjangoObjectType):
         model = Train
 
 
+# Input and result types for bulk creation
+class TrainInput(graphene.InputObjectType):
+    train_number = graphene.String(required=True)
+    departure_datetime = graphene.String(required=True)
+    arrival_datetime = graphene.String(required=True)
+    departure_station = graphene.Int(required=True)
+    arrival_station = graphene.Int(required=True)
+    railway_company = graphene.Int(required=True)
+    train_type = graphene.String(required=True)
+    capacity = graphene.Int(required=True)
+    hall = graphene.Int(required=True)
+    stars = graphene.Int(required=True)
+    base_price = graphene.Float(required=True)
+    tax = graphene.Float(required=True)
+    discount = graphene.Float(required=True)
+
+
+class TrainRowError(graphene.ObjectType):
+    index = graphene.Int()
+    message = graphene.String()
+
+
+class CreateTrainsResult(graphene.ObjectType):
+    created_count = graphene.Int()
+    trains = graphene.List(TrainType)
+    errors = graphene.List(TrainRowError)
+
+
+class RepriceFilterInput(graphene.InputObjectType):
+    railway_company = graphene.Int()
+    departure_station = graphene.Int()
+    arrival_station = graphene.Int()
+    departure_from = graphene.DateTime()
+    departure_to = graphene.DateTime()
+
+
 # Shared handler instance
 handler = TrainCommandHandler()
 
@@ -183,6 +424,17 @@ class TrainMutations(graphene.ObjectType):
         train_id=graphene.Int(required=True)
     )
 
+    create_trains = graphene.Field(
+        CreateTrainsResult,
+        trains=graphene.List(graphene.NonNull(TrainInput), required=True)
+    )
+
+    reprice_trains = graphene.Int(
+        filter=RepriceFilterInput(required=True),
+        tax=graphene.Float(required=True),
+        discount=graphene.Float(required=True)
+    )
+
     undo_operation = graphene.String()
     redo_operation = graphene.String()
 
@@ -201,6 +453,27 @@ class TrainMutations(graphene.ObjectType):
         command = DeleteTrainCommand()
         return handler.execute(command, train_id=train_id)
 
+    def resolve_create_trains(self, info, trains):
+        # Use Command Handler to create the whole batch as one undoable operation
+        if not trains:
+            # Nothing to create, nothing to undo
+            return CreateTrainsResult(created_count=0, trains=[], errors=[])
+        command = CreateTrainsCommand()
+        try:
+            created = handler.execute(command, trains=trains)
+        except BulkValidationError as error:
+            return CreateTrainsResult(
+                created_count=0,
+                trains=[],
+                errors=[TrainRowError(index=index, message=message) for index, message in error.errors]
+            )
+        return CreateTrainsResult(created_count=len(created), trains=created, errors=[])
+
+    def resolve_reprice_trains(self, info, filter, tax, discount):
+        # Use Command Handler to reprice all matching Trains with one UPDATE; returns the changed row count
+        command = RepriceTrainsCommand()
+        return handler.execute(command, filters=dict(filter), tax=tax, discount=discount)
+
     def resolve_undo_operation(self, info):
         # Undo the last operation
         handler.undo()
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
+from django.db import transaction
 from Train.models import TrainHall
+from Train.versioning import bump_version
 import graphene
 from graphene_django.types import DjangoObjectType
 
@@ -93,7 +95,9 @@ class TrainHallCommandHandler:
 
     def execute(self, command, **kwargs):
         # Execute the Command and store it in the undo stack
-        result = command.execute(**kwargs)
+        with transaction.atomic():  # The change and its search outbox rows commit together
+            result = command.execute(**kwargs)
+        bump_version(TrainHall)  # Invalidate cached reference data
         self.undo_stack.append(command)
         self.redo_stack.clear()  # Clear redo stack since a new operation is performed
         return result
@@ -103,7 +107,9 @@ class TrainHallCommandHandler:
         if not self.undo_stack:
             raise Exception("Nothing to undo.")
         command = self.undo_stack.pop()
-        command.undo()
+        with transaction.atomic():
+            command.undo()
+        bump_version(TrainHall)
         self.redo_stack.append(command)
 
     def redo(self):
@@ -111,7 +117,9 @@ class TrainHallCommandHandler:
         if not self.redo_stack:
             raise Exception("Nothing to redo.")
         command = self.redo_stack.pop()
-        command.execute()
+        with transaction.atomic():
+            command.execute()
+        bump_version(TrainHall)
         self.undo_stack.append(command)
         
         
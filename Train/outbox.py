@@ -0,0 +1,185 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .documents import DOCUMENTS, EMBEDDED_IN_TRAIN, TrainDocument
+from .models import SearchOutbox, SearchRebuild
+from .search_backend import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Outbox rows processed per drain step
+BATCH_SIZE = getattr(settings, 'SEARCH_OUTBOX_BATCH_SIZE', 500)
+# A rebuild registered longer ago than this is considered dead and no longer keeps drained rows (seconds)
+REBUILD_TIMEOUT = getattr(settings, 'SEARCH_REBUILD_TIMEOUT', 24 * 3600)
+
+
+def enqueue(model, ids):
+    """
+    Record that rows of `model` changed.
+
+    Must be called inside the transaction that changes the rows, so the outbox
+    entries commit (or roll back) together with the change.
+    """
+    SearchOutbox.objects.bulk_create(
+        [SearchOutbox(model_label=model._meta.label, object_id=pk) for pk in ids],
+        batch_size=BATCH_SIZE
+    )
+
+
+def enqueue_instance(instance):
+    enqueue(type(instance), [instance.pk])
+
+
+def _actions(label, ids, index=None):
+    """
+    Build bulk actions for the changed rows of one model.
+
+    The current database state decides the action, so any number of updates
+    to the same row collapse into one index (or delete) action. Actions go
+    to the document's alias unless `index` is given.
+    """
+    document = DOCUMENTS[label]
+    index = index or document.index
+    instances = document.get_queryset().in_bulk(ids)
+    for pk in ids:
+        if pk in instances:
+            yield {'op': 'index', 'index': index, 'id': pk, 'document': document.to_document(instances[pk])}
+        else:
+            yield {'op': 'delete', 'index': index, 'id': pk}
+
+
+def _embedding_trains(label, ids, skip, index=None):
+    """Re-index the trains that embed changed stations, companies or halls."""
+    index = index or TrainDocument.index
+    condition = Q()
+    for field in EMBEDDED_IN_TRAIN[label]:
+        condition |= Q(**{f"{field}_id__in": ids})
+    for train in TrainDocument.get_queryset().filter(condition).iterator(chunk_size=BATCH_SIZE):
+        if train.pk not in skip:
+            skip.add(train.pk)
+            yield {'op': 'index', 'index': index, 'id': train.pk, 'document': TrainDocument.to_document(train)}
+
+
+def _chunks(actions, size):
+    chunk = []
+    for action in actions:
+        chunk.append(action)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def drain(batch_size=None, backend=None):
+    """
+    Push one batch of outbox rows to the search backend.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    drainers can run side by side, and are deleted in the same transaction
+    only after the backend accepted them (at-least-once delivery). While an
+    index rebuild runs they are only marked drained: the rebuild replays
+    them into its new index (see replay()).
+    Returns the number of outbox rows processed.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    backend = backend or get_backend()
+    with transaction.atomic():
+        entries = list(
+            SearchOutbox.objects.select_for_update(skip_locked=True).filter(drained=False).order_by('id')[:batch_size]
+        )
+        if not entries:
+            return 0
+
+        # Coalesce repeated changes of the same row
+        changed = defaultdict(set)
+        for entry in entries:
+            changed[entry.model_label].add(entry.object_id)
+
+        train_label = TrainDocument.model._meta.label
+        indexed_trains = set(changed.get(train_label, ()))
+
+        def actions():
+            for label, ids in changed.items():
+                yield from _actions(label, sorted(ids))
+            for label, ids in changed.items():
+                if label in EMBEDDED_IN_TRAIN:
+                    yield from _embedding_trains(label, ids, indexed_trains)
+
+        for chunk in _chunks(actions(), batch_size):
+            backend.bulk(chunk)
+        processed = Q(id__in=[entry.id for entry in entries])
+        # Checked after the rows were read: a rebuild registered later streams them from the database
+        if rebuild_running():
+            SearchOutbox.objects.filter(processed).update(drained=True)
+        else:
+            SearchOutbox.objects.filter(processed | Q(drained=True)).delete()
+
+    logger.debug("Drained %d search outbox rows.", len(entries))
+    return len(entries)
+
+
+def rebuild_running():
+    """Whether an index rebuild is in progress (see the rebuild_search_index command)."""
+    started_after = timezone.now() - timedelta(seconds=REBUILD_TIMEOUT)
+    return SearchRebuild.objects.filter(started_at__gt=started_after).exists()
+
+
+def _labels(document):
+    """Model labels whose outbox rows change documents of `document`'s index."""
+    label = document.model._meta.label
+    return [label, *EMBEDDED_IN_TRAIN] if document is TrainDocument else [label]
+
+
+def replay(document, index, backend=None, after_id=0, batch_size=None):
+    """
+    Ship the current state of the rows named by one batch of outbox entries
+    (drained or not) after `after_id` straight into `index`.
+
+    Used by index rebuilds: changes drained while the new index was being
+    filled went to the old index through the alias. Returns the id of the
+    last entry replayed (`after_id` if there was none) and the number of entries.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    backend = backend or get_backend()
+    entries = list(
+        SearchOutbox.objects.filter(model_label__in=_labels(document), id__gt=after_id)
+        .order_by('id').values_list('id', 'model_label', 'object_id')[:batch_size]
+    )
+    if not entries:
+        return after_id, 0
+
+    changed = defaultdict(set)
+    for _, label, object_id in entries:
+        changed[label].add(object_id)
+    label = document.model._meta.label
+    indexed = changed.pop(label, set())
+
+    def actions():
+        yield from _actions(label, sorted(indexed), index)
+        for embedded_label, ids in changed.items():
+            yield from _embedding_trains(embedded_label, ids, indexed, index)
+
+    for chunk in _chunks(actions(), batch_size):
+        backend.bulk(chunk)
+    return entries[-1][0], len(entries)
+
+
+def requeue(document, after_id, since):
+    """
+    Queue again the outbox entries of `document`'s index created after
+    `after_id` or at `since` and later. Returns the number of rows queued.
+    """
+    entries = (
+        SearchOutbox.objects.filter(Q(id__gt=after_id) | Q(created_at__gte=since), model_label__in=_labels(document))
+        .values_list('model_label', 'object_id').distinct()
+    )
+    rows = SearchOutbox.objects.bulk_create(
+        [SearchOutbox(model_label=label, object_id=object_id) for label, object_id in entries],
+        batch_size=BATCH_SIZE
+    )
+    return len(rows)
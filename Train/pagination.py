@@ -0,0 +1,113 @@
+import base64
+import json
+import graphene
+from django.conf import settings
+from django.db.models import Q
+
+
+# Page size limits for list queries (can be overridden in settings.py)
+DEFAULT_PAGE_SIZE = getattr(settings, 'GRAPHQL_DEFAULT_PAGE_SIZE', 50)
+MAX_PAGE_SIZE = getattr(settings, 'GRAPHQL_MAX_PAGE_SIZE', 500)
+
+# Keyset orderings used by the list queries
+TRAIN_ORDERING = ('departure_datetime', 'id')
+ID_ORDERING = ('id',)
+
+
+def encode_cursor(instance, ordering):
+    """
+    Encode the ordering values of an instance as an opaque cursor.
+    """
+    values = [instance._meta.get_field(field).value_to_string(instance) for field in ordering]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, ordering):
+    """
+    Decode a cursor back into the ordering values it was built from.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        raise Exception("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise Exception("Invalid cursor.")
+    return values
+
+
+def seek_filter(ordering, values):
+    """
+    Build a Q object selecting rows strictly after `values` in `ordering`,
+    i.e. (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y).
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        term = Q(**{f"{field}__gt": values[index]})
+        for previous_field, previous_value in zip(ordering[:index], values[:index]):
+            term &= Q(**{previous_field: previous_value})
+        condition |= term
+    return condition
+
+
+def page_size(first):
+    """
+    Clamp the requested page size to the allowed range.
+    """
+    if first is None:
+        return DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise Exception("Argument 'first' must be a non-negative integer.")
+    if first > MAX_PAGE_SIZE:
+        raise Exception(f"Argument 'first' must not exceed {MAX_PAGE_SIZE}.")
+    return first
+
+
+def _page_queryset(queryset, ordering, limit, after):
+    queryset = queryset.order_by(*ordering)
+    if after:
+        queryset = queryset.filter(seek_filter(ordering, decode_cursor(after, ordering)))
+    # Fetch one extra row to know whether there is a next page
+    return queryset[:limit + 1]
+
+
+def connection_from_rows(rows, connection_type, ordering, limit, after):
+    """
+    Build a connection from the rows of a page, fetched with one extra row
+    (see _page_queryset()) to know whether there is a next page.
+    """
+    has_next_page = len(rows) > limit
+    rows = rows[:limit]
+
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row, ordering))
+        for row in rows
+    ]
+    page_info = graphene.relay.PageInfo(
+        has_next_page=has_next_page,
+        has_previous_page=bool(after),
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+    )
+    return connection_type(edges=edges, page_info=page_info)
+
+
+def paginate(queryset, connection_type, ordering, first=None, after=None):
+    """
+    Keyset (seek) pagination over `queryset`.
+
+    Rows are ordered by `ordering` and the page starts right after the row the
+    `after` cursor points to, so fetching a deep page costs the same as
+    fetching the first one (no OFFSET, no COUNT).
+    """
+    limit = page_size(first)
+    rows = list(_page_queryset(queryset, ordering, limit, after))
+    return connection_from_rows(rows, connection_type, ordering, limit, after)
+
+
+async def apaginate(queryset, connection_type, ordering, first=None, after=None):
+    """
+    Async version of paginate() using Django's async ORM.
+    """
+    limit = page_size(first)
+    rows = [row async for row in _page_queryset(queryset, ordering, limit, after)]
+    return connection_from_rows(rows, connection_type, ordering, limit, after)
@@ -0,0 +1,101 @@
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from math import gcd
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.functions import Now
+from django.db.models.lookups import Exact, GreaterThan
+
+
+def _hundredths(value):
+    """Return a percentage as an exact integer number of hundredths (12.5 -> 1250)."""
+    hundredths = Decimal(str(value)) * 100
+    if hundredths != hundredths.to_integral_value():
+        raise Exception("Tax and discount can have at most two decimal places.")
+    return int(hundredths)
+
+
+def percentage(value, name):
+    """
+    Return a tax or discount as a Decimal that fits its numeric(5, 2) column:
+    between 0 and 100 with at most two decimal places. Nothing is rounded.
+    """
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise Exception(f"Invalid {name}.")
+    if not value.is_finite() or not 0 <= value <= 100:
+        raise Exception(f"{name.capitalize()} must be between 0 and 100.")
+    if value * 100 != (value * 100).to_integral_value():
+        raise Exception(f"{name.capitalize()} can have at most two decimal places.")
+    return value
+
+
+@lru_cache(maxsize=256)
+def _price_factor(tax, discount):
+    return (10000 - _hundredths(discount)) * (10000 + _hundredths(tax))
+
+
+def final_price(base_price, tax, discount):
+    """
+    Python version of final_price_expression() for rows built outside the ORM
+    (bulk loads): the same exact fraction, rounded half-to-even.
+    """
+    quotient, remainder = divmod(int(base_price) * _price_factor(tax, discount), 10 ** 8)
+    if remainder * 2 > 10 ** 8 or (remainder * 2 == 10 ** 8 and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def final_price_expression(tax, discount):
+    """
+    SQL expression computing `final_price` from `base_price` for a given tax and discount.
+
+    Train.final_price_calculated evaluates
+        round(base_price * (1 - discount / 100) * (1 + tax / 100))
+    with Decimals, i.e. an exact fraction rounded half-to-even. SQL ROUND()
+    rounds half away from zero, so the same fraction is computed here with
+    integers instead:
+        base_price * numerator / denominator
+    and the quotient is rounded half-to-even by looking at the remainder.
+
+    base_price * numerator alone overflows a bigint for prices above about
+    10 ** 10, so base_price is split into whole multiples of the denominator
+    and a remainder first:
+        whole * numerator + remainder * numerator / denominator
+    The first term is at most the final price and the second product stays
+    below 10 ** 18, so nothing overflows unless the final price itself does.
+    """
+    numerator = (10000 - _hundredths(discount)) * (10000 + _hundredths(tax))
+    denominator = 10 ** 8
+    divisor = gcd(numerator, denominator) or 1
+    numerator, denominator = numerator // divisor, denominator // divisor
+
+    whole = F('base_price') / Value(denominator)  # Integer division (base_price >= 0)
+    scaled = (F('base_price') - whole * Value(denominator)) * Value(numerator)
+    scaled_quotient = scaled / Value(denominator)
+    quotient = whole * Value(numerator) + scaled_quotient
+    double_remainder = (scaled - scaled_quotient * Value(denominator)) * Value(2)
+    return Case(
+        When(GreaterThan(double_remainder, denominator), then=quotient + Value(1)),
+        When(Exact(double_remainder, denominator), then=quotient + quotient % Value(2)),
+        default=quotient,
+        output_field=BigIntegerField(),
+    )
+
+
+def reprice(queryset, tax, discount):
+    """
+    Set tax, discount and final_price on every train of `queryset` with one UPDATE.
+
+    Rows that already have this tax and discount are skipped, so the returned
+    count is the number of rows that actually changed. A tax or discount that
+    does not fit its column raises before anything is written.
+    """
+    tax = percentage(tax, 'tax')
+    discount = percentage(discount, 'discount')
+    return queryset.exclude(tax=tax, discount=discount).update(
+        tax=tax,
+        discount=discount,
+        final_price=final_price_expression(tax, discount),
+        updated_at=Now(),  # update() skips auto_now
+    )
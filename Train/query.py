@@ -1,81 +1,355 @@
+from datetime import timedelta
 import graphene
 from graphene_django.types import DjangoObjectType
-from .models import Train, RailwayCompany, TrainHall, Station
+from .models import Train, RailwayCompany, TrainHall, Station, SeatInventory
+from .pagination import paginate, page_size, connection_from_rows, TRAIN_ORDERING, ID_ORDERING, MAX_PAGE_SIZE
+from .loaders import get_loaders, then
+from .selection import selected_fields
+from .search import search_trains, search_trains_by_place
+from .reference_data import reference_data
+from .station_suggest import station_index
+from .inventory import availability
+from .seat_map import SeatMap
+from .logos import variant_list
+from .timetable import timetable
+
+# Foreign keys of Train that can be joined with select_related
+TRAIN_RELATIONS = ('departure_station', 'arrival_station', 'railway_company', 'hall')
+# Columns every Train row needs: the cursor (TRAIN_ORDERING) and the keys prime_trains() queues
+TRAIN_REQUIRED_COLUMNS = ('id', *TRAIN_ORDERING, *TRAIN_RELATIONS)
+# Columns read by TrainType resolvers of fields that are not columns themselves
+TRAIN_FIELD_COLUMNS = {
+    'seat_map': ('train_type', 'capacity'),
+}
+TRAIN_COLUMNS = {field.name for field in Train._meta.concrete_fields}
+
+
+def _related_object(root, field_name, loader):
+    # Use the joined object if select_related already fetched it
+    if Train._meta.get_field(field_name).is_cached(root):
+        return getattr(root, field_name)
+    return loader.load(getattr(root, f"{field_name}_id"))
+
+
+def with_selected_columns(queryset, info, *path):
+    """
+    Load only the Train columns the fields requested below `path` need
+    (only()), and join the requested foreign keys with select_related.
+    """
+    fields = selected_fields(info, *path)
+    columns = set(TRAIN_REQUIRED_COLUMNS)
+    for field in fields:
+        if field in TRAIN_COLUMNS:
+            columns.add(field)
+        columns.update(TRAIN_FIELD_COLUMNS.get(field, ()))
+    related = [field for field in TRAIN_RELATIONS if field in fields]
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns)
 
 
 # GraphQL Types for Models
+class SeatMapType(graphene.ObjectType):
+    """Seats of a train in seat-selection order; `bitmap` is the base64 seat map (bit N - 1: seat N taken)."""
+    train_type = graphene.String()
+    capacity = graphene.Int()
+    compartment_size = graphene.Int()
+    aisle_after = graphene.Int()
+    free = graphene.Int()
+    taken_seats = graphene.List(graphene.Int)
+    bitmap = graphene.String()
+    # Seats to hold for a party: side by side in one compartment when possible
+    suggested_seats = graphene.List(graphene.Int, count=graphene.Int(required=True))
+
+    def resolve_suggested_seats(root, info, count):
+        return root.suggest(count)
+
+
 class TrainType(DjangoObjectType):
+    seat_map = graphene.Field(SeatMapType)
+
     class Meta:
         model = Train
 
+    def resolve_departure_station(root, info):
+        return _related_object(root, 'departure_station', get_loaders(info).station)
+
+    def resolve_arrival_station(root, info):
+        return _related_object(root, 'arrival_station', get_loaders(info).station)
+
+    def resolve_railway_company(root, info):
+        return _related_object(root, 'railway_company', get_loaders(info).railway_company)
+
+    def resolve_hall(root, info):
+        return _related_object(root, 'hall', get_loaders(info).hall)
+
+    def resolve_inventory(root, info):
+        return get_loaders(info).inventory.load(root.id)
+
+    def resolve_seat_map(root, info):
+        return then(
+            get_loaders(info).inventory.load(root.id),
+            lambda inventory: SeatMap(root, inventory.seat_map, inventory.available) if inventory else SeatMap(root, None),
+        )
+
+
+class SeatInventoryType(DjangoObjectType):
+    train_id = graphene.Int()
+
+    class Meta:
+        model = SeatInventory
+        fields = ('available', 'held', 'sold')
+
+
+class LogoVariantType(graphene.ObjectType):
+    """A resized WebP copy of a logo; its URL never changes content, so it can be cached indefinitely."""
+    variant = graphene.String()
+    url = graphene.String()
+    width = graphene.Int()
+    height = graphene.Int()
+
+
+def _train_page(info, loader, key, first, after):
+    """A keyset-paginated page of the trains of a station, company or hall, batched over the whole list."""
+    limit = page_size(first)
+    loaders = get_loaders(info)
+
+    def page(trains):
+        loaders.prime_trains(trains[:limit])
+        return connection_from_rows(trains, TrainConnection, TRAIN_ORDERING, limit, after)
+    return then(loader.load(key, limit, after), page)
+
 
 class RailwayCompanyType(DjangoObjectType):
+    logo_variants = graphene.List(graphene.NonNull(LogoVariantType))
+    train_set = graphene.Field(lambda: TrainConnection, first=graphene.Int(), after=graphene.String())
+
     class Meta:
         model = RailwayCompany
+        exclude = ('railway_logo_variants',)
+
+    def resolve_logo_variants(root, info):
+        return variant_list(root)
+
+    def resolve_train_set(root, info, first=None, after=None):
+        return _train_page(info, get_loaders(info).company_trains, root.id, first, after)
 
 
 class TrainHallType(DjangoObjectType):
+    train_set = graphene.Field(lambda: TrainConnection, first=graphene.Int(), after=graphene.String())
+
     class Meta:
         model = TrainHall
 
+    def resolve_train_set(root, info, first=None, after=None):
+        return _train_page(info, get_loaders(info).hall_trains, root.id, first, after)
+
 
 class StationType(DjangoObjectType):
+    departures = graphene.Field(lambda: TrainConnection, first=graphene.Int(), after=graphene.String())
+    arrivals = graphene.Field(lambda: TrainConnection, first=graphene.Int(), after=graphene.String())
+
     class Meta:
         model = Station
 
+    def resolve_departures(root, info, first=None, after=None):
+        return _train_page(info, get_loaders(info).departures, root.id, first, after)
+
+    def resolve_arrivals(root, info, first=None, after=None):
+        return _train_page(info, get_loaders(info).arrivals, root.id, first, after)
+
+
+# Relay-style Connections for list queries
+class TrainConnection(graphene.relay.Connection):
+    class Meta:
+        node = TrainType
+
+
+class RailwayCompanyConnection(graphene.relay.Connection):
+    class Meta:
+        node = RailwayCompanyType
+
+
+class TrainHallConnection(graphene.relay.Connection):
+    class Meta:
+        node = TrainHallType
+
+
+class StationConnection(graphene.relay.Connection):
+    class Meta:
+        node = StationType
+
+
+# Route search inputs
+class TrainSortField(graphene.Enum):
+    DEPARTURE_TIME = 'DEPARTURE_TIME'
+    PRICE = 'PRICE'
+    DURATION = 'DURATION'
+
+
+class TimeWindowInput(graphene.InputObjectType):
+    start = graphene.Time()
+    end = graphene.Time()
+
 
 # Query Classes
 class TrainQueries(graphene.ObjectType):
-    all_trains = graphene.List(TrainType)
+    all_trains = graphene.Field(TrainConnection, first=graphene.Int(), after=graphene.String())
     train_by_number = graphene.Field(TrainType, train_number=graphene.String(required=True))
+    search_trains = graphene.List(
+        TrainType,
+        departure_station=graphene.Int(required=True),
+        arrival_station=graphene.Int(required=True),
+        date=graphene.Date(required=True),
+        time_window=TimeWindowInput(),
+        sort_by=TrainSortField(default_value=TrainSortField.DEPARTURE_TIME.value),
+        first=graphene.Int()
+    )
+    search_trains_by_place = graphene.List(
+        TrainType,
+        date=graphene.Date(required=True),
+        departure_city=graphene.String(),
+        arrival_city=graphene.String(),
+        departure_province=graphene.String(),
+        arrival_province=graphene.String(),
+        railway_name=graphene.String(),
+        time_window=TimeWindowInput(),
+        sort_by=TrainSortField(default_value=TrainSortField.DEPARTURE_TIME.value),
+        first=graphene.Int()
+    )
 
-    def resolve_all_trains(self, info, **kwargs):
-        return Train.objects.all()
+    def resolve_all_trains(self, info, first=None, after=None):
+        queryset = with_selected_columns(Train.objects.all(), info, 'edges', 'node')
+        connection = paginate(queryset, TrainConnection, TRAIN_ORDERING, first=first, after=after)
+        get_loaders(info).prime_trains(edge.node for edge in connection.edges)
+        return connection
 
     def resolve_train_by_number(self, info, train_number):
         try:
-            return Train.objects.get(train_number=train_number)
+            return with_selected_columns(Train.objects.all(), info).get(train_number=train_number)
         except Train.DoesNotExist:
             return None
 
+    def resolve_search_trains(self, info, departure_station, arrival_station, date,
+                              time_window=None, sort_by=TrainSortField.DEPARTURE_TIME.value, first=None):
+        time_window = time_window or {}
+        queryset = search_trains(
+            departure_station, arrival_station, date,
+            start_time=time_window.get('start'),
+            end_time=time_window.get('end'),
+            sort_by=sort_by,
+        )
+        queryset = with_selected_columns(queryset, info)
+        return get_loaders(info).prime_trains(queryset[:page_size(first)])
+
+    def resolve_search_trains_by_place(self, info, date, time_window=None,
+                                       sort_by=TrainSortField.DEPARTURE_TIME.value, first=None, **places):
+        time_window = time_window or {}
+        queryset = search_trains_by_place(
+            date,
+            start_time=time_window.get('start'),
+            end_time=time_window.get('end'),
+            sort_by=sort_by,
+            **places,
+        )
+        queryset = with_selected_columns(queryset, info)
+        return get_loaders(info).prime_trains(queryset[:page_size(first)])
+
 
 class RailwayCompanyQueries(graphene.ObjectType):
-    all_railway_companies = graphene.List(RailwayCompanyType)
+    all_railway_companies = graphene.Field(RailwayCompanyConnection, first=graphene.Int(), after=graphene.String())
     railway_company_by_name = graphene.Field(RailwayCompanyType, railway_name=graphene.String(required=True))
 
-    def resolve_all_railway_companies(self, info, **kwargs):
-        return RailwayCompany.objects.all()
+    def resolve_all_railway_companies(self, info, first=None, after=None):
+        connection = paginate(RailwayCompany.objects.all(), RailwayCompanyConnection, ID_ORDERING, first=first, after=after)
+        get_loaders(info).prime_railway_companies(edge.node for edge in connection.edges)
+        return connection
 
     def resolve_railway_company_by_name(self, info, railway_name):
-        try:
-            return RailwayCompany.objects.get(railway_name=railway_name)
-        except RailwayCompany.DoesNotExist:
-            return None
+        return reference_data.railway_company_by_name(railway_name)
 
 
 class TrainHallQueries(graphene.ObjectType):
-    all_train_halls = graphene.List(TrainHallType)
+    all_train_halls = graphene.Field(TrainHallConnection, first=graphene.Int(), after=graphene.String())
     train_hall_by_name = graphene.Field(TrainHallType, hall_name=graphene.String(required=True))
 
-    def resolve_all_train_halls(self, info, **kwargs):
-        return TrainHall.objects.all()
+    def resolve_all_train_halls(self, info, first=None, after=None):
+        connection = paginate(TrainHall.objects.all(), TrainHallConnection, ID_ORDERING, first=first, after=after)
+        get_loaders(info).prime_train_halls(edge.node for edge in connection.edges)
+        return connection
 
     def resolve_train_hall_by_name(self, info, hall_name):
-        try:
-            return TrainHall.objects.get(hall_name=hall_name)
-        except TrainHall.DoesNotExist:
-            return None
+        return reference_data.train_hall_by_name(hall_name)
 
 
 class StationQueries(graphene.ObjectType):
-    all_stations = graphene.List(StationType)
+    all_stations = graphene.Field(StationConnection, first=graphene.Int(), after=graphene.String())
     station_by_name = graphene.Field(StationType, station_name=graphene.String(required=True))
+    station_suggest = graphene.List(
+        graphene.NonNull(StationType),
+        prefix=graphene.String(required=True),
+        limit=graphene.Int(default_value=10)
+    )
 
-    def resolve_all_stations(self, info, **kwargs):
-        return Station.objects.all()
+    def resolve_all_stations(self, info, first=None, after=None):
+        connection = paginate(Station.objects.all(), StationConnection, ID_ORDERING, first=first, after=after)
+        get_loaders(info).prime_stations(edge.node for edge in connection.edges)
+        return connection
 
     def resolve_station_by_name(self, info, station_name):
-        try:
-            return Station.objects.get(station_name=station_name)
-        except Station.DoesNotExist:
-            return None
\ No newline at end of file
+        return reference_data.station_by_name(station_name)
+
+    def resolve_station_suggest(self, info, prefix, limit=10):
+        return station_index.suggest(prefix, limit)
+
+
+class SeatInventoryQueries(graphene.ObjectType):
+    seat_availability = graphene.List(
+        SeatInventoryType,
+        train_ids=graphene.List(graphene.NonNull(graphene.Int), required=True)
+    )
+
+    def resolve_seat_availability(self, info, train_ids):
+        if len(train_ids) > MAX_PAGE_SIZE:
+            raise Exception(f"At most {MAX_PAGE_SIZE} trains can be checked at once.")
+        inventories = availability(train_ids)
+        return [inventories[train_id] for train_id in train_ids if train_id in inventories]
+
+
+class JourneyType(graphene.ObjectType):
+    departure_datetime = graphene.DateTime()
+    arrival_datetime = graphene.DateTime()
+    transfers = graphene.Int()
+    legs = graphene.List(TrainType)
+
+
+def plan_journeys(info, from_station, to_station, depart_after, max_transfers, min_transfer_time):
+    journeys = timetable.plan_journey(
+        from_station, to_station, depart_after, max_transfers, timedelta(minutes=min_transfer_time)
+    )
+    trains = Train.objects.in_bulk({pk for journey in journeys for pk in journey})
+    get_loaders(info).prime_trains(trains.values())
+    return [
+        {
+            'departure_datetime': trains[journey[0]].departure_datetime,
+            'arrival_datetime': trains[journey[-1]].arrival_datetime,
+            'transfers': len(journey) - 1,
+            'legs': [trains[pk] for pk in journey],
+        }
+        # The timetable may lag behind a deletion by a second
+        for journey in journeys if all(pk in trains for pk in journey)
+    ]
+
+
+class JourneyQueries(graphene.ObjectType):
+    plan_journey = graphene.List(
+        JourneyType,
+        from_station=graphene.Int(required=True, name='from'),
+        to_station=graphene.Int(required=True, name='to'),
+        depart_after=graphene.DateTime(required=True),
+        max_transfers=graphene.Int(default_value=2),
+        min_transfer_time=graphene.Int(default_value=15, description="Minimum time to change trains, in minutes.")
+    )
+
+    def resolve_plan_journey(self, info, from_station, to_station, depart_after, max_transfers=2, min_transfer_time=15):
+        return plan_journeys(info, from_station, to_station, depart_after, max_transfers, min_transfer_time)
@@ -0,0 +1,101 @@
+import threading
+import time
+from django.conf import settings
+from .models import Station, RailwayCompany, TrainHall
+from .versioning import model_versions, local_generation
+
+# How often a worker compares its snapshot with the shared versions (seconds)
+CHECK_INTERVAL = getattr(settings, 'REFERENCE_DATA_CHECK_INTERVAL', 1.0)
+# Hard upper bound on the age of a snapshot, even if no version bump was seen (seconds)
+MAX_AGE = getattr(settings, 'REFERENCE_DATA_MAX_AGE', 60.0)
+
+REFERENCE_MODELS = (Station, RailwayCompany, TrainHall)
+
+
+class ReferenceSnapshot:
+    """Immutable in-memory copy of the Station, RailwayCompany and TrainHall tables."""
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.stations = Station.objects.in_bulk()
+        self.railway_companies = RailwayCompany.objects.in_bulk()
+        self.train_halls = TrainHall.objects.in_bulk()
+        # Names are not unique in the database: the oldest row wins, as with `.first()`
+        self.stations_by_name = self._by_name(self.stations, 'station_name')
+        self.railway_companies_by_name = self._by_name(self.railway_companies, 'railway_name')
+        self.train_halls_by_name = self._by_name(self.train_halls, 'hall_name')
+
+    @staticmethod
+    def _by_name(rows, field):
+        by_name = {}
+        for pk in sorted(rows):
+            by_name.setdefault(getattr(rows[pk], field), rows[pk])
+        return by_name
+
+
+class ReferenceData:
+    """
+    Per-process holder of the current ReferenceSnapshot.
+
+    A snapshot is replaced when the shared version of one of the reference
+    models changes (the Create/Update/Delete commands bump it) or when it gets
+    older than MAX_AGE, so every process sees a write within
+    CHECK_INTERVAL seconds on a shared cache and within MAX_AGE seconds in
+    any case.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._generation = local_generation()
+
+    def snapshot(self):
+        now = time.monotonic()
+        snapshot = self._snapshot
+        generation = local_generation()
+        # Writes made by this process are visible immediately
+        if snapshot is not None and now - self._checked_at < CHECK_INTERVAL and generation == self._generation:
+            return snapshot
+
+        version = model_versions(*REFERENCE_MODELS)
+        if snapshot is None or snapshot.version != version or now - snapshot.loaded_at >= MAX_AGE:
+            with self._lock:
+                # Another thread may have reloaded while we were waiting
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version or now - snapshot.loaded_at >= MAX_AGE:
+                    snapshot = ReferenceSnapshot(version)
+                    self._snapshot = snapshot
+        self._checked_at = now
+        self._generation = generation
+        return snapshot
+
+    def invalidate(self):
+        """Force a reload on the next access in this process."""
+        self._snapshot = None
+
+    # Lookups by id
+    def stations_by_ids(self, ids):
+        stations = self.snapshot().stations
+        return {pk: stations[pk] for pk in ids if pk in stations}
+
+    def railway_companies_by_ids(self, ids):
+        companies = self.snapshot().railway_companies
+        return {pk: companies[pk] for pk in ids if pk in companies}
+
+    def train_halls_by_ids(self, ids):
+        halls = self.snapshot().train_halls
+        return {pk: halls[pk] for pk in ids if pk in halls}
+
+    # Lookups by name
+    def station_by_name(self, station_name):
+        return self.snapshot().stations_by_name.get(station_name)
+
+    def railway_company_by_name(self, railway_name):
+        return self.snapshot().railway_companies_by_name.get(railway_name)
+
+    def train_hall_by_name(self, hall_name):
+        return self.snapshot().train_halls_by_name.get(hall_name)
+
+
+# Shared instance for this process
+reference_data = ReferenceData()
@@ -3,16 +3,31 @@ from Train.mutations.station_mutation import StationMutations
 from Train.mutations.railway_mutation import RailwayCompanyMutations
 from Train.mutations.trainhall_mutation import TrainHallMutations
 from Train.mutations.train_mutation import TrainMutations
-from Train.query import TrainQueries, RailwayCompanyQueries, TrainHallQueries, StationQueries
+from Train.mutations.inventory_mutation import SeatInventoryMutations
+from Train.query import (
+    TrainQueries, RailwayCompanyQueries, TrainHallQueries, StationQueries, SeatInventoryQueries, JourneyQueries,
+)
+from Train.async_query import (
+    AsyncTrainQueries, AsyncRailwayCompanyQueries, AsyncTrainHallQueries, AsyncStationQueries,
+    AsyncSeatInventoryQueries, AsyncJourneyQueries,
+)
 
 
 # Combine all mutations into a single class
-class Mutation(StationMutations, RailwayCompanyMutations, TrainHallMutations, TrainMutations, graphene.ObjectType):
+class Mutation(StationMutations, RailwayCompanyMutations, TrainHallMutations, TrainMutations, SeatInventoryMutations,
+               graphene.ObjectType):
     pass
 
 
 # Combine all queries into a single class
-class Query(TrainQueries, RailwayCompanyQueries, TrainHallQueries, StationQueries, graphene.ObjectType):
+class Query(TrainQueries, RailwayCompanyQueries, TrainHallQueries, StationQueries, SeatInventoryQueries,
+            JourneyQueries, graphene.ObjectType):
+    pass
+
+
+# Combine all async queries into a single class (for the async endpoint)
+class AsyncQuery(AsyncTrainQueries, AsyncRailwayCompanyQueries, AsyncTrainHallQueries, AsyncStationQueries,
+                 AsyncSeatInventoryQueries, AsyncJourneyQueries, graphene.ObjectType):
     pass
 
 
@@ -0,0 +1,75 @@
+from datetime import datetime, time, timedelta
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.utils import timezone
+from .models import Train
+
+# Sort options for route search (the tie-breakers keep the order stable)
+SORT_ORDERINGS = {
+    'DEPARTURE_TIME': ('departure_datetime', 'id'),
+    'PRICE': ('final_price', 'departure_datetime', 'id'),
+    'DURATION': ('duration', 'departure_datetime', 'id'),
+}
+
+
+def departure_range(date, start_time=None, end_time=None):
+    """
+    Return the [start, end) departure datetimes for a date and an optional time window.
+    """
+    start = timezone.make_aware(datetime.combine(date, start_time or time.min))
+    if end_time is None:
+        end = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+    else:
+        end = timezone.make_aware(datetime.combine(date, end_time))
+    if end <= start:
+        raise Exception("Time window end must be after its start.")
+    return start, end
+
+
+def search_trains(departure_station, arrival_station, date, start_time=None, end_time=None, sort_by='DEPARTURE_TIME'):
+    """
+    Trains from `departure_station` to `arrival_station` departing on `date`.
+
+    The filter is two equalities plus a range on departure_datetime, which is
+    exactly the prefix of `train_route_search_idx`, so the database answers it
+    with a single index range scan.
+    """
+    start, end = departure_range(date, start_time, end_time)
+    queryset = Train.objects.filter(
+        departure_station_id=departure_station,
+        arrival_station_id=arrival_station,
+        departure_datetime__gte=start,
+        departure_datetime__lt=end,
+    )
+    if sort_by == 'DURATION':
+        queryset = queryset.annotate(duration=ExpressionWrapper(
+            F('arrival_datetime') - F('departure_datetime'), output_field=DurationField()
+        ))
+    return queryset.order_by(*SORT_ORDERINGS[sort_by])
+
+
+# Place filters of `search_trains_by_place` and the search table column each one uses
+PLACE_FILTERS = ('departure_city', 'arrival_city', 'departure_province', 'arrival_province', 'railway_name')
+PLACE_SORT_ORDERINGS = {
+    'DEPARTURE_TIME': ('search_row__departure_datetime', 'id'),
+    'PRICE': ('search_row__final_price', 'search_row__departure_datetime', 'id'),
+    'DURATION': ('search_row__duration', 'search_row__departure_datetime', 'id'),
+}
+
+
+def search_trains_by_place(date, start_time=None, end_time=None, sort_by='DEPARTURE_TIME', **places):
+    """
+    Trains departing on `date` filtered by station city or province and company name.
+
+    The filters run on the denormalised search table (TrainSearchRow), whose
+    indexes start with the place columns followed by departure_datetime, so
+    no join with Station or RailwayCompany is needed.
+    """
+    conditions = {f"search_row__{name}": value for name, value in places.items() if value}
+    if not conditions:
+        raise Exception("At least one of departure/arrival city or province, or railway name, is required.")
+    start, end = departure_range(date, start_time, end_time)
+    return Train.objects.filter(
+        search_row__departure_datetime__gte=start,
+        search_row__departure_datetime__lt=end,
+        **conditions,
+    ).order_by(*PLACE_SORT_ORDERINGS[sort_by])
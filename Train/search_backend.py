@@ -0,0 +1,118 @@
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SearchBackend:
+    """Base class for the search engine the documents are pushed to."""
+    def bulk(self, actions):
+        """
+        Apply a list of actions, each a dict with `op` ('index' or 'delete'),
+        `index`, `id` and (for 'index') `document`.
+        """
+        raise NotImplementedError
+
+    def create_index(self, name):
+        """Create an empty concrete index."""
+        raise NotImplementedError
+
+    def swap_alias(self, alias, index):
+        """
+        Atomically point `alias` at `index` only; return the indexes it pointed at before.
+        """
+        raise NotImplementedError
+
+    def delete_index(self, name):
+        raise NotImplementedError
+
+
+class ElasticsearchBackend(SearchBackend):
+    """Pushes actions to Elasticsearch with the bulk API."""
+    def __init__(self, hosts=None, **options):
+        from elasticsearch import Elasticsearch  # Imported lazily: only needed when this backend is used
+        self.client = Elasticsearch(hosts or getattr(settings, 'ELASTICSEARCH_HOSTS', ['http://localhost:9200']), **options)
+
+    def bulk(self, actions):
+        from elasticsearch.helpers import bulk
+        bulk(self.client, [
+            {'_op_type': 'index', '_index': action['index'], '_id': action['id'], '_source': action['document']}
+            if action['op'] == 'index' else
+            {'_op_type': 'delete', '_index': action['index'], '_id': action['id']}
+            for action in actions
+        ], raise_on_error=True, ignore_status=(404,))
+
+    def create_index(self, name):
+        self.client.indices.create(index=name)
+
+    def swap_alias(self, alias, index):
+        actions = [{'add': {'index': index, 'alias': alias}}]
+        previous = []
+        if self.client.indices.exists_alias(name=alias):
+            previous = list(self.client.indices.get_alias(name=alias).keys())
+            actions = [{'remove': {'index': name, 'alias': alias}} for name in previous] + actions
+        elif self.client.indices.exists(index=alias):
+            # A concrete index still uses the alias name (first rebuild): drop it in the same request
+            actions.append({'remove_index': {'index': alias}})
+        self.client.indices.update_aliases(actions=actions)
+        return previous
+
+    def delete_index(self, name):
+        self.client.indices.delete(index=name, ignore_unavailable=True)
+
+
+class InMemoryBackend(SearchBackend):
+    """Local stand-in for the search engine (development and tests)."""
+    def __init__(self, **options):
+        self.lock = threading.Lock()
+        self.indexes = {}  # {index name: {id: document}}
+        self.aliases = {}  # {alias: index name}
+        self.requests = 0  # Number of bulk requests received
+
+    def bulk(self, actions):
+        with self.lock:
+            self.requests += 1
+            for action in actions:
+                name = self.aliases.get(action['index'], action['index'])
+                index = self.indexes.setdefault(name, {})
+                if action['op'] == 'index':
+                    index[action['id']] = action['document']
+                else:
+                    index.pop(action['id'], None)
+
+    def create_index(self, name):
+        with self.lock:
+            self.indexes[name] = {}
+
+    def swap_alias(self, alias, index):
+        with self.lock:
+            previous = self.aliases.get(alias)
+            self.aliases[alias] = index
+            # A concrete index still uses the alias name (first rebuild)
+            self.indexes.pop(alias, None)
+            return [previous] if previous else []
+
+    def delete_index(self, name):
+        with self.lock:
+            self.indexes.pop(name, None)
+
+    def documents(self, name):
+        """Return the documents of an index or alias."""
+        return self.indexes.get(self.aliases.get(name, name), {})
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Return the configured search backend (settings.SEARCH_BACKEND), created once per process.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'SEARCH_BACKEND', {})
+                backend_class = import_string(config.get('BACKEND', 'Train.search_backend.InMemoryBackend'))
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
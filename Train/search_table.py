@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, OuterRef, Q, QuerySet, Subquery
+from .models import Train, Station, RailwayCompany, TrainHall, TrainSearchRow
+
+# Search row field -> Train lookup it copies
+ROW_FIELDS = {
+    'train_number': 'train_number',
+    'departure_datetime': 'departure_datetime',
+    'arrival_datetime': 'arrival_datetime',
+    'departure_station_id': 'departure_station_id',
+    'departure_station_name': 'departure_station__station_name',
+    'departure_city': 'departure_station__station_city',
+    'departure_province': 'departure_station__station_province',
+    'arrival_station_id': 'arrival_station_id',
+    'arrival_station_name': 'arrival_station__station_name',
+    'arrival_city': 'arrival_station__station_city',
+    'arrival_province': 'arrival_station__station_province',
+    'railway_company_id': 'railway_company_id',
+    'railway_name': 'railway_company__railway_name',
+    'hall_id': 'hall_id',
+    'hall_name': 'hall__hall_name',
+    'train_type': 'train_type',
+    'stars': 'stars',
+    'final_price': 'final_price',
+}
+
+# Trains to refresh when a row of a related model changes
+DEPENDENT_TRAINS = {
+    Station: lambda ids: Q(departure_station_id__in=ids) | Q(arrival_station_id__in=ids),
+    RailwayCompany: lambda ids: Q(railway_company_id__in=ids),
+    TrainHall: lambda ids: Q(hall_id__in=ids),
+}
+
+# Rows written per INSERT
+CHUNK_SIZE = 2000
+
+
+def _rows(trains):
+    """Build search rows for a Train queryset with one joined query."""
+    duration = ExpressionWrapper(F('arrival_datetime') - F('departure_datetime'), output_field=DurationField())
+    values = trains.order_by().values('id', row_duration=duration, **{
+        # values() cannot reuse a model field name as an alias
+        f'row_{field}': F(lookup) for field, lookup in ROW_FIELDS.items()
+    })
+    for row in values.iterator(chunk_size=CHUNK_SIZE):
+        yield TrainSearchRow(
+            train_id=row['id'],
+            duration=row['row_duration'],
+            **{field: row[f'row_{field}'] for field in ROW_FIELDS},
+        )
+
+
+def _write(trains):
+    count = 0
+    batch = []
+    for row in _rows(trains):
+        batch.append(row)
+        if len(batch) >= CHUNK_SIZE:
+            TrainSearchRow.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    TrainSearchRow.objects.bulk_create(batch)
+    return count + len(batch)
+
+
+def refresh_trains(trains):
+    """
+    Rewrite the search rows of the trains of a queryset (or a list of ids);
+    rows of trains that no longer exist are removed.
+    """
+    if not isinstance(trains, QuerySet):
+        trains = Train.objects.filter(id__in=list(trains))
+    with transaction.atomic():
+        TrainSearchRow.objects.filter(train__in=trains.values('id')).delete()
+        return _write(trains)
+
+
+def refresh_related(model, ids):
+    """Rewrite the search rows of the trains of changed stations, companies or halls."""
+    return refresh_trains(Train.objects.filter(DEPENDENT_TRAINS[model](list(ids))))
+
+
+def refresh_prices(trains):
+    """Copy final_price into the search rows of a Train queryset (after a reprice)."""
+    price = Train.objects.filter(pk=OuterRef('train_id')).values('final_price')[:1]
+    return TrainSearchRow.objects.filter(train__in=trains.values('id')).update(final_price=Subquery(price))
+
+
+def rebuild():
+    """Recreate the whole table. Returns the number of rows written."""
+    with transaction.atomic():
+        TrainSearchRow.objects.all().delete()
+        return _write(Train.objects.all())
+
+
+def inconsistent_trains():
+    """Return the ids of the trains whose search row is missing or stale."""
+    missing = Train.objects.filter(search_row__isnull=True).values_list('id', flat=True)
+    stale = TrainSearchRow.objects.exclude(
+        duration=ExpressionWrapper(F('train__arrival_datetime') - F('train__departure_datetime'), output_field=DurationField()),
+        **{field: F(f'train__{lookup}') for field, lookup in ROW_FIELDS.items()},
+    ).values_list('train_id', flat=True)
+    return set(missing) | set(stale)
@@ -0,0 +1,180 @@
+import base64
+from .models import TrainType
+
+
+class SeatLayout:
+    """
+    Seat layout of a train type: seats come in groups (a compartment, or a
+    row of a bus-style car), optionally split by an aisle inside the group.
+
+    Seats are numbered from 1 along the train; seat N is bit N - 1 of a seat map.
+    """
+    def __init__(self, group_size, aisle_after=None):
+        self.group_size = group_size
+        self.aisle_after = aisle_after  # Seats before the aisle in each group
+
+    def groups(self, capacity):
+        """Return (first bit, size) of every group, the last one possibly partial."""
+        return [(start, min(self.group_size, capacity - start)) for start in range(0, capacity, self.group_size)]
+
+    def segments(self, size):
+        """Return (first bit, end bit) of the runs of side-by-side seats in a group of `size`."""
+        if self.aisle_after is None or self.aisle_after >= size:
+            return [(0, size)]
+        return [(0, self.aisle_after), (self.aisle_after, size)]
+
+
+LAYOUTS = {
+    TrainType.COUPE_4_SEATER.name: SeatLayout(4),
+    TrainType.COUPE_6_SEATER.name: SeatLayout(6),
+    TrainType.BUS_STYLE.name: SeatLayout(4, aisle_after=2),  # Rows of 2 + aisle + 2
+}
+
+
+def layout_for(train_type):
+    return LAYOUTS.get(train_type, LAYOUTS[TrainType.BUS_STYLE.name])
+
+
+# A seat map is an int bitmask of taken seats, stored as little-endian bytes
+# (NULL/empty: nothing taken), so a 500-seat train needs 63 bytes.
+def decode(data):
+    return int.from_bytes(bytes(data), 'little') if data else 0
+
+
+def encode(taken, capacity=0):
+    return taken.to_bytes((max(capacity, taken.bit_length()) + 7) // 8, 'little')
+
+
+def numbers_of(mask):
+    """Return the 1-based seat numbers set in `mask`."""
+    numbers = []
+    while mask:
+        bit = mask & -mask
+        numbers.append(bit.bit_length())
+        mask ^= bit
+    return numbers
+
+
+def mask_of(numbers, capacity):
+    mask = 0
+    for number in numbers:
+        if not 1 <= number <= capacity:
+            raise Exception(f"Seat {number} does not exist.")
+        bit = 1 << (number - 1)
+        if mask & bit:
+            raise Exception(f"Seat {number} is selected twice.")
+        mask |= bit
+    return mask
+
+
+def _lowest(free, count):
+    """Mask of the `count` lowest bits set in `free`."""
+    mask = 0
+    for _ in range(count):
+        bit = free & -free
+        mask |= bit
+        free ^= bit
+    return mask
+
+
+def _side_by_side(free, size, count, layout):
+    """Mask of the first run of `count` free seats not split by the aisle, or 0."""
+    run = (1 << count) - 1
+    for start, end in layout.segments(size):
+        for offset in range(start, end - count + 1):
+            if free & (run << offset) == run << offset:
+                return run << offset
+    return 0
+
+
+def allocate(train_type, capacity, taken, count):
+    """
+    Choose `count` free seats and return their mask, or None if the train has
+    fewer free seats.
+
+    Preference: side-by-side seats in one compartment (or bus row), then any
+    seats of one compartment, then the fewest consecutive compartments. Among
+    compartments that fit, the fullest one is used, which keeps empty
+    compartments for larger parties.
+    """
+    layout = layout_for(train_type)
+    groups = layout.groups(capacity)
+    free = [(~taken >> start) & ((1 << size) - 1) for start, size in groups]
+
+    best = None
+    for index, (start, size) in enumerate(groups):
+        available = free[index].bit_count()
+        if available < count:
+            continue
+        run = _side_by_side(free[index], size, count, layout)
+        key = (not run, available)
+        if best is None or key < best[0]:
+            best = (key, (run or _lowest(free[index], count)) << start)
+    if best is not None:
+        return best[1]
+
+    # Party larger than any free group: the shortest window of consecutive groups
+    counts = [mask.bit_count() for mask in free]
+    window = None
+    total = 0
+    first = 0
+    for last in range(len(groups)):
+        total += counts[last]
+        while total - counts[first] >= count:
+            total -= counts[first]
+            first += 1
+        if total >= count and (window is None or last - first < window[1] - window[0]):
+            window = (first, last)
+    if window is None:
+        return None
+    mask = 0
+    remaining = count
+    for index in range(window[0], window[1] + 1):
+        seats = _lowest(free[index], min(remaining, counts[index]))
+        mask |= seats << groups[index][0]
+        remaining -= min(remaining, counts[index])
+    return mask
+
+
+class SeatMap:
+    """
+    Seat map of one train, as served to seat-selection screens.
+
+    Only seats booked by number are taken on the map; bookings by seat count
+    have no seat numbers, so `free` comes from the inventory counters.
+    """
+    def __init__(self, train, seat_map, available=None):
+        self.layout = layout_for(train.train_type)
+        self.train_type = train.train_type
+        self.capacity = train.capacity
+        self.taken = decode(seat_map) & ((1 << train.capacity) - 1)
+        self.available = available
+
+    @property
+    def compartment_size(self):
+        return self.layout.group_size
+
+    @property
+    def aisle_after(self):
+        return self.layout.aisle_after
+
+    @property
+    def free(self):
+        if self.available is not None:
+            return self.available
+        return self.capacity - self.taken.bit_count()
+
+    @property
+    def taken_seats(self):
+        return numbers_of(self.taken)
+
+    @property
+    def bitmap(self):
+        return base64.b64encode(encode(self.taken, self.capacity)).decode()
+
+    def suggest(self, count):
+        """Seat numbers to offer a party of `count` (see allocate()), or [] if too few seats are free."""
+        if count <= 0 or count > self.free:
+            return []
+        mask = allocate(self.train_type, self.capacity, self.taken, count)
+        return numbers_of(mask) if mask else []
@@ -0,0 +1,40 @@
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphene.utils.str_converters import to_snake_case
+
+
+def _selections(selection_set, fragments):
+    """
+    Yield the field nodes of a selection set, expanding fragments in place.
+    """
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _selections(selection.selection_set, fragments)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _selections(fragment.selection_set, fragments)
+
+
+def selected_fields(info, *path):
+    """
+    Return the snake_case names of the fields selected below `path`.
+
+    `path` is a sequence of GraphQL field names to walk down from the current
+    field, e.g. selected_fields(info, 'edges', 'node') for a connection.
+    """
+    nodes = list(info.field_nodes)
+    for name in path:
+        nodes = [
+            field for node in nodes
+            for field in _selections(node.selection_set, info.fragments)
+            if field.name.value == name
+        ]
+    return {
+        to_snake_case(field.name.value)
+        for node in nodes
+        for field in _selections(node.selection_set, info.fragments)
+    }
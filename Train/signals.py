@@ -1,100 +1,157 @@
-# from django.db.models.signals import post_save, post_delete
-# from django.dispatch import receiver
-# from .models import Train, Station, RailwayCompany, TrainHall
-# from .documents import TrainDocument, StationDocument, RailwayCompanyDocument, TrainHallDocument
-#
-#
-# # Signal for Train model
-# class TrainSignalHandler:
-#     @staticmethod
-#     @receiver(post_save, sender=Train)
-#     def update_train_elasticsearch(sender, instance, created, **kwargs):
-#         """
-#         When a Train is created or updated, sync it with Elasticsearch.
-#         """
-#         if created:
-#             # If a new Train is created, index it in Elasticsearch
-#             TrainDocument().update(instance)
-#         else:
-#             # If a Train is updated, update the corresponding index in Elasticsearch
-#             TrainDocument().update(instance)
-#
-#     @staticmethod
-#     @receiver(post_delete, sender=Train)
-#     def delete_train_elasticsearch(sender, instance, **kwargs):
-#         """
-#         When a Train is deleted, remove it from Elasticsearch.
-#         """
-#         TrainDocument().delete(instance)
-#
-#
-# # Signal for Station model
-# class StationSignalHandler:
-#     @staticmethod
-#     @receiver(post_save, sender=Station)
-#     def update_station_elasticsearch(sender, instance, created, **kwargs):
-#         """
-#         When a Station is created or updated, sync it with Elasticsearch.
-#         """
-#         if created:
-#             # If a new Station is created, index it in Elasticsearch
-#             StationDocument().update(instance)
-#         else:
-#             # If a Station is updated, update the corresponding index in Elasticsearch
-#             StationDocument().update(instance)
-#
-#     @staticmethod
-#     @receiver(post_delete, sender=Station)
-#     def delete_station_elasticsearch(sender, instance, **kwargs):
-#         """
-#         When a Station is deleted, remove it from Elasticsearch.
-#         """
-#         StationDocument().delete(instance)
-#
-#
-# # Signal for RailwayCompany model
-# class RailwayCompanySignalHandler:
-#     @staticmethod
-#     @receiver(post_save, sender=RailwayCompany)
-#     def update_railway_company_elasticsearch(sender, instance, created, **kwargs):
-#         """
-#         When a RailwayCompany is created or updated, sync it with Elasticsearch.
-#         """
-#         if created:
-#             # If a new RailwayCompany is created, index it in Elasticsearch
-#             RailwayCompanyDocument().update(instance)
-#         else:
-#             # If a RailwayCompany is updated, update the corresponding index in Elasticsearch
-#             RailwayCompanyDocument().update(instance)
-#
-#     @staticmethod
-#     @receiver(post_delete, sender=RailwayCompany)
-#     def delete_railway_company_elasticsearch(sender, instance, **kwargs):
-#         """
-#         When a RailwayCompany is deleted, remove it from Elasticsearch.
-#         """
-#         RailwayCompanyDocument().delete(instance)
-#
-#
-# # Signal for TrainHall model
-# class TrainHallSignalHandler:
-#     @staticmethod
-#     @receiver(post_save, sender=TrainHall)
-#     def update_train_hall_elasticsearch(sender, instance, created, **kwargs):
-#         """
-#         When a TrainHall is created or updated, sync it with Elasticsearch.
-#         """
-#         if created:
-#             # If a new TrainHall is created, index it in Elasticsearch
-#             TrainHallDocument().update(instance)
-#         else:
-#             # If a TrainHall is updated, update the corresponding index in Elasticsearch
-#             TrainHallDocument().update(instance)
-#
-#     @staticmethod
-#     @receiver(post_delete, sender=TrainHall)
-#     def delete_train_hall_elasticsearch(sender, instance, **kwargs):
-#         """
-#         When a TrainHall is deleted, remove it from Elasticsearch.
-#         """
-#         TrainHallDocument().delete(instance)
\ No newline at end of file
+from django.db.models.functions import Now
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Train, Station, RailwayCompany, TrainHall, SeatInventory
+from .outbox import enqueue_instance
+from .timetable import record_changes
+from .search_table import DEPENDENT_TRAINS, refresh_trains, refresh_related
+
+
+# Changes are not pushed to the search backend here: each signal only writes a
+# row to the search outbox (in the same transaction as the change) and the
+# `drain_search_outbox` command ships them in batches.
+
+
+# Signal for Train model
+class TrainSignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=Train)
+    def update_train_outbox(sender, instance, created, **kwargs):
+        """
+        When a Train is created or updated, queue it for indexing.
+        """
+        enqueue_instance(instance)
+
+    @staticmethod
+    @receiver(post_delete, sender=Train)
+    def delete_train_outbox(sender, instance, **kwargs):
+        """
+        When a Train is deleted, queue its removal from the index.
+        """
+        enqueue_instance(instance)
+
+
+# Signal for Station model
+class StationSignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=Station)
+    def update_station_outbox(sender, instance, created, **kwargs):
+        """
+        When a Station is created or updated, queue it (and its trains) for indexing.
+        """
+        enqueue_instance(instance)
+
+    @staticmethod
+    @receiver(post_delete, sender=Station)
+    def delete_station_outbox(sender, instance, **kwargs):
+        """
+        When a Station is deleted, queue its removal from the index.
+        """
+        enqueue_instance(instance)
+
+
+# Signal for RailwayCompany model
+class RailwayCompanySignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=RailwayCompany)
+    def update_railway_company_outbox(sender, instance, created, **kwargs):
+        """
+        When a RailwayCompany is created or updated, queue it (and its trains) for indexing.
+        """
+        enqueue_instance(instance)
+
+    @staticmethod
+    @receiver(post_delete, sender=RailwayCompany)
+    def delete_railway_company_outbox(sender, instance, **kwargs):
+        """
+        When a RailwayCompany is deleted, queue its removal from the index.
+        """
+        enqueue_instance(instance)
+
+
+# Signal for TrainHall model
+class TrainHallSignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=TrainHall)
+    def update_train_hall_outbox(sender, instance, created, **kwargs):
+        """
+        When a TrainHall is created or updated, queue it (and its trains) for indexing.
+        """
+        enqueue_instance(instance)
+
+    @staticmethod
+    @receiver(post_delete, sender=TrainHall)
+    def delete_train_hall_outbox(sender, instance, **kwargs):
+        """
+        When a TrainHall is deleted, queue its removal from the index.
+        """
+        enqueue_instance(instance)
+
+
+# Signal for the seat inventory of new trains
+class SeatInventorySignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=Train)
+    def create_seat_inventory(sender, instance, created, **kwargs):
+        """
+        When a Train is created, make all of its seats available.
+        """
+        if created:
+            SeatInventory.objects.create(train=instance, available=instance.capacity)
+
+
+# Signal for the in-memory timetables of the journey planner
+class TimetableSignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=Train)
+    def record_train_change(sender, instance, **kwargs):
+        """
+        When a Train is created or updated, let every worker reload it.
+        """
+        record_changes([instance.pk])
+
+    @staticmethod
+    @receiver(post_delete, sender=Train)
+    def record_train_removal(sender, instance, **kwargs):
+        """
+        When a Train is deleted, let every worker drop it.
+        """
+        record_changes([instance.pk])
+
+
+# Signals for the denormalised train search table (updated in the same transaction)
+class SearchTableSignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=Train)
+    def refresh_train_row(sender, instance, **kwargs):
+        """
+        When a Train is created or updated, rewrite its search row.
+        """
+        refresh_trains([instance.pk])
+
+    @staticmethod
+    @receiver(post_save, sender=Station)
+    @receiver(post_save, sender=RailwayCompany)
+    @receiver(post_save, sender=TrainHall)
+    def refresh_related_rows(sender, instance, created, **kwargs):
+        """
+        When a Station, RailwayCompany or TrainHall is renamed, rewrite the rows of its trains.
+        (Deletions cascade to the trains and their rows.)
+        """
+        if not created:
+            refresh_related(sender, [instance.pk])
+
+
+# Signals for the incremental timetable export (updated_since)
+class ExportSignalHandler:
+    @staticmethod
+    @receiver(post_save, sender=Station)
+    @receiver(post_save, sender=RailwayCompany)
+    @receiver(post_save, sender=TrainHall)
+    def touch_related_trains(sender, instance, created, **kwargs):
+        """
+        When a Station, RailwayCompany or TrainHall is renamed, bump updated_at
+        on its trains: their exported rows carry its name.
+        """
+        if not created:
+            Train.objects.filter(DEPENDENT_TRAINS[sender]([instance.pk])).update(updated_at=Now())  # update() skips auto_now
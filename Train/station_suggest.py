@@ -0,0 +1,153 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from django.conf import settings
+from django.db.models import Count
+from .models import Train
+from .reference_data import reference_data
+
+# How often station popularity (number of trains) is recounted (seconds)
+POPULARITY_INTERVAL = getattr(settings, 'STATION_SUGGEST_POPULARITY_INTERVAL', 600.0)
+# Upper bound of `limit`
+MAX_SUGGESTIONS = 50
+# Rankings of prefixes matching more index entries than this are kept until the index changes
+MEMO_MIN_ENTRIES = 200
+
+SUGGEST_FIELDS = ('station_name', 'station_city', 'station_province')
+
+# Arabic code points typed on Arabic keyboards, or found in imported data, and
+# their Persian equivalents; Persian and Arabic-Indic digits become ASCII
+_NORMALISE = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    '‌': ' ', '‏': None, '‎': None,  # ZWNJ is a word break, direction marks are dropped
+    'ـ': None,  # Tatweel
+    **{chr(code): None for code in range(0x064B, 0x0653)},  # Harakat
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+
+
+def normalise(text):
+    """Fold Persian/Arabic variants, digits, case and spacing, so equal-looking text compares equal."""
+    return ' '.join(text.translate(_NORMALISE).casefold().split())
+
+
+def _keys(station):
+    """Index keys of a station: every field, from each of its words to the end."""
+    keys = set()
+    for rank, field in enumerate(SUGGEST_FIELDS):
+        words = normalise(getattr(station, field)).split(' ')
+        for start in range(len(words)):
+            key = ' '.join(words[start:])
+            if key:
+                keys.add((key, rank))
+    return keys
+
+
+class StationSuggestIndex:
+    """
+    Sorted array of (normalised key, field rank, station id); the stations
+    matching a prefix are the contiguous run found by binary search.
+
+    Built from the ReferenceData snapshot of stations: when a Station
+    mutation replaces the snapshot, only the keys of the added, changed and
+    deleted stations are updated.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = []
+        self.stations = {}  # The snapshot's stations the entries were built from
+        self.keys = {}  # Keys of every indexed station, by id
+        self.popularity = Counter()
+        self.counted_at = None
+        self._publish()
+
+    def _sync(self):
+        stations = reference_data.snapshot().stations
+        stale = self.counted_at is None or time.monotonic() - self.counted_at >= POPULARITY_INTERVAL
+        if stations is self.stations and not stale:
+            return
+        with self._lock:
+            # Another thread may have updated the index while we were waiting
+            stations = reference_data.snapshot().stations
+            if stations is not self.stations:
+                self._apply(stations)
+            if self.counted_at is None or time.monotonic() - self.counted_at >= POPULARITY_INTERVAL:
+                self._count()
+
+    def _apply(self, stations):
+        entries = list(self.entries)  # Readers keep using the old list meanwhile
+        changed = [pk for pk in stations.keys() | self.stations.keys()
+                   if pk not in stations or pk not in self.stations
+                   or any(getattr(stations[pk], field) != getattr(self.stations[pk], field) for field in SUGGEST_FIELDS)]
+        # Few changes (a Station mutation): update the changed stations in place
+        if len(changed) * 20 < len(entries):
+            removed = {(key, rank, pk) for pk in changed for key, rank in self.keys.pop(pk, ())}
+            entries = [entry for entry in entries if entry not in removed] if removed else entries
+            for pk in changed:
+                if pk in stations:
+                    self.keys[pk] = _keys(stations[pk])
+                    for key, rank in self.keys[pk]:
+                        insort(entries, (key, rank, pk))
+        else:
+            self.keys = {pk: _keys(station) for pk, station in stations.items()}
+            entries = sorted((key, rank, pk) for pk, keys in self.keys.items() for key, rank in keys)
+        self.entries = entries
+        self.stations = stations
+        self._publish()
+
+    def _count(self):
+        popularity = Counter()
+        for field in ('departure_station', 'arrival_station'):
+            for row in Train.objects.order_by().values(field).annotate(trains=Count('id')):
+                popularity[row[field]] += row['trains']
+        self.popularity = popularity
+        self.counted_at = time.monotonic()
+        self._publish()
+
+    def _publish(self):
+        # Readers take everything at once, with an empty memo of rankings
+        self.index = (self.entries, self.stations, self.popularity, {})
+
+    def suggest(self, prefix, limit=10):
+        """
+        Return up to `limit` stations whose name, city or province has a word
+        starting with `prefix`, busiest stations first, then name matches
+        before city and province matches.
+        """
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            raise Exception(f"limit must be between 1 and {MAX_SUGGESTIONS}.")
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        self._sync()
+        entries, stations, popularity, memo = self.index
+        ranked = memo.get(prefix)
+        if ranked is None:
+            best_rank = {}
+            matches = 0
+            for index in range(bisect_left(entries, (prefix,)), len(entries)):
+                key, rank, pk = entries[index]
+                if not key.startswith(prefix):
+                    break
+                matches += 1
+                if rank < best_rank.get(pk, len(SUGGEST_FIELDS)):
+                    best_rank[pk] = rank
+            ranked = heapq.nsmallest(
+                MAX_SUGGESTIONS, best_rank,
+                key=lambda pk: (-popularity[pk], best_rank[pk], stations[pk].station_name, pk)
+            )
+            # Short prefixes match long runs: remember their ranking
+            if matches > MEMO_MIN_ENTRIES:
+                memo[prefix] = ranked
+        return [stations[pk] for pk in ranked[:limit]]
+
+
+# Shared instance for this process
+station_index = StationSuggestIndex()
@@ -0,0 +1,99 @@
+import random
+from decimal import Decimal
+from datetime import datetime, timedelta, timezone
+from .bulk_load import load_trains
+from .models import Station, RailwayCompany, TrainHall, TrainType
+from .pricing import final_price
+
+# Default size of a synthetic dataset
+DEFAULT_STATIONS = 50
+DEFAULT_COMPANIES = 10
+DEFAULT_HALLS = 5
+DEFAULT_TRAINS = 100000
+
+# Synthetic trains depart within a year from this date
+START_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+TRAIN_NUMBER_PREFIX = 'SYN-'
+
+TRAIN_TYPES = [tag.name for tag in TrainType]
+PROVINCES = ['Tehran', 'Khorasan Razavi', 'Isfahan', 'Fars', 'Azarbaijan Sharghi', 'Khuzestan', 'Mazandaran', 'Yazd']
+HALL_NAMES = ['Economy', 'Business', 'VIP', 'Family', 'Sleeper']
+CAPACITIES = (200, 300, 400, 500)
+TAXES = (Decimal('0.00'), Decimal('9.00'), Decimal('10.00'))
+DISCOUNTS = (Decimal('0.00'), Decimal('0.00'), Decimal('5.00'), Decimal('10.00'), Decimal('15.00'))
+
+
+def station_rows(count):
+    for index in range(count):
+        province = PROVINCES[index % len(PROVINCES)]
+        yield Station(
+            station_name=f"Station {index + 1}",
+            station_city=f"City {index + 1}",
+            station_province=province,
+        )
+
+
+def railway_company_rows(count):
+    for index in range(count):
+        yield RailwayCompany(
+            railway_name=f"Railway Company {index + 1}",
+            railway_description="Synthetic railway company.",
+            refund_policy="Full refund up to 24 hours before departure.",
+        )
+
+
+def train_hall_rows(count):
+    for index in range(count):
+        name = HALL_NAMES[index % len(HALL_NAMES)]
+        yield TrainHall(hall_name=name if index < len(HALL_NAMES) else f"{name} {index + 1}")
+
+
+def train_rows(count, station_ids, railway_company_ids, train_hall_ids, seed=0, start=0):
+    """
+    Yield `count` train rows (tuples in bulk_load.TRAIN_COLUMNS order).
+
+    Rows are a pure function of `seed` and their index, so the same
+    arguments always produce the same timetable.
+    """
+    if len(station_ids) < 2:
+        raise Exception("At least two stations are required.")
+    rng = random.Random(seed)
+    for index in range(start, start + count):
+        departure_station, arrival_station = rng.sample(station_ids, 2)
+        departure = START_DATE + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        base_price = rng.randrange(500000, 50000000, 1000)
+        tax = rng.choice(TAXES)
+        discount = rng.choice(DISCOUNTS)
+        yield (
+            f"{TRAIN_NUMBER_PREFIX}{index:07d}",
+            departure,
+            departure + timedelta(minutes=rng.randrange(60, 24 * 60)),
+            departure_station,
+            arrival_station,
+            rng.choice(railway_company_ids),
+            rng.choice(TRAIN_TYPES),
+            rng.choice(CAPACITIES),
+            rng.choice(train_hall_ids),
+            rng.randint(1, 5),
+            base_price,
+            tax,
+            discount,
+            final_price(base_price, tax, discount),
+        )
+
+
+def seed(stations=DEFAULT_STATIONS, companies=DEFAULT_COMPANIES, halls=DEFAULT_HALLS,
+         trains=DEFAULT_TRAINS, random_seed=0, chunk_size=5000, progress=None):
+    """
+    Insert a synthetic dataset (trains through bulk_load.load_trains()).
+
+    `progress` is called with the number of trains inserted so far.
+    Returns the ids of the created stations, companies and halls.
+    """
+    station_ids = [obj.id for obj in Station.objects.bulk_create(station_rows(stations))]
+    railway_company_ids = [obj.id for obj in RailwayCompany.objects.bulk_create(railway_company_rows(companies))]
+    train_hall_ids = [obj.id for obj in TrainHall.objects.bulk_create(train_hall_rows(halls))]
+
+    rows = train_rows(trains, station_ids, railway_company_ids, train_hall_ids, random_seed)
+    load_trains(rows, chunk_size=chunk_size, progress=progress)
+    return station_ids, railway_company_ids, train_hall_ids
@@ -1,3 +1,1168 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql import parse, validate
+from graphql.validation import specified_rules
+from PIL import Image
+from TrainsService import db_router, metrics, query_cost
+from TrainsService.document_cache import (
+    DocumentCache, PERSISTED_QUERY_KEY, PERSISTED_QUERY_TIMEOUT, persisted_queries, query_hash
+)
+from TrainsService.query_cost import query_cost_validator, DEFAULT_LIST_SIZE, MAX_QUERY_DEPTH
+from TrainsService.response_cache import response_cache
+from TrainsService.schema import schema, async_schema
+from TrainsService.views import TrainsGraphQLView
+from .export import EXPORT_COLUMNS
+from .inventory import MAX_HOLD_TTL, hold_seats, confirm_hold, release_hold, sell_seats, sweep_expired_holds
+from .documents import StationDocument, TrainDocument
+from .logos import generate_variants
+from .management.commands.load_timetable import TRAIN_FILE_COLUMNS
+from .models import (
+    Train, Station, RailwayCompany, TrainHall, SeatInventory, SeatHold, SearchOutbox, SearchRebuild, TrainSearchRow
+)
+from .mutations.train_mutation import handler
+from .outbox import drain
+from .pagination import TRAIN_ORDERING, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from .pricing import final_price, reprice
+from .reference_data import reference_data
+from .search_backend import InMemoryBackend
+from .seat_map import decode
+from .station_suggest import MAX_SUGGESTIONS, station_index
+from .timetable import Timetable, timetable
 
-# Create your tests here.
+START = datetime(2025, 3, 1, tzinfo=dt_timezone.utc)
+
+
+def create_train(number, departure_station, arrival_station, railway_company, hall,
+                 departure=START, hours=10, base_price=1000, tax=9, discount=5, **fields):
+    return Train.objects.create(
+        train_number=number,
+        departure_datetime=departure,
+        arrival_datetime=departure + timedelta(hours=hours),
+        departure_station=departure_station,
+        arrival_station=arrival_station,
+        railway_company=railway_company,
+        train_type=fields.pop('train_type', 'BUS_STYLE'),
+        capacity=fields.pop('capacity', 100),
+        hall=hall,
+        base_price=base_price,
+        tax=tax,
+        discount=discount,
+        **fields
+    )
+
+
+class TrainTestCase(TestCase):
+    """Creates two stations, a company and a hall; clears the per-process caches between tests."""
+    def setUp(self):
+        cache.clear()
+        reference_data.invalidate()
+        timetable.invalidate()
+        self.tehran = Station.objects.create(station_name='Tehran', station_city='Tehran', station_province='Tehran')
+        self.mashhad = Station.objects.create(station_name='Mashhad', station_city='Mashhad', station_province='Khorasan')
+        self.company = RailwayCompany.objects.create(railway_name='Raja', railway_description='-', refund_policy='-')
+        self.hall = TrainHall.objects.create(hall_name='VIP')
+
+    def create_trains(self, count, **fields):
+        return [
+            create_train(f'T{index}', self.tehran, self.mashhad, self.company, self.hall,
+                         departure=START + timedelta(hours=index), **fields)
+            for index in range(count)
+        ]
+
+    def execute(self, query, **variables):
+        return schema.execute(query, variable_values=variables, context_value=RequestFactory().post('/graphql/'))
+
+
+class PaginationTests(TrainTestCase):
+    QUERY = """
+        query ($first: Int, $after: String) {
+            allTrains(first: $first, after: $after) {
+                edges { node { trainNumber } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def test_cursor_round_trip(self):
+        train = self.create_trains(1)[0]
+        values = decode_cursor(encode_cursor(train, TRAIN_ORDERING), TRAIN_ORDERING)
+        self.assertEqual(values, [train._meta.get_field(field).value_to_string(train) for field in TRAIN_ORDERING])
+        self.assertEqual(Train.objects.filter(departure_datetime=values[0], id=values[1]).get(), train)
+
+    def test_invalid_cursor(self):
+        with self.assertRaisesMessage(Exception, "Invalid cursor."):
+            decode_cursor('not a cursor', TRAIN_ORDERING)
+        with self.assertRaisesMessage(Exception, "Invalid cursor."):
+            decode_cursor(encode_cursor(self.create_trains(1)[0], ('id',)), TRAIN_ORDERING)
+
+    def test_pages_follow_cursors(self):
+        self.create_trains(5)
+        numbers = []
+        after = None
+        while True:
+            result = self.execute(self.QUERY, first=2, after=after)
+            self.assertIsNone(result.errors)
+            connection_data = result.data['allTrains']
+            numbers.extend(edge['node']['trainNumber'] for edge in connection_data['edges'])
+            if not connection_data['pageInfo']['hasNextPage']:
+                break
+            after = connection_data['pageInfo']['endCursor']
+        self.assertEqual(numbers, ['T0', 'T1', 'T2', 'T3', 'T4'])
+
+    def test_first_over_limit(self):
+        result = self.execute(self.QUERY, first=MAX_PAGE_SIZE + 1)
+        self.assertEqual(result.errors[0].message, f"Argument 'first' must not exceed {MAX_PAGE_SIZE}.")
+        result = self.execute(self.QUERY, first=-1)
+        self.assertEqual(result.errors[0].message, "Argument 'first' must be a non-negative integer.")
+
+
+class QueryCostTests(TestCase):
+    def cost(self, query, **variables):
+        costs = []
+        errors = validate(schema.graphql_schema, parse(query), [
+            query_cost_validator(variables=variables, callback=costs.append)
+        ])
+        self.assertEqual(errors, [])
+        return costs[0]
+
+    def test_page_size_multiplies_nested_fields(self):
+        # allTrains + edges * (edges + node + trainNumber)
+        self.assertEqual(self.cost("{ allTrains(first: 10) { edges { node { trainNumber } } } }"), 1 + 10 * 3)
+        self.assertEqual(
+            self.cost("query ($first: Int) { allTrains(first: $first) { edges { node { id } } } }", first=5), 1 + 5 * 3
+        )
+        self.assertEqual(self.cost("{ allTrains { edges { node { id } } } }"), 1 + DEFAULT_LIST_SIZE * 3)
+
+    def test_first_zero_is_empty(self):
+        self.assertEqual(self.cost("{ allTrains(first: 0) { edges { node { trainNumber } } } }"), 1)
+        self.assertEqual(self.cost("query ($first: Int) { allTrains(first: $first) { edges { node { id } } } }", first=0), 1)
+        self.assertEqual(self.cost("{ allTrains(first: -5) { edges { node { id } } } }"), 1)
+
+    def test_nested_connections_and_bounded_lists(self):
+        # allStations + 10 * (edges + node + departures) + 10 * 3 * (edges + node + id)
+        self.assertEqual(self.cost(
+            "{ allStations(first: 10) { edges { node { departures(first: 3) { edges { node { id } } } } } } }"
+        ), 1 + 10 * 3 + 10 * 3 * 3)
+        self.assertEqual(self.cost('{ stationSuggest(prefix: "te", limit: 5) { id } }'), 5 + 5)
+        self.assertEqual(self.cost("{ seatAvailability(trainIds: [1, 2]) { available } }"), 2 + 2)
+
+    def test_unbounded_model_lists_are_rejected(self):
+        query = '{ planJourney(from: 1, to: 2, departAfter: "2025-03-01T00:00:00+00:00") { legs { id } } }'
+        self.assertEqual(validate(schema.graphql_schema, parse(query), [query_cost_validator()]), [])
+        with mock.patch.dict(query_cost.LIST_SIZES, clear=True):
+            errors = validate(schema.graphql_schema, parse(query), [query_cost_validator()])
+        self.assertEqual(len(errors), 1)
+        self.assertIn("'JourneyType.legs' is a list without a 'first' argument", errors[0].message)
+
+
+class QueryLimitTests(TestCase):
+    def post(self, query, **variables):
+        return self.client.post('/graphql/', json.dumps({'query': query, 'variables': variables}),
+                                content_type='application/json')
+
+    def test_depth_limit(self):
+        deep = """
+            {
+                allStations(first: 1) { edges { node { departures(first: 1) { edges { node {
+                    departureStation { departures(first: 1) { edges { node { hall { id } } } } }
+                } } } } } }
+            }
+        """
+        response = self.post(deep)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'],
+                         f"'anonymous' exceeds maximum operation depth of {MAX_QUERY_DEPTH}.")
+        shallow = "{ allStations { edges { node { departures { edges { node { id } } } } } } }"
+        self.assertEqual(self.post(shallow).status_code, 200)
+
+    def test_cost_limit_uses_variables(self):
+        query = "query Trains($first: Int) { allTrains(first: $first) { edges { node { trainNumber } } } }"
+        with mock.patch.object(TrainsGraphQLView, 'max_query_cost', 100):
+            response = self.post(query, first=30)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['extensions']['cost'], {'estimated': 1 + 30 * 3, 'maximum': 100})
+            response = self.post(query, first=40)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'],
+                         "'Trains' has an estimated cost of 121, which exceeds the maximum query cost of 100.")
+        self.assertNotIn('data', response.json())
+
+
+class PersistedQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def post(self, query, sha256_hash):
+        return self.client.post('/graphql/', json.dumps({
+            'query': query, 'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash}},
+        }), content_type='application/json')
+
+    def test_valid_query_is_registered_with_timeout(self):
+        query = '{ allStations(first: 1) { edges { node { id } } } }'
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            response = self.post(query, query_hash(query))
+        self.assertEqual(response.status_code, 200)
+        cache_set.assert_any_call(PERSISTED_QUERY_KEY.format(query_hash(query)), query, PERSISTED_QUERY_TIMEOUT)
+        self.assertEqual(persisted_queries.lookup(query_hash(query)), query)
+
+    def test_invalid_query_is_not_registered(self):
+        for query in ('{ noSuchField }', '{ allStations('):
+            response = self.post(query, query_hash(query))
+            self.assertEqual(response.status_code, 400)
+            self.assertIsNone(cache.get(PERSISTED_QUERY_KEY.format(query_hash(query))))
+
+    def test_hash_mismatch(self):
+        response = self.post('{ allStations { edges { node { id } } } }', query_hash('{ other }'))
+        self.assertEqual(response.json()['errors'][0]['message'], "provided sha does not match query")
+
+    def test_documents_are_cached_per_schema(self):
+        documents = DocumentCache()
+        query = '{ allStations { edges { node { id } } } }'
+        sync_entry = documents.get(schema.graphql_schema, query, specified_rules)
+        async_entry = documents.get(async_schema.graphql_schema, query, specified_rules)
+        self.assertIsNot(sync_entry, async_entry)
+        self.assertIs(documents.get(schema.graphql_schema, query, specified_rules), sync_entry)
+        self.assertEqual((documents.stats()['misses'], documents.stats()['hits']), (2, 1))
+
+
+class MetricsTests(TestCase):
+    def operation(self, query):
+        return parse(query).definitions[0]
+
+    def test_unknown_operation_names_are_folded(self):
+        with mock.patch.object(metrics, '_known_operations', frozenset({'Stations'})):
+            keys = []
+            for query, operation_name in (
+                ('query Stations { allStations { edges { node { id } } } }', None),
+                ('query Random42 { allStations { edges { node { id } } } }', None),
+                ('{ allStations { edges { node { id } } } }', 'Stations'),
+                ('{ allStations { edges { node { id } } } }', None),
+            ):
+                timer = metrics.OperationTimer(self.operation(query), operation_name)
+                timer.finish(None)
+                keys.append(timer.key)
+        self.assertEqual(keys, [('query', 'Stations'), ('query', 'other'), ('query', 'Stations'), ('query', 'anonymous')])
+
+    def test_persisted_query_names_are_known(self):
+        query = 'query TrainsPage { allTrains { edges { node { id } } } }'
+        with mock.patch.object(metrics, '_known_operations', None), \
+                mock.patch.object(persisted_queries, 'allowlist', {query_hash(query): query}):
+            self.assertIn('TrainsPage', metrics.known_operations())
+
+    def test_fields_are_sampled(self):
+        query = '{ allStations { edges { node { id } } } }'
+        key = ('Query', 'allStations')
+        for rate, measured in ((0, 0), (1, 1)):
+            before = metrics.field_metrics.collect().get(key, [0])[0]
+            with mock.patch.object(metrics, 'FIELD_SAMPLE_RATE', rate), \
+                    mock.patch('TrainsService.response_cache.response_cache.enabled', False):
+                response = self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(metrics.field_metrics.collect().get(key, [0])[0] - before, measured)
+
+    def test_failed_cache_lookup_is_recorded(self):
+        # The timer is finished (and the current operation reset) when the response cache raises
+        key = ('query', 'anonymous')
+        body = json.dumps({'query': '{ allStations { edges { node { id } } } }'})
+        posts = (
+            lambda: self.client.post('/graphql/', body, content_type='application/json'),
+            lambda: async_to_sync(self.async_client.post)('/graphql/async/', body, content_type='application/json'),
+        )
+        with mock.patch.object(response_cache, 'lookup', side_effect=Exception("Cache is down.")):
+            for post in posts:
+                before = metrics.operation_metrics.collect().get(key, [0, 0, 0])
+                with self.assertRaisesMessage(Exception, "Cache is down."):
+                    post()
+                after = metrics.operation_metrics.collect()[key]
+                self.assertEqual((after[0] - before[0], after[2] - before[2]), (1, 1))
+                self.assertIsNone(metrics._current_operation.get())
+
+
+class ReplicaRouterTests(TestCase):
+    def replica(self, row):
+        # A PostgreSQL replica whose LAG_SQL returns `row`
+        replica = mock.MagicMock(vendor='postgresql')
+        replica.cursor.return_value.__enter__.return_value.fetchone.return_value = row
+        return mock.patch.object(db_router, 'connections', {'replica1': replica})
+
+    def test_missing_stats_role_is_a_configuration_error(self):
+        with self.replica((None, False)):
+            with self.assertRaisesMessage(ImproperlyConfigured, "grant it the pg_read_all_stats role"):
+                db_router.check_replicas(['replica1'])
+            with self.assertLogs('TrainsService.db_router', 'ERROR'):
+                self.assertIsNone(db_router.ReplicaHealth(['replica1']).measure('replica1'))
+        with self.replica((Decimal('0.5'), True)):
+            db_router.check_replicas(['replica1'])
+            self.assertEqual(db_router.ReplicaHealth(['replica1']).measure('replica1'), 0.5)
+
+    def test_query_reads_go_to_a_usable_replica(self):
+        router = db_router.PrimaryReplicaRouter()
+        with mock.patch.object(db_router, 'REPLICAS', ['replica1', 'replica2']), \
+                mock.patch.object(db_router.replica_health, 'usable', return_value=['replica2']):
+            self.assertEqual(router.db_for_read(Train), 'default')
+            with db_router.replica_reads():
+                self.assertIsNone(db_router.read_database())
+                self.assertEqual(router.db_for_read(Train), 'replica2')
+                self.assertEqual(db_router.read_database(), 'replica2')
+                self.assertEqual(router.db_for_write(Train), 'default')
+            with db_router.replica_reads(enabled=False):
+                self.assertEqual(router.db_for_read(Train), 'default')
+
+    def test_lagging_and_unreachable_replicas_are_skipped(self):
+        health = db_router.ReplicaHealth(['replica1', 'replica2', 'replica3'])
+        lags = {'replica1': 0.5, 'replica2': db_router.MAX_REPLICA_LAG + 1, 'replica3': None}
+        with mock.patch.object(health, 'measure', side_effect=lags.get):
+            self.assertEqual(health.usable(), ['replica1'])
+
+    def test_mutations_stick_the_client_to_the_primary(self):
+        mutation = 'mutation { createStation(stationName: "Qom", stationCity: "Qom", stationProvince: "Qom") { id } }'
+        query = '{ allStations { edges { node { id } } } }'
+        with mock.patch.object(db_router, 'REPLICAS', ['replica1']), \
+                mock.patch.object(db_router.replica_health, 'usable', return_value=[]), \
+                mock.patch('TrainsService.views.replica_reads', wraps=db_router.replica_reads) as replica_reads:
+            response = self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json')
+            self.assertNotIn(db_router.STICKY_COOKIE, response.cookies)
+            response = self.client.post('/graphql/', json.dumps({'query': mutation}), content_type='application/json')
+            cookie = response.cookies[db_router.STICKY_COOKIE]
+            self.assertEqual(cookie['max-age'], int(db_router.STICKY_SECONDS) + 1)
+            self.assertTrue(cookie['httponly'])
+            # The test client sends the cookie back: this query reads from the primary
+            self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json')
+        self.assertEqual([call.args for call in replica_reads.call_args_list], [(True,), (False,), (False,)])
+
+        request = RequestFactory().get('/graphql/')
+        request.COOKIES[db_router.STICKY_COOKIE] = str(time.time() - 1)
+        self.assertFalse(db_router.is_sticky(request))
+        request.COOKIES[db_router.STICKY_COOKIE] = 'garbage'
+        self.assertFalse(db_router.is_sticky(request))
+
+
+class AsyncEndpointTests(TrainTestCase):
+    QUERY = """
+        {
+            allTrains(first: 5) {
+                edges { node { trainNumber departureStation { stationName } hall { hallName } inventory { available } } }
+            }
+            allStations { edges { node { stationName departures(first: 1) { edges { node { trainNumber } } } } } }
+        }
+    """
+
+    def post(self, query, asynchronous=True):
+        body = json.dumps({'query': query})
+        if asynchronous:
+            return async_to_sync(self.async_client.post)('/graphql/async/', body, content_type='application/json')
+        return self.client.post('/graphql/', body, content_type='application/json')
+
+    def test_same_data_as_sync_endpoint(self):
+        self.create_trains(3)
+        with mock.patch.object(response_cache, 'enabled', False):
+            expected = self.post(self.QUERY, asynchronous=False).json()
+            response = self.post(self.QUERY)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['data'], expected['data'])
+        self.assertEqual(result['data']['allTrains']['edges'][0]['node']['inventory'], {'available': 100})
+        self.assertEqual(result['extensions']['cost'], expected['extensions']['cost'])
+
+    def test_mutations_and_errors(self):
+        response = self.post("""
+            mutation { createStation(stationName: "Qom", stationCity: "Qom", stationProvince: "Qom") { stationName } }
+        """)
+        self.assertEqual(response.json()['data'], {'createStation': {'stationName': 'Qom'}})
+        self.assertTrue(Station.objects.filter(station_name='Qom').exists())
+
+        response = self.post('{ noSuchField }')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Cannot query field 'noSuchField'", response.json()['errors'][0]['message'])
+        self.assertEqual(async_to_sync(self.async_client.put)('/graphql/async/').status_code, 405)
+
+
+class LoaderTests(TrainTestCase):
+    def test_one_inventory_query_per_page(self):
+        self.create_trains(12)
+        query = """
+            {
+                allTrains(first: 10) {
+                    edges { node { trainNumber departureStation { stationName } hall { hallName } inventory { available } } }
+                }
+            }
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = self.execute(query)
+        self.assertIsNone(result.errors)
+        edges = result.data['allTrains']['edges']
+        self.assertEqual(len(edges), 10)
+        self.assertTrue(all(edge['node']['inventory']['available'] == 100 for edge in edges))
+        self.assertEqual(edges[0]['node']['departureStation']['stationName'], 'Tehran')
+        inventory_table = SeatInventory._meta.db_table
+        inventory_queries = [query for query in queries.captured_queries if inventory_table in query['sql']]
+        self.assertEqual(len(inventory_queries), 1)
+
+    def test_related_trains_are_paged(self):
+        self.create_trains(5)
+        query = """
+            query ($after: String) {
+                allStations {
+                    edges { node { departures(first: 2, after: $after) {
+                        edges { node { trainNumber } }
+                        pageInfo { hasNextPage endCursor }
+                    } } }
+                }
+            }
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = self.execute(query)
+        self.assertIsNone(result.errors)
+        tehran, mashhad = [edge['node']['departures'] for edge in result.data['allStations']['edges']]
+        self.assertEqual([edge['node']['trainNumber'] for edge in tehran['edges']], ['T0', 'T1'])
+        self.assertTrue(tehran['pageInfo']['hasNextPage'])
+        self.assertEqual((mashhad['edges'], mashhad['pageInfo']['hasNextPage']), ([], False))
+        train_table = Train._meta.db_table
+        self.assertEqual(len([query for query in queries.captured_queries if train_table in query['sql']]), 1)
+
+        result = self.execute(query, after=tehran['pageInfo']['endCursor'])
+        tehran = result.data['allStations']['edges'][0]['node']['departures']
+        self.assertEqual([edge['node']['trainNumber'] for edge in tehran['edges']], ['T2', 'T3'])
+
+
+class ResponseCacheTests(TrainTestCase):
+    def post(self, query):
+        response = self.client.post('/graphql/', json.dumps({'query': query}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_station_rename_invalidates_place_search(self):
+        self.create_trains(2)
+        query = '{ searchTrainsByPlace(date: "2025-03-01", departureCity: "Tehran") { trainNumber } }'
+        self.assertEqual(len(self.post(query)['searchTrainsByPlace']), 2)
+        hits = response_cache.hits
+        self.assertEqual(len(self.post(query)['searchTrainsByPlace']), 2)
+        self.assertEqual(response_cache.hits, hits + 1)
+
+        self.post('mutation { updateStation(stationId: %d, stationCity: "Rey") { id } }' % self.tehran.id)
+        self.assertEqual(self.post(query)['searchTrainsByPlace'], [])
+        self.assertEqual(response_cache.hits, hits + 1)
+
+    def test_writes_invalidate_only_dependent_responses(self):
+        train = self.create_trains(1)[0]
+        stations = '{ allStations { edges { node { stationName } } } }'
+        trains = '{ allTrains { edges { node { ...Fields } } } } fragment Fields on TrainType { trainNumber basePrice }'
+        self.post(stations)
+        self.post(trains)
+        hits, misses = response_cache.hits, response_cache.misses
+
+        self.post('mutation { updateTrain(trainId: %d, basePrice: 2000) { id } }' % train.id)
+        self.post(stations)  # Reads no trains: still cached
+        self.assertEqual(self.post(trains)['allTrains']['edges'][0]['node']['basePrice'], 2000)
+        self.assertEqual((response_cache.hits - hits, response_cache.misses - misses), (1, 1))
+
+        handler.undo()  # Undo bumps the version too
+        self.assertEqual(self.post(trains)['allTrains']['edges'][0]['node']['basePrice'], 1000)
+        self.assertEqual((response_cache.hits - hits, response_cache.misses - misses), (1, 2))
+
+    def test_seat_data_and_failures_are_not_cached(self):
+        train = self.create_trains(1)[0]
+        bypasses = response_cache.bypasses
+        query = '{ seatAvailability(trainIds: [%d]) { available } }' % train.id
+        self.assertEqual(self.post(query)['seatAvailability'], [{'available': 100}])
+        hold_seats(train.id, seats=2)
+        self.assertEqual(self.post(query)['seatAvailability'], [{'available': 98}])
+        self.assertEqual(response_cache.bypasses, bypasses + 2)
+
+        # Results with errors are not stored
+        misses = response_cache.misses
+        body = json.dumps({'query': '{ allTrains(after: "bad") { edges { cursor } } }'})
+        for _ in range(2):
+            response = self.client.post('/graphql/', body, content_type='application/json')
+            self.assertEqual(response.json()['errors'][0]['message'], "Invalid cursor.")
+        self.assertEqual(response_cache.misses, misses + 2)
+
+
+class TrainMutationTests(TrainTestCase):
+    def test_create_train_with_ids(self):
+        # The foreign keys arrive as ids, not instances
+        result = self.execute("""
+            mutation ($station: Int!, $arrival: Int!, $company: Int!, $hall: Int!) {
+                createTrain(trainNumber: "M1", departureDatetime: "2025-03-01T08:00:00+00:00",
+                            arrivalDatetime: "2025-03-01T18:00:00+00:00", departureStation: $station,
+                            arrivalStation: $arrival, railwayCompany: $company, trainType: "BUS_STYLE",
+                            capacity: 100, hall: $hall, stars: 4, basePrice: 1000, tax: 9, discount: 5) {
+                    id
+                    finalPrice
+                }
+            }
+        """, station=self.tehran.id, arrival=self.mashhad.id, company=self.company.id, hall=self.hall.id)
+        self.assertIsNone(result.errors)
+        train = Train.objects.get(train_number='M1')
+        self.assertEqual((train.departure_station, train.arrival_station), (self.tehran, self.mashhad))
+        self.assertEqual((train.railway_company, train.hall), (self.company, self.hall))
+        self.assertEqual(result.data['createTrain']['finalPrice'], 1036)
+
+    def test_update_train_converts_values(self):
+        # GraphQL Floats and Strings are converted to the field types before save() prices the train
+        train = self.create_trains(1)[0]
+        result = self.execute("""
+            mutation ($id: Int!) {
+                updateTrain(trainId: $id, basePrice: 2000, tax: 10.5, departureDatetime: "2025-03-01T06:00:00+00:00") {
+                    finalPrice
+                }
+            }
+        """, id=train.id)
+        self.assertIsNone(result.errors)
+        train.refresh_from_db()
+        self.assertEqual((train.base_price, train.tax), (2000, Decimal('10.50')))
+        self.assertEqual(train.departure_datetime, START + timedelta(hours=6))
+        self.assertEqual(train.final_price, final_price(2000, '10.5', 5))
+        self.assertEqual(result.data['updateTrain']['finalPrice'], train.final_price)
+
+    def test_create_trains_mixed_offsets(self):
+        # One time with an offset and one without: compared in the current time zone, not a TypeError
+        row = {
+            'trainNumber': 'B1', 'departureStation': self.tehran.id, 'arrivalStation': self.mashhad.id,
+            'railwayCompany': self.company.id, 'trainType': 'BUS_STYLE', 'capacity': 100, 'hall': self.hall.id,
+            'stars': 3, 'basePrice': 1000, 'tax': 9, 'discount': 5,
+        }
+        rows = [
+            {**row, 'departureDatetime': '2025-03-01T08:00:00+00:00', 'arrivalDatetime': '2025-03-01T18:00:00'},
+            {**row, 'trainNumber': 'B2', 'departureDatetime': '2025-03-01T08:00:00', 'arrivalDatetime': '2025-03-01T07:00:00+00:00'},
+        ]
+        query = """
+            mutation ($trains: [TrainInput!]!) {
+                createTrains(trains: $trains) { createdCount errors { index message } }
+            }
+        """
+        result = self.execute(query, trains=rows)
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['createTrains']['errors'], [
+            {'index': 1, 'message': "arrival_datetime must be after departure_datetime."},
+        ])
+        result = self.execute(query, trains=rows[:1])
+        self.assertEqual(result.data['createTrains']['createdCount'], 1)
+        train = Train.objects.get(train_number='B1')
+        self.assertEqual(train.arrival_datetime, timezone.make_aware(datetime(2025, 3, 1, 18)))
+
+    def test_create_trains(self):
+        row = {
+            'departureDatetime': '2025-03-01T08:00:00+00:00', 'arrivalDatetime': '2025-03-01T18:00:00+00:00',
+            'departureStation': self.tehran.id, 'arrivalStation': self.mashhad.id, 'railwayCompany': self.company.id,
+            'trainType': 'COUPE_4_SEATER', 'capacity': 40, 'hall': self.hall.id, 'stars': 4, 'basePrice': 1000,
+            'tax': 9, 'discount': 12.5,
+        }
+        query = """
+            mutation ($trains: [TrainInput!]!) {
+                createTrains(trains: $trains) { createdCount trains { trainNumber finalPrice } errors { index message } }
+            }
+        """
+        with mock.patch('Train.mutations.train_mutation.BULK_CHUNK_SIZE', 2):
+            result = self.execute(query, trains=[{**row, 'trainNumber': f'N{index}'} for index in range(3)])
+        self.assertIsNone(result.errors)
+        price = final_price(1000, 9, '12.5')
+        self.assertEqual(result.data['createTrains'], {
+            'createdCount': 3,
+            'trains': [{'trainNumber': f'N{index}', 'finalPrice': price} for index in range(3)],
+            'errors': [],
+        })
+        trains = Train.objects.order_by('train_number')
+        self.assertEqual([(train.discount, train.final_price, train.final_price_calculated) for train in trains],
+                         [(Decimal('12.50'), price, price)] * 3)
+        # What the model signals would have done: inventories, search outbox, search rows, timetable
+        self.assertEqual(list(SeatInventory.objects.values_list('available', flat=True)), [40] * 3)
+        self.assertEqual(SearchOutbox.objects.filter(model_label='Train.Train').count(), 3)
+        self.assertEqual(TrainSearchRow.objects.count(), 3)
+        journeys = timetable.plan_journey(self.tehran.id, self.mashhad.id, START)
+        self.assertEqual(journeys, [[trains[0].id]])
+
+        handler.undo()
+        self.assertFalse(Train.objects.exists())
+        handler.redo()
+        numbers = Train.objects.order_by('train_number').values_list('train_number', flat=True)
+        self.assertEqual(list(numbers), ['N0', 'N1', 'N2'])
+        self.assertEqual(SeatInventory.objects.count(), 3)
+
+    def test_create_trains_checks_column_limits(self):
+        row = {
+            'trainNumber': 'C0', 'departureDatetime': '2025-03-01T08:00:00+00:00', 'arrivalDatetime': '2025-03-01T18:00:00+00:00',
+            'departureStation': self.tehran.id, 'arrivalStation': self.mashhad.id, 'railwayCompany': self.company.id,
+            'trainType': 'BUS_STYLE', 'capacity': 100, 'hall': self.hall.id, 'stars': 3, 'basePrice': 1000, 'tax': 9, 'discount': 5,
+        }
+        rows = [
+            row,
+            {**row, 'trainNumber': 'C1', 'tax': 12.345, 'discount': 101},
+            {**row, 'trainNumber': 'C2', 'capacity': -1, 'basePrice': 10.5},
+            {**row, 'trainNumber': 'C3', 'basePrice': 9e18, 'tax': 100, 'discount': 0},
+        ]
+        query = """
+            mutation ($trains: [TrainInput!]!) {
+                createTrains(trains: $trains) { createdCount errors { index message } }
+            }
+        """
+        result = self.execute(query, trains=rows)
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['createTrains']['errors'], [
+            {'index': 1, 'message': "Tax can have at most two decimal places."},
+            {'index': 1, 'message': "Discount must be between 0 and 100."},
+            {'index': 2, 'message': "capacity must be a whole number between 0 and 2147483647."},
+            {'index': 2, 'message': "base_price must be a whole number between 0 and 9223372036854775807."},
+            {'index': 3, 'message': "final_price must not exceed 9223372036854775807."},
+        ])
+        self.assertFalse(Train.objects.exists())
+
+        # An empty batch leaves nothing to undo
+        undo_stack = list(handler.undo_stack)
+        result = self.execute(query, trains=[])
+        self.assertEqual(result.data['createTrains'], {'createdCount': 0, 'errors': []})
+        self.assertEqual(handler.undo_stack, undo_stack)
+
+
+class OutboxTests(TrainTestCase):
+    def drain_all(self, backend):
+        while drain(backend=backend):
+            pass
+
+    def test_drain_indexes_and_deletes(self):
+        train = self.create_trains(1)[0]
+        backend = InMemoryBackend()
+        self.drain_all(backend)
+        self.assertFalse(SearchOutbox.objects.exists())
+        document = backend.documents('trains')[train.id]
+        self.assertEqual(document['train_number'], 'T0')
+        self.assertEqual(document['departure_station']['station_name'], 'Tehran')
+        self.assertIn(self.tehran.id, backend.documents('stations'))
+
+        train.delete()
+        self.drain_all(backend)
+        self.assertNotIn(train.id, backend.documents('trains'))
+
+    def test_rename_reindexes_embedding_trains(self):
+        train = self.create_trains(1)[0]
+        backend = InMemoryBackend()
+        self.drain_all(backend)
+        self.tehran.station_name = 'Tehran Central'
+        self.tehran.save()
+        self.drain_all(backend)
+        self.assertEqual(backend.documents('trains')[train.id]['departure_station']['station_name'], 'Tehran Central')
+        self.assertEqual(backend.documents('stations')[self.tehran.id]['station_name'], 'Tehran Central')
+
+    def test_repeated_changes_are_coalesced(self):
+        train = self.create_trains(1)[0]
+        for stars in (4, 5):
+            train.stars = stars
+            train.save()
+        pending = SearchOutbox.objects.count()
+        backend = InMemoryBackend()
+        self.assertEqual(drain(backend=backend), pending)
+        self.assertFalse(SearchOutbox.objects.exists())
+        self.assertEqual(backend.requests, 1)
+        self.assertEqual(backend.documents('trains')[train.id]['stars'], 5)
+
+
+class RebuildSearchIndexTests(TrainTestCase):
+    def rebuild_while_renaming(self, backend, document, name):
+        """Rebuild the index of `document`, renaming Mashhad (and draining) while rows are streamed."""
+        to_document = document.to_document
+        renamed = []
+
+        def streaming(instance):
+            if not renamed:
+                renamed.append(True)
+                self.mashhad.station_name = name
+                self.mashhad.save()
+                while drain(backend=backend):
+                    pass
+            return to_document(instance)
+
+        output = io.StringIO()
+        with mock.patch('Train.management.commands.rebuild_search_index.get_backend', return_value=backend), \
+                mock.patch.object(document, 'to_document', side_effect=streaming):
+            call_command('rebuild_search_index', document.index, stdout=output)
+        return output.getvalue()
+
+    def test_changes_during_rebuild_reach_new_index(self):
+        train = self.create_trains(1)[0]
+        backend = InMemoryBackend()
+        while drain(backend=backend):
+            pass
+
+        self.rebuild_while_renaming(backend, StationDocument, 'Mashhad Holy')
+        self.assertIn('stations', backend.aliases)
+        self.assertEqual(backend.documents('stations')[self.mashhad.id]['station_name'], 'Mashhad Holy')
+
+        self.rebuild_while_renaming(backend, TrainDocument, 'Mashhad Central')
+        self.assertEqual(backend.documents('trains')[train.id]['arrival_station']['station_name'], 'Mashhad Central')
+
+        # The registration is gone, and the kept rows are purged by the next drain
+        self.assertFalse(SearchRebuild.objects.exists())
+        while drain(backend=backend):
+            pass
+        self.assertFalse(SearchOutbox.objects.exists())
+        self.assertEqual(backend.documents('stations')[self.mashhad.id]['station_name'], 'Mashhad Central')
+
+    def test_drained_rows_are_kept_during_rebuild(self):
+        self.create_trains(1)
+        SearchRebuild.objects.create(alias='trains', index='trains_1')
+        pending = SearchOutbox.objects.count()
+        self.assertEqual(drain(backend=InMemoryBackend()), pending)
+        self.assertEqual(SearchOutbox.objects.filter(drained=True).count(), pending)
+        self.assertEqual(drain(backend=InMemoryBackend()), 0)
+
+
+class PricingTests(TrainTestCase):
+    def test_reprice_matches_python(self):
+        base_prices = [0, 10, 30, 1005, 12345, 99999, 10 ** 12 + 1]
+        for index, base_price in enumerate(base_prices):
+            create_train(f'P{index}', self.tehran, self.mashhad, self.company, self.hall,
+                         base_price=base_price, tax=0, discount=0)
+        for tax, discount in (('5', '0'), ('9', '5'), ('12.5', '7.25'), ('0', '100')):
+            reprice(Train.objects.all(), tax, discount)
+            for train in Train.objects.all():
+                expected = final_price(train.base_price, tax, discount)
+                self.assertEqual(train.final_price, expected, (train.base_price, tax, discount))
+                self.assertEqual(train.final_price_calculated, expected, (train.base_price, tax, discount))
+
+    def test_large_prices_do_not_overflow(self):
+        # base_price * 51805591 (the reduced numerator for 12.34% tax and 7.77% discount) exceeds 2 ** 63
+        base_prices = [10 ** 12 + 7, 3 * 10 ** 14 + 49999999, 8 * 10 ** 18]
+        for index, base_price in enumerate(base_prices):
+            create_train(f'L{index}', self.tehran, self.mashhad, self.company, self.hall,
+                         base_price=base_price, tax=0, discount=0)
+        reprice(Train.objects.all(), '12.34', '7.77')
+        for train in Train.objects.all():
+            self.assertEqual(train.final_price, final_price(train.base_price, '12.34', '7.77'))
+
+    def test_half_even(self):
+        # 10 * 1.05 = 10.5 and 30 * 1.05 = 31.5
+        self.assertEqual(final_price(10, 5, 0), 10)
+        self.assertEqual(final_price(30, 5, 0), 32)
+
+    def test_unchanged_rows_are_skipped(self):
+        self.create_trains(3, tax=9, discount=5)
+        self.assertEqual(reprice(Train.objects.all(), 9, 5), 0)
+        self.assertEqual(reprice(Train.objects.all(), Decimal('10'), 5), 3)
+
+    def test_too_many_decimal_places(self):
+        with self.assertRaisesMessage(Exception, "Tax and discount can have at most two decimal places."):
+            final_price(100, '9.125', 0)
+
+    def test_reprice_rejects_values_outside_the_column(self):
+        self.create_trains(1, tax=9, discount=5)
+        for tax, discount, message in (
+            ('12.345', 5, "Tax can have at most two decimal places."),
+            (9, '100.01', "Discount must be between 0 and 100."),
+            (-1, 5, "Tax must be between 0 and 100."),
+            ('NaN', 5, "Tax must be between 0 and 100."),
+            (9, 'five', "Invalid discount."),
+        ):
+            with self.assertRaisesMessage(Exception, message):
+                reprice(Train.objects.all(), tax, discount)
+        # The mutation checks them before touching any row
+        result = self.execute("""
+            mutation ($company: Int!) { repriceTrains(filter: {railwayCompany: $company}, tax: 12.345, discount: 5) }
+        """, company=self.company.id)
+        self.assertEqual(result.errors[0].message, "Tax can have at most two decimal places.")
+        self.assertEqual(Train.objects.get().tax, Decimal('9.00'))
+
+
+class SeatInventoryTests(TrainTestCase):
+    def setUp(self):
+        super().setUp()
+        self.train = self.create_trains(1)[0]
+
+    def inventory(self):
+        return SeatInventory.objects.get(train=self.train)
+
+    def test_hold_and_confirm(self):
+        hold = hold_seats(self.train.id, seat_numbers=[5, 6])
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held, inventory.sold), (98, 2, 0))
+        self.assertEqual(decode(inventory.seat_map), decode(hold.seat_map))
+        confirm_hold(hold.id)
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held, inventory.sold), (98, 0, 2))
+        self.assertEqual(decode(inventory.seat_map).bit_count(), 2)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_count_only_bookings_skip_seat_map(self):
+        inventory_table = SeatInventory._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            hold = hold_seats(self.train.id, seats=2)
+            self.assertEqual(sell_seats(self.train.id, seats=3), [])
+        inventory_queries = [query['sql'] for query in queries.captured_queries if inventory_table in query['sql']]
+        self.assertEqual(len(inventory_queries), 2)
+        self.assertFalse(any('seat_map' in sql for sql in inventory_queries))
+        confirm_hold(hold.id)
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held, inventory.sold), (95, 0, 5))
+        self.assertEqual(decode(inventory.seat_map), 0)
+
+    def test_not_enough_seats(self):
+        hold_seats(self.train.id, seats=99)
+        with self.assertRaisesMessage(Exception, "Not enough seats available."):
+            sell_seats(self.train.id, seats=2)
+        with self.assertRaisesMessage(Exception, "Train with this ID does not exist."):
+            sell_seats(self.train.id + 1000, seats=1)
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held, inventory.sold), (1, 99, 0))
+
+    def test_finish_hold_checks_counters(self):
+        hold = hold_seats(self.train.id, seats=2)
+        SeatInventory.objects.filter(train=self.train).update(held=1)
+        with self.assertRaisesMessage(Exception, "Seat inventory has fewer held seats than the hold."):
+            confirm_hold(hold.id)
+        self.assertTrue(SeatHold.objects.filter(id=hold.id).exists())
+        self.assertEqual(self.inventory().sold, 0)
+
+    def test_seat_map_suggestions(self):
+        hold_seats(self.train.id, seats=3)
+        hold_seats(self.train.id, seat_numbers=[1])
+        result = self.execute("""
+            query ($number: String!) {
+                trainByNumber(trainNumber: $number) { seatMap { free takenSeats suggestedSeats(count: 2) } }
+            }
+        """, number=self.train.train_number)
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['trainByNumber']['seatMap'], {'free': 96, 'takenSeats': [1], 'suggestedSeats': [3, 4]})
+
+    def test_hold_ttl_bounds(self):
+        for ttl in (0, -5, MAX_HOLD_TTL + 1):
+            with self.assertRaisesMessage(Exception, "Hold TTL must be between"):
+                hold_seats(self.train.id, seats=1, ttl=ttl)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertEqual(self.inventory().available, 100)
+        before = timezone.now()
+        hold = hold_seats(self.train.id, seats=1, ttl=MAX_HOLD_TTL)
+        self.assertGreaterEqual(hold.expires_at, before + timedelta(seconds=MAX_HOLD_TTL))
+
+    def test_hold_and_release(self):
+        hold = hold_seats(self.train.id, seat_numbers=[3, 4])
+        release_hold(hold.id)
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held, inventory.sold), (100, 0, 0))
+        self.assertEqual(decode(inventory.seat_map), 0)
+        with self.assertRaisesMessage(Exception, "Seat hold does not exist."):
+            release_hold(hold.id)
+
+    def test_taken_seat(self):
+        hold_seats(self.train.id, seat_numbers=[3])
+        with self.assertRaisesMessage(Exception, "Seat 3 is already taken."):
+            hold_seats(self.train.id, seat_numbers=[3, 5])
+        # The counters moved before the seat map was read are rolled back
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held), (99, 1))
+
+    def test_sweeper_releases_expired_holds(self):
+        kept = hold_seats(self.train.id, seats=1)
+        expired = hold_seats(self.train.id, seats=3)
+        SeatHold.objects.filter(id=expired.id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaisesMessage(Exception, "Seat hold expired."):
+            confirm_hold(expired.id)
+        self.assertEqual(sweep_expired_holds(), 1)
+        self.assertEqual(sweep_expired_holds(), 0)
+        inventory = self.inventory()
+        self.assertEqual((inventory.available, inventory.held), (99, 1))
+        self.assertEqual(decode(inventory.seat_map), decode(kept.seat_map))
+
+
+class StationSuggestTests(TrainTestCase):
+    def setUp(self):
+        super().setUp()
+        station_index.counted_at = None  # Recount popularity for this test's trains
+        self.karaj = Station.objects.create(station_name='کرج', station_city='کرج', station_province='البرز')
+        self.reza = Station.objects.create(station_name='Imam Reza', station_city='Mashhad', station_province='Khorasan')
+
+    def suggest(self, prefix, limit=10):
+        result = self.execute(
+            'query ($prefix: String!, $limit: Int) { stationSuggest(prefix: $prefix, limit: $limit) { stationName } }',
+            prefix=prefix, limit=limit
+        )
+        self.assertIsNone(result.errors)
+        return [station['stationName'] for station in result.data['stationSuggest']]
+
+    def test_prefixes_of_any_word_and_arabic_letters(self):
+        self.assertEqual(self.suggest('كر'), ['کرج'])  # Arabic kaf
+        self.assertEqual(self.suggest('  REZ'), ['Imam Reza'])
+        self.assertEqual(self.suggest('x'), [])
+        self.assertEqual(self.suggest(' '), [])
+
+    def test_busiest_first_then_name_matches(self):
+        # 'mash' is the name of Mashhad and the city of Imam Reza
+        self.assertEqual(self.suggest('mash'), ['Mashhad', 'Imam Reza'])
+        create_train('R1', self.tehran, self.reza, self.company, self.hall)
+        station_index.counted_at = None
+        self.assertEqual(self.suggest('mash'), ['Imam Reza', 'Mashhad'])
+        self.assertEqual(self.suggest('mash', limit=1), ['Imam Reza'])
+
+    def test_station_changes_update_the_index(self):
+        self.execute('mutation ($id: Int!) { updateStation(stationId: $id, stationName: "Karaj") { id } }', id=self.karaj.id)
+        self.assertEqual(self.suggest('kar'), ['Karaj'])
+        self.assertEqual(self.suggest('کرج'), ['Karaj'])  # Still the city
+        Station.objects.filter(id=self.reza.id).delete()
+        reference_data.invalidate()
+        self.assertEqual(self.suggest('imam'), [])
+
+    def test_limit_is_checked(self):
+        result = self.execute('{ stationSuggest(prefix: "te", limit: %d) { id } }' % (MAX_SUGGESTIONS + 1))
+        self.assertEqual(result.errors[0].message, f"limit must be between 1 and {MAX_SUGGESTIONS}.")
+
+
+class LogoVariantTests(TrainTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name, MEDIA_URL='/media/')
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, size, mode='RGBA'):
+        output = io.BytesIO()
+        Image.new(mode, size).save(output, 'PNG')
+        self.company.railway_logo = default_storage.save('railway_company_logos/logo.png', ContentFile(output.getvalue()))
+        self.company.save()
+
+    def test_variants_keep_the_aspect_ratio(self):
+        self.upload((300, 150))
+        variants = generate_variants(self.company.id)
+        self.assertEqual({name: (variant['width'], variant['height']) for name, variant in variants.items()},
+                         {'thumbnail': (64, 32), 'small': (128, 64), 'medium': (256, 128)})
+        with default_storage.open(variants['small']['name'], 'rb') as file:
+            image = Image.open(file)
+            self.assertEqual((image.format, image.mode), ('WEBP', 'RGBA'))
+        # The same logo reuses the stored files
+        self.assertEqual(generate_variants(self.company.id), variants)
+
+        result = self.execute('{ railwayCompanyByName(railwayName: "Raja") { logoVariants { variant url width } } }')
+        self.assertIsNone(result.errors)
+        logo_variants = result.data['railwayCompanyByName']['logoVariants']
+        self.assertEqual([(variant['variant'], variant['width']) for variant in logo_variants],
+                         [('thumbnail', 64), ('small', 128), ('medium', 256)])
+        self.assertEqual(logo_variants[0]['url'], '/media/' + variants['thumbnail']['name'])
+
+    def test_small_logos_are_not_scaled_up(self):
+        self.upload((40, 100), mode='RGB')
+        variants = generate_variants(self.company.id)
+        self.assertEqual({name: (variant['width'], variant['height']) for name, variant in variants.items()},
+                         {'thumbnail': (26, 64), 'small': (40, 100), 'medium': (40, 100)})
+
+    def test_command_and_broken_logos(self):
+        self.company.railway_logo = default_storage.save('railway_company_logos/broken.png', ContentFile(b'not an image'))
+        self.company.save()
+        output, errors = io.StringIO(), io.StringIO()
+        call_command('generate_logo_variants', stdout=output, stderr=errors)
+        self.assertIn(f"Company {self.company.id}:", errors.getvalue())
+        self.assertIn("Generated logo variants of 0 railway companies.", output.getvalue())
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.railway_logo_variants, {})
+
+        self.upload((100, 100))
+        call_command('generate_logo_variants', missing=True, stdout=output)
+        self.company.refresh_from_db()
+        self.assertEqual(set(self.company.railway_logo_variants), {'thumbnail', 'small', 'medium'})
+
+
+class JourneyPlannerTests(TrainTestCase):
+    def setUp(self):
+        super().setUp()
+        self.karaj = Station.objects.create(station_name='Karaj', station_city='Karaj', station_province='Alborz')
+
+    def train(self, number, origin, destination, departure_hour, hours):
+        return create_train(number, origin, destination, self.company, self.hall,
+                            departure=START + timedelta(hours=departure_hour), hours=hours)
+
+    def test_pareto_journeys(self):
+        direct = self.train('D', self.tehran, self.mashhad, 8, 6)
+        first = self.train('A', self.tehran, self.karaj, 8, 1)
+        second = self.train('B', self.karaj, self.mashhad, 9.5, 1.5)
+        journeys = timetable.plan_journey(self.tehran.id, self.mashhad.id, START)
+        # The direct train, then the faster journey with one transfer
+        self.assertEqual(journeys, [[direct.id], [first.id, second.id]])
+        journeys = timetable.plan_journey(self.tehran.id, self.mashhad.id, START, min_transfer_time=timedelta(hours=1))
+        self.assertEqual(journeys, [[direct.id]])
+        self.assertEqual(timetable.plan_journey(self.tehran.id, self.mashhad.id, START, max_transfers=0), [[direct.id]])
+
+    def test_changes_are_patched_in(self):
+        direct = self.train('D', self.tehran, self.mashhad, 8, 6)
+        self.assertEqual(timetable.plan_journey(self.tehran.id, self.mashhad.id, START), [[direct.id]])
+
+        faster = self.train('F', self.tehran, self.mashhad, 9, 2)
+        direct.departure_datetime += timedelta(days=1)
+        direct.arrival_datetime += timedelta(days=1)
+        direct.save()
+        timetable._timetable.refreshed_at -= 60  # Due for a refresh
+        with mock.patch.object(Timetable, 'build', side_effect=AssertionError("Timetable rebuilt instead of patched")):
+            journeys = timetable.plan_journey(self.tehran.id, self.mashhad.id, START)
+        self.assertEqual(journeys, [[faster.id]])
+
+        faster.delete()
+        timetable._timetable.refreshed_at -= 60
+        self.assertEqual(timetable.plan_journey(self.tehran.id, self.mashhad.id, START), [[direct.id]])
+
+    def test_patch_matches_build(self):
+        trains = [self.train(str(hour), self.tehran, self.mashhad, hour, 1) for hour in range(10)]
+        old = Timetable.build(0)
+        # Moved earlier and later, deleted, added and unchanged trains
+        for train, hours in ((trains[1], 7.5), (trains[8], -6.5), (trains[4], 0.5)):
+            train.departure_datetime += timedelta(hours=hours)
+            train.save()
+        changed_ids = {train.id for train in trains[::2]} | {trains[1].id}
+        trains[6].delete()
+        changed_ids.add(self.train('N', self.tehran, self.mashhad, 3.5, 1).id)
+        patched = old.patch(changed_ids, set())
+        built = Timetable.build(0)
+        for name in ('departures', 'arrivals', 'origins', 'destinations', 'trains', 'departure_by_train'):
+            self.assertEqual(getattr(patched, name), getattr(built, name), name)
+
+
+class SearchTableTests(TrainTestCase):
+    def check(self, **options):
+        output = io.StringIO()
+        call_command('check_search_table', stdout=output, **options)
+        return output.getvalue()
+
+    def test_rows_follow_changes(self):
+        train = self.create_trains(1)[0]
+        self.assertEqual(TrainSearchRow.objects.get(train=train).departure_city, 'Tehran')
+        self.tehran.station_city = 'Tehran Province'
+        self.tehran.save()
+        self.assertEqual(TrainSearchRow.objects.get(train=train).departure_city, 'Tehran Province')
+        self.assertIn("consistent", self.check())
+
+    def test_drift_is_detected_and_fixed(self):
+        trains = self.create_trains(3)
+        TrainSearchRow.objects.filter(train=trains[0]).update(departure_city='Qom')
+        Train.objects.filter(id=trains[1].id).update(stars=5)  # update() sends no signals
+        TrainSearchRow.objects.filter(train=trains[2]).delete()
+        with self.assertRaisesMessage(CommandError, "3 trains have a missing or stale search row"):
+            self.check()
+        self.assertIn("Rewrote the search rows of 3 trains", self.check(fix=True))
+        self.assertIn("consistent", self.check())
+        self.assertEqual(TrainSearchRow.objects.get(train=trains[1]).stars, 5)
+
+
+class ExportTests(TrainTestCase):
+    def setUp(self):
+        super().setUp()
+        self.trains = self.create_trains(3)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ndjson(self):
+        response = self.client.get('/export/trains')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in self.body(response).decode().splitlines()]
+        self.assertEqual([row['train_number'] for row in rows], ['T0', 'T1', 'T2'])
+        self.assertEqual(list(rows[0]), list(EXPORT_COLUMNS))
+        self.assertEqual(rows[0]['departure_station'], 'Tehran')
+        self.assertEqual(rows[0]['final_price'], 1036)
+
+    def test_csv(self):
+        response = self.client.get('/export/trains', {'format': 'csv'})
+        rows = list(csv.reader(io.StringIO(self.body(response).decode())))
+        self.assertEqual(rows[0], list(EXPORT_COLUMNS))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][list(EXPORT_COLUMNS).index('departure_datetime')], START.isoformat())
+
+    def test_empty_csv_has_header(self):
+        Train.objects.all().delete()
+        response = self.client.get('/export/trains', {'format': 'csv'})
+        self.assertEqual(self.body(response).decode(), ','.join(EXPORT_COLUMNS) + '\n')
+
+    def test_gzip(self):
+        response = self.client.get('/export/trains', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(self.body(response)).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        response = self.client.get('/export/trains', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_updated_since(self):
+        Train.objects.exclude(id=self.trains[1].id).update(updated_at=START)
+        response = self.client.get('/export/trains', {'updated_since': '2025-03-02T00:00:00'})
+        rows = [json.loads(line) for line in self.body(response).decode().splitlines()]
+        self.assertEqual([row['train_number'] for row in rows], ['T1'])
+
+    def test_rename_marks_trains_updated(self):
+        qom = Station.objects.create(station_name='Qom', station_city='Qom', station_province='Qom')
+        Train.objects.filter(id=self.trains[1].id).update(arrival_station=qom)
+        Train.objects.update(updated_at=START)
+        qom.station_name = 'Qom Central'
+        qom.save()
+        response = self.client.get('/export/trains', {'updated_since': '2025-03-02T00:00:00'})
+        rows = [json.loads(line) for line in self.body(response).decode().splitlines()]
+        self.assertEqual([(row['train_number'], row['arrival_station']) for row in rows], [('T1', 'Qom Central')])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get('/export/trains', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/export/trains', {'updated_since': 'yesterday'}).status_code, 400)
+
+
+class LoadTimetableTests(TestCase):
+    def write(self, directory, name, rows):
+        with open(os.path.join(directory, name), 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows(rows)
+
+    def load(self, directory, **options):
+        output = io.StringIO()
+        call_command('load_timetable', source=directory, stdout=output, **options)
+        return output.getvalue()
+
+    def test_csv_source(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write(directory, 'stations.csv', [
+                ('station_name', 'station_city', 'station_province'),
+                ('Tehran', 'Tehran', 'Tehran'),
+                ('Mashhad', 'Mashhad', 'Khorasan'),
+            ])
+            self.write(directory, 'railway_companies.csv', [
+                ('railway_name', 'railway_description', 'refund_policy'), ('Raja', '-', '-'),
+            ])
+            self.write(directory, 'train_halls.csv', [('hall_name', 'hall_description'), ('VIP', '')])
+            self.write(directory, 'trains.csv', [
+                ('train_number', 'departure_datetime', 'arrival_datetime', 'departure_station', 'arrival_station',
+                 'railway_company', 'train_type', 'capacity', 'hall', 'stars', 'base_price', 'tax', 'discount'),
+                *[(f'L{index}', f'2025-03-01T0{index}:00:00+00:00', '2025-03-01T18:00:00+00:00', 'Tehran', 'Mashhad',
+                   'Raja', 'Bus-style', 100, 'VIP', '', 1000, 9, 5) for index in range(3)],
+            ])
+            output = self.load(directory, chunk_size=2)
+        # Progress is printed for every batch, the last partial one included
+        self.assertIn("  2 trains (", output)
+        self.assertIn("  3 trains (", output)
+        self.assertEqual(Train.objects.count(), 3)
+        self.assertEqual(Train.objects.get(train_number='L0').final_price, 1036)
+        self.assertIsNone(TrainHall.objects.get().hall_description)
+
+    def test_empty_required_cells_are_row_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write(directory, 'stations.csv', [
+                ('station_name', 'station_city', 'station_province'),
+                ('Tehran', '', 'Tehran'),
+                ('Mashhad', 'Mashhad', 'M' * 256),
+                ('Qom', 'Qom', 'Qom'),
+            ])
+            self.write(directory, 'trains.csv', [TRAIN_FILE_COLUMNS])
+            with self.assertRaises(CommandError) as context:
+                self.load(directory)
+        self.assertEqual(str(context.exception).splitlines(), [
+            "stations.csv line 2: station_city is required.",
+            "stations.csv line 3: station_province is longer than 255 characters.",
+        ])
+        self.assertFalse(Station.objects.exists())
@@ -0,0 +1,261 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from .models import Train, TimetableChange
+from .versioning import model_version, bump_version
+
+# How often a worker looks for timetable changes (seconds)
+CHECK_INTERVAL = getattr(settings, 'TIMETABLE_CHECK_INTERVAL', 1.0)
+# Changes older than this are deleted; a worker that has not refreshed for as long rebuilds (seconds)
+CHANGE_RETENTION = getattr(settings, 'TIMETABLE_CHANGE_RETENTION', 3600)
+# Changes are re-read for this long, so a transaction committing after a newer one is not missed (seconds)
+CHANGE_GRACE = 30
+# More changed trains than this at once: rebuild instead of patching
+MAX_PATCH_SIZE = 20000
+
+# Journey planner limits
+MAX_TRANSFERS = 5
+MAX_JOURNEY_DURATION = timedelta(hours=48)
+
+
+def record_changes(train_ids):
+    """
+    Record that the schedule of some trains changed (or that they were deleted).
+    Call it inside the transaction that changes them.
+    """
+    TimetableChange.objects.bulk_create([TimetableChange(train_id=pk) for pk in train_ids], batch_size=1000)
+
+
+def timetable_replaced():
+    """Make every worker rebuild its timetable (after bulk loads that record no changes)."""
+    transaction.on_commit(lambda: bump_version(TimetableChange))
+
+
+def _timestamp(value):
+    return int(value.timestamp())
+
+
+COLUMNS = ('departure_datetime', 'arrival_datetime', 'departure_station_id', 'arrival_station_id', 'id')
+
+
+class Timetable:
+    """
+    In-memory timetable: one connection per train, in parallel arrays sorted
+    by departure time, plus the departure of every train indexed by train id
+    to find its row when it changes (about 50 bytes per train). The arrays
+    are never modified: a patch works on copies.
+    """
+    def __init__(self, version, departures, arrivals, origins, destinations, trains, departure_by_train, changes):
+        self.version = version
+        self.departures = departures  # Departure times (epoch seconds), sorted
+        self.arrivals = arrivals  # Arrival times (epoch seconds)
+        self.origins = origins  # Departure station ids
+        self.destinations = destinations  # Arrival station ids
+        self.trains = trains  # Train ids
+        self.departure_by_train = departure_by_train  # Departure time by train id, -1 if absent
+        self.changes = changes  # Ids of the TimetableChange rows already applied (within CHANGE_GRACE)
+        self.last_change_id = max(changes, default=0)
+        self.refreshed_at = time.monotonic()
+        self.refreshed_on = timezone.now()
+
+    @classmethod
+    def build(cls, version):
+        last_change_id = TimetableChange.objects.aggregate(last=Max('id'))['last'] or 0
+        departures, arrivals = array('q'), array('q')
+        origins, destinations, trains = array('q'), array('q'), array('q')
+        rows = Train.objects.order_by('departure_datetime', 'id').values_list(*COLUMNS)
+        for departure, arrival, origin, destination, pk in rows.iterator(chunk_size=10000):
+            departures.append(_timestamp(departure))
+            arrivals.append(_timestamp(arrival))
+            origins.append(origin)
+            destinations.append(destination)
+            trains.append(pk)
+        departure_by_train = array('q', [-1]) * (max(trains, default=0) + 1)
+        for departure, pk in zip(departures, trains):
+            departure_by_train[pk] = departure
+        return cls(version, departures, arrivals, origins, destinations, trains, departure_by_train, {last_change_id})
+
+    def patch(self, changed_ids, changes):
+        """
+        Return a copy with the rows of `changed_ids` reloaded from the database.
+
+        The copy is built in one merge: the unchanged runs of the arrays are
+        copied slice by slice between the dropped rows and the insertion points
+        of the reloaded ones, so a patch costs O(n + k log n) for k changes.
+        """
+        old = (self.departures, self.arrivals, self.origins, self.destinations, self.trains)
+        departures, trains = self.departures, self.trains
+        departure_by_train = array('q', self.departure_by_train)
+        rows = Train.objects.filter(id__in=changed_ids).values_list(*COLUMNS)
+
+        # Edits in array order: (index, 1, None) drops the row at index,
+        # (index, 0, row) inserts a row before it (after the rows departing at the same time)
+        edits = []
+        for pk in changed_ids:
+            if pk < len(departure_by_train) and departure_by_train[pk] >= 0:
+                index = bisect_left(departures, departure_by_train[pk])
+                while trains[index] != pk:
+                    index += 1
+                edits.append((index, 1, None))
+                departure_by_train[pk] = -1
+        for departure, arrival, origin, destination, pk in rows:
+            row = (_timestamp(departure), _timestamp(arrival), origin, destination, pk)
+            edits.append((bisect_right(departures, row[0]), 0, row))
+            if pk >= len(departure_by_train):
+                departure_by_train.extend([-1] * (pk + 1 - len(departure_by_train)))
+            departure_by_train[pk] = row[0]
+        edits.sort()
+
+        columns = [array('q') for _ in old]
+        start = 0
+        for index, drop, row in edits:
+            for column, source in zip(columns, old):
+                column.extend(source[start:index])
+            if drop:
+                start = index + 1
+            else:
+                start = index
+                for column, value in zip(columns, row):
+                    column.append(value)
+        for column, source in zip(columns, old):
+            column.extend(source[start:])
+        return Timetable(self.version, *columns, departure_by_train, changes)
+
+    def plan(self, origin, destination, depart_after, max_transfers, min_transfer_time):
+        """
+        Connection Scan: earliest arrivals from `origin` to `destination` for
+        each number of legs up to max_transfers + 1.
+
+        Returns the Pareto-optimal journeys (each faster one needs more
+        transfers), as lists of train ids. Times are epoch seconds.
+        """
+        max_legs = max_transfers + 1
+        horizon = depart_after + int(MAX_JOURNEY_DURATION.total_seconds())
+        never = horizon + 1
+        # best[k][station]: earliest arrival with at most k legs; parent[k][station]: (connection, legs before it)
+        best = [{} for _ in range(max_legs + 1)]
+        parent = [{} for _ in range(max_legs + 1)]
+        departures, arrivals = self.departures, self.arrivals
+        origins, destinations = self.origins, self.destinations
+
+        for index in range(bisect_left(departures, depart_after), len(departures)):
+            departure = departures[index]
+            # Labels are monotone in k, so best[1] is the one a later connection can still improve
+            if departure > horizon or departure >= best[1].get(destination, never):
+                break  # Nothing later can arrive earlier
+            station = origins[index]
+            if station == origin:
+                legs = 0
+            else:
+                # Fewest legs that reach this station in time to change trains
+                for legs in range(1, max_legs):
+                    if best[legs].get(station, never) + min_transfer_time <= departure:
+                        break
+                else:
+                    continue
+            arrival = arrivals[index]
+            target = destinations[index]
+            if target == origin:
+                continue
+            for k in range(legs + 1, max_legs + 1):
+                if arrival >= best[k].get(target, never):
+                    break  # Labels are monotone in k: no better label above either
+                best[k][target] = arrival
+                parent[k][target] = (index, legs)
+
+        journeys = []
+        previous = never
+        for k in range(1, max_legs + 1):
+            arrival = best[k].get(destination, never)
+            if arrival < previous:
+                journeys.append(self._legs(parent, k, destination))
+                previous = arrival
+        return journeys
+
+    def _legs(self, parent, legs, station):
+        trains = []
+        while legs:
+            index, legs = parent[legs][station]
+            trains.append(self.trains[index])
+            station = self.origins[index]
+        return trains[::-1]
+
+
+class TimetableHolder:
+    """
+    Per-process holder of the current Timetable.
+
+    Every CHECK_INTERVAL seconds the timetable is patched with the trains
+    recorded in TimetableChange since the last check. It is rebuilt when the
+    TimetableChange version changes (bulk loads), when too many trains changed at once
+    or when it was not refreshed for CHANGE_RETENTION seconds.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timetable = None
+
+    def timetable(self):
+        timetable = self._timetable
+        if timetable is not None and time.monotonic() - timetable.refreshed_at < CHECK_INTERVAL:
+            return timetable
+        with self._lock:
+            # Another thread may have refreshed while we were waiting
+            timetable = self._timetable
+            if timetable is None or time.monotonic() - timetable.refreshed_at >= CHECK_INTERVAL:
+                timetable = self._refresh(timetable)
+                self._timetable = timetable
+        return timetable
+
+    def _refresh(self, timetable):
+        version = model_version(TimetableChange)
+        if (timetable is None or timetable.version != version
+                or time.monotonic() - timetable.refreshed_at >= CHANGE_RETENTION):
+            TimetableChange.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=CHANGE_RETENTION)).delete()
+            return Timetable.build(version)
+
+        since = timetable.refreshed_on - timedelta(seconds=CHANGE_GRACE)
+        changes = dict(
+            TimetableChange.objects.filter(Q(id__gt=timetable.last_change_id) | Q(created_at__gte=since))
+            .values_list('id', 'train_id')[:MAX_PATCH_SIZE + 1]
+        )
+        if len(changes) > MAX_PATCH_SIZE:
+            return Timetable.build(version)
+        changed_ids = {train_id for pk, train_id in changes.items() if pk not in timetable.changes}
+        # Keep the newest applied id, so `id__gt` still skips old rows once the grace window is empty
+        applied = set(changes) | {timetable.last_change_id}
+        if not changed_ids:
+            timetable.changes = applied
+            timetable.refreshed_at = time.monotonic()
+            timetable.refreshed_on = timezone.now()
+            return timetable
+        return timetable.patch(changed_ids, applied)
+
+    def invalidate(self):
+        """Force a rebuild on the next access in this process."""
+        self._timetable = None
+
+    def plan_journey(self, origin, destination, depart_after, max_transfers=2, min_transfer_time=timedelta(minutes=15)):
+        """
+        Return journeys from station `origin` to `destination` leaving after
+        `depart_after`, each as a list of train ids: the earliest arrival plus
+        any journey with fewer transfers arriving later.
+        """
+        if not 0 <= max_transfers <= MAX_TRANSFERS:
+            raise Exception(f"max_transfers must be between 0 and {MAX_TRANSFERS}.")
+        if origin == destination:
+            return []
+        if timezone.is_naive(depart_after):
+            depart_after = timezone.make_aware(depart_after)
+        return self.timetable().plan(
+            origin, destination, _timestamp(depart_after), max_transfers, int(min_transfer_time.total_seconds())
+        )
+
+
+# Shared instance for this process
+timetable = TimetableHolder()
@@ -0,0 +1,50 @@
+import time
+from django.core.cache import cache
+
+VERSION_KEY = 'train-service:version:{}'
+
+# Number of bumps made by this process (lets local readers skip the cache round trip)
+_local_generation = 0
+
+
+def _key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def model_version(model):
+    """
+    Return the current data version of a model.
+
+    Versions live in Django's cache so every worker sharing the cache backend
+    sees the same counter. The initial value is time based, so a counter lost
+    to eviction never goes back to a version a worker has already seen.
+    """
+    version = cache.get(_key(model))
+    if version is None:
+        cache.add(_key(model), time.time_ns())
+        version = cache.get(_key(model))
+    return version
+
+
+def model_versions(*models):
+    """Return a tuple with the current versions of several models."""
+    return tuple(model_version(model) for model in models)
+
+
+def local_generation():
+    """Return how many times this process has bumped a version."""
+    return _local_generation
+
+
+def bump_version(*models):
+    """
+    Increase the data version of the given models (called after every write).
+    """
+    global _local_generation
+    _local_generation += 1
+    for model in models:
+        try:
+            cache.incr(_key(model))
+        except ValueError:
+            # Key is missing (never read or evicted): start a new counter
+            cache.add(_key(model), time.time_ns())
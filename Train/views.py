@@ -1,3 +1,85 @@
-from django.shortcuts import render
+import hmac
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+from TrainsService.db_router import choose_replica
+from .export import export_rows, ndjson_chunks, csv_chunks, gzip_chunks
 
-# Create your views here.
+# Bearer token required by the export when set
+EXPORT_TOKEN = getattr(settings, 'TIMETABLE_EXPORT_TOKEN', None)
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson; charset=utf-8'),
+    'csv': (csv_chunks, 'text/csv; charset=utf-8'),
+}
+
+
+def _accepts_gzip(request):
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() == 'gzip':
+            return not re.fullmatch(r'\s*q\s*=\s*0(\.0*)?\s*', params)
+    return False
+
+
+async def _aiterate(chunks):
+    # One chunk per call, always in the same thread, so the cursor keeps its connection
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+@require_GET
+def export_trains(request):
+    """
+    Stream the whole timetable as NDJSON (default) or CSV, read from a read
+    replica when one is usable.
+
+    Query parameters: `format` (ndjson or csv) and `updated_since` (ISO 8601
+    datetime) to export only the trains changed since then; deleted trains
+    are not reported. The body is gzip-compressed on the fly when the client
+    accepts it.
+    """
+    if EXPORT_TOKEN and not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f"Bearer {EXPORT_TOKEN}"
+    ):
+        return HttpResponse("Invalid export token.", status=401)
+
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown format '{export_format}', expected ndjson or csv.")
+    updated_since = request.GET.get('updated_since')
+    if updated_since:
+        try:
+            updated_since = parse_datetime(updated_since)
+        except ValueError:
+            updated_since = None
+        if updated_since is None:
+            return HttpResponseBadRequest("updated_since must be an ISO 8601 datetime.")
+        if timezone.is_naive(updated_since):
+            updated_since = timezone.make_aware(updated_since)
+
+    serialize, content_type = EXPORT_FORMATS[export_format]
+    chunks = serialize(export_rows(choose_replica(), updated_since or None))
+    compress = _accepts_gzip(request)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    # Under ASGI a sync iterator would be read whole before sending; hand it over chunk by chunk
+    if isinstance(request, ASGIRequest):
+        chunks = _aiterate(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="trains.{export_format}"'
+    response['Vary'] = 'Accept-Encoding'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TrainsService.settings')
+# Without a pool, connections must not outlive a request: ASGI requests do not reuse threads
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+# Fail at startup rather than silently skip replicas the database user cannot monitor
+from TrainsService.db_router import check_replicas  # Reads the settings
+
+check_replicas()
@@ -0,0 +1,172 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Aliases of the read replicas in DATABASES (built from DATABASE_REPLICA_HOSTS in settings.py)
+REPLICAS = getattr(settings, 'DATABASE_REPLICAS', [])
+# Replicas lagging more than this behind the primary are not used (seconds)
+MAX_REPLICA_LAG = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5.0)
+# How often each process measures the lag of every replica (seconds)
+LAG_CHECK_INTERVAL = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5.0)
+# After a mutation, the client's reads go to the primary for this long (seconds)
+STICKY_SECONDS = getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10.0)
+STICKY_COOKIE = 'db_primary_until'
+
+# Lag of a replica, and whether the database user may read the WAL receiver's
+# status: without the pg_read_all_stats role its columns read as NULL.
+# The lag is NULL (unusable) when the WAL receiver is not streaming: a disconnected
+# replica has replayed all it received but may be far behind. Else 0 when it has
+# replayed everything it received (an idle primary would otherwise look like
+# growing lag), else the age of the last replayed transaction.
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END, NOT pg_is_in_recovery() OR pg_has_role(current_user, 'pg_read_all_stats', 'USAGE')
+"""
+MISSING_ROLE = (
+    "The database user of read replica {} cannot read pg_stat_wal_receiver, so the replica "
+    "would always look disconnected: grant it the pg_read_all_stats role."
+)
+
+# Reads of the current GraphQL query: {'alias': replica chosen on the first read, or None}
+_replica_reads = ContextVar('replica_reads', default=None)
+
+
+class ReplicaHealth:
+    """Per-process view of the replicas' lag, refreshed every LAG_CHECK_INTERVAL seconds."""
+    def __init__(self, replicas=REPLICAS):
+        self.replicas = replicas
+        self.lock = threading.Lock()
+        self.lag = {}  # {alias: seconds, or None when the replica is unreachable or not streaming}
+        self.checked_at = 0.0
+
+    def measure(self, alias):
+        connection = connections[alias]
+        try:
+            if connection.vendor != 'postgresql':
+                connection.ensure_connection()
+                return 0.0  # No replication to measure (local SQLite setups)
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag, readable = cursor.fetchone()
+        except DatabaseError as error:
+            logger.warning("Read replica %s is unavailable: %s", alias, error)
+            return None
+        if not readable:
+            # Checked at startup by check_replicas(); only a role revoked since then gets here
+            logger.error(MISSING_ROLE.format(alias))
+            return None
+        if lag is None:
+            logger.warning("Read replica %s is not streaming from the primary.", alias)
+            return None
+        return float(lag)
+
+    def usable(self):
+        """Return the replicas that answer and lag at most MAX_REPLICA_LAG seconds."""
+        if time.monotonic() - self.checked_at >= LAG_CHECK_INTERVAL:
+            with self.lock:
+                # Another thread may have measured while we were waiting
+                if time.monotonic() - self.checked_at >= LAG_CHECK_INTERVAL:
+                    self.lag = {alias: self.measure(alias) for alias in self.replicas}
+                    self.checked_at = time.monotonic()
+        return [alias for alias, lag in self.lag.items() if lag is not None and lag <= MAX_REPLICA_LAG]
+
+
+replica_health = ReplicaHealth()
+
+
+def check_replicas(replicas=REPLICAS):
+    """
+    Raise ImproperlyConfigured when a PostgreSQL replica's database user cannot
+    read the WAL receiver status. Called once at startup (wsgi.py, asgi.py);
+    unreachable replicas are left to ReplicaHealth.
+    """
+    for alias in replicas:
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            continue
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                readable = cursor.fetchone()[1]
+        except DatabaseError as error:
+            logger.warning("Read replica %s is unavailable: %s", alias, error)
+            continue
+        if not readable:
+            raise ImproperlyConfigured(MISSING_ROLE.format(alias))
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Let the reads made inside the block (including sync_to_async threads) go to a replica."""
+    token = _replica_reads.set({'alias': None} if enabled and REPLICAS else None)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def choose_replica():
+    """Return a usable replica, or the primary when none is."""
+    replicas = replica_health.usable()
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+def read_database():
+    """Return the database the current operation reads from, or None if it has not read yet."""
+    reads = _replica_reads.get()
+    return reads['alias'] if reads is not None else DEFAULT_DB_ALIAS
+
+
+def is_sticky(request):
+    """Whether the client made a mutation recently and must read its own writes."""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def stick_to_primary(response):
+    """Send the client's reads to the primary for the next STICKY_SECONDS seconds."""
+    if REPLICAS:
+        response.set_cookie(STICKY_COOKIE, f"{time.time() + STICKY_SECONDS:.3f}",
+                            max_age=int(STICKY_SECONDS) + 1, httponly=True, samesite='Lax')
+    return response
+
+
+class PrimaryReplicaRouter:
+    """
+    Send the reads of GraphQL queries to a read replica and everything else
+    (writes, mutations, undo/redo, management commands) to the primary.
+
+    One replica is chosen per operation, among those within MAX_REPLICA_LAG;
+    when none is usable the primary serves the reads.
+    """
+    def db_for_read(self, model, **hints):
+        reads = _replica_reads.get()
+        if reads is None:
+            return DEFAULT_DB_ALIAS
+        if reads['alias'] is None:
+            reads['alias'] = choose_replica()
+        return reads['alias']
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from graphql import parse, validate, GraphQLError
+
+# Number of parsed and validated documents kept per process
+DOCUMENT_CACHE_SIZE = getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 1000)
+# Optional JSON file {sha256 hash: query} with the queries clients may send by hash
+PERSISTED_QUERIES_FILE = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_FILE', None)
+# Only accept queries from the persisted queries file
+PERSISTED_QUERIES_ONLY = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_ONLY', False)
+# Lifetime of queries registered at runtime (seconds); clients register them again when they expire
+PERSISTED_QUERY_TIMEOUT = getattr(settings, 'GRAPHQL_PERSISTED_QUERY_TIMEOUT', 24 * 3600)
+
+PERSISTED_QUERY_KEY = 'graphql:persisted-query:{}'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU cache of parsed and validated GraphQL documents, keyed by
+    schema and query hash (the sync and async endpoints share it).
+
+    Only variable-independent validation (the standard rules and the depth
+    limit) is cached; rules that depend on variables still run per request.
+    """
+    def __init__(self, maxsize=DOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.documents = OrderedDict()  # {(schema, hash): (document, validation errors)}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, schema, query, rules, key=None):
+        key = (schema, key or query_hash(query))
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry is not None:
+                self.documents.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse and validate outside the lock; a concurrent miss only duplicates work
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return None, [error]
+        entry = (document, validate(schema, document, rules))
+
+        with self.lock:
+            self.documents[key] = entry
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.maxsize:
+                self.documents.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.documents),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class PersistedQueries:
+    """
+    Persisted queries: clients send `extensions.persistedQuery.sha256Hash`
+    instead of the query text.
+
+    Hashes come from PERSISTED_QUERIES_FILE and, unless PERSISTED_QUERIES_ONLY
+    is set, from queries registered at runtime (Apollo automatic persisted
+    queries), which are shared between workers through Django's cache for
+    PERSISTED_QUERY_TIMEOUT seconds. Only queries that parse and validate
+    are registered.
+    """
+    def __init__(self, path=PERSISTED_QUERIES_FILE, only=PERSISTED_QUERIES_ONLY):
+        self.only = only
+        self.allowlist = {}
+        if path:
+            with open(path, encoding='utf-8') as file:
+                self.allowlist = json.load(file)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, sha256_hash):
+        query = self.allowlist.get(sha256_hash)
+        if query is None and not self.only:
+            query = cache.get(PERSISTED_QUERY_KEY.format(sha256_hash))
+        with self.lock:
+            if query is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return query
+
+    def check(self, sha256_hash, query):
+        """Raise if a query sent together with its hash may not be registered."""
+        if query_hash(query) != sha256_hash:
+            raise GraphQLError("provided sha does not match query")
+        if self.only and sha256_hash not in self.allowlist:
+            raise GraphQLError("Only persisted queries are allowed.")
+
+    def register(self, sha256_hash, query):
+        """Register a query that was checked and validated."""
+        self.check(sha256_hash, query)
+        if sha256_hash not in self.allowlist:
+            cache.set(PERSISTED_QUERY_KEY.format(sha256_hash), query, PERSISTED_QUERY_TIMEOUT)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'allowlist_size': len(self.allowlist),
+                'only': self.only,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Shared instances for this process
+document_cache = DocumentCache()
+persisted_queries = PersistedQueries()
@@ -0,0 +1,340 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import partial
+from django.conf import settings
+from django.db import connection as default_connection, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphql import GraphQLError, MiddlewareManager, OperationDefinitionNode, parse
+from .document_cache import persisted_queries
+
+# Record per-field and per-operation GraphQL metrics (can be overridden in settings.py)
+METRICS_ENABLED = getattr(settings, 'GRAPHQL_METRICS_ENABLED', True)
+# Share of operations whose fields are measured (operations are always measured)
+FIELD_SAMPLE_RATE = getattr(settings, 'GRAPHQL_METRICS_FIELD_SAMPLE_RATE', 0.1)
+# Operation names used as labels besides those of the persisted queries file; clients
+# choose names freely, so any other name is recorded as "other"
+METRICS_OPERATIONS = getattr(settings, 'GRAPHQL_METRICS_OPERATIONS', ())
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The OperationTimer of the operation being executed (also seen by sync_to_async threads)
+_current_operation = ContextVar('graphql_current_operation', default=None)
+
+_known_operations = None
+
+
+def known_operations():
+    """Operation names that get their own label: METRICS_OPERATIONS and the persisted queries' names."""
+    global _known_operations
+    if _known_operations is None:
+        names = set(METRICS_OPERATIONS)
+        for query in persisted_queries.allowlist.values():
+            try:
+                document = parse(query)
+            except GraphQLError:
+                continue
+            names.update(
+                definition.name.value for definition in document.definitions
+                if isinstance(definition, OperationDefinitionNode) and definition.name is not None
+            )
+        _known_operations = frozenset(names)
+    return _known_operations
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper counting queries for the current operation."""
+    operation = _current_operation.get()
+    if operation is not None:
+        operation.sql_queries += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+@receiver(connection_created)
+def on_connection_created(sender, connection, **kwargs):
+    if METRICS_ENABLED:
+        install_query_counter(connection)
+
+
+def new_series(buckets=LATENCY_BUCKETS):
+    """[count, latency sum, errors, sql queries, *bucket counts]"""
+    return [0] * (4 + len(buckets) + 1)
+
+
+def observe(series, seconds, error, sql_queries, buckets=LATENCY_BUCKETS):
+    series[0] += 1
+    series[1] += seconds
+    series[2] += error
+    series[3] += sql_queries
+    series[4 + bisect_left(buckets, seconds)] += 1
+
+
+class Registry:
+    """
+    Per-process metric aggregates.
+
+    Every thread writes only to its own shard, so recording never takes a
+    lock; the shards are merged when /metrics is scraped.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()  # Only taken when a thread registers its shard
+
+    def _shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def observe(self, key, seconds, error=False, sql_queries=0):
+        shard = self._shard()
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = new_series(self.buckets)
+        observe(series, seconds, error, sql_queries, self.buckets)
+
+    def merge(self, series_by_key):
+        """Add series recorded elsewhere (e.g. during one operation) to this thread's shard."""
+        shard = self._shard()
+        for key, series in series_by_key.items():
+            total = shard.get(key)
+            if total is None:
+                shard[key] = list(series)
+            else:
+                for index, value in enumerate(series):
+                    total[index] += value
+
+    def collect(self):
+        """Merge the shards into {key: series}."""
+        with self.lock:
+            shards = list(self.shards)
+        merged = {}
+        for shard in shards:
+            for key, series in list(shard.items()):
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = list(series)
+                else:
+                    for index, value in enumerate(series):
+                        total[index] += value
+        return merged
+
+
+field_metrics = Registry()
+operation_metrics = Registry()
+
+
+DEFAULT_RESOLVERS = (attr_resolver, dict_resolver, dict_or_attr_resolver)
+
+
+def sampled_middleware(middleware):
+    """Drop MetricsMiddleware from a list of middleware unless the current operation's fields are sampled."""
+    operation = _current_operation.get()
+    if operation is not None and operation.sample_fields:
+        return middleware
+    return [item for item in middleware or () if not isinstance(item, MetricsMiddleware)]
+
+
+class ResolverMiddlewareManager(MiddlewareManager):
+    """
+    Middleware manager that leaves graphene's default attribute resolvers unwrapped.
+
+    Plain attribute reads (scalars, `edges`, `node`, ...) are most of the
+    fields of a response; skipping the middleware chain for them keeps the
+    cost of middleware proportional to the resolvers that do real work.
+    """
+    def get_field_resolver(self, field_resolver):
+        resolver = self._cached_resolvers.get(field_resolver)
+        if resolver is None:
+            if isinstance(field_resolver, partial) and field_resolver.func in DEFAULT_RESOLVERS:
+                resolver = self._cached_resolvers[field_resolver] = field_resolver
+            else:
+                resolver = super().get_field_resolver(field_resolver)
+        return resolver
+
+
+class MetricsMiddleware:
+    """
+    Graphene middleware recording latency, errors and SQL queries per field.
+
+    Fields are aggregated on the running OperationTimer and merged into
+    `field_metrics` once per operation. The SQL count of a field covers the
+    queries run by its own resolver; under the async endpoint concurrent
+    siblings may share their counts.
+
+    Only a FIELD_SAMPLE_RATE share of operations run with this middleware
+    (see sampled_middleware()), so field counts are those of the sampled
+    operations.
+    """
+    def resolve(self, next, root, info, **args):
+        operation = _current_operation.get()
+        if operation is None:
+            return next(root, info, **args)
+
+        queries = operation.sql_queries
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        except Exception:
+            operation.observe_field(info, started, queries, True)
+            raise
+        if info.is_awaitable(result):
+            return _observe_awaitable(operation, result, info, started, queries)
+        operation.observe_field(info, started, queries, False)
+        return result
+
+
+async def _observe_awaitable(operation, result, info, started, queries):
+    try:
+        value = await result
+    except Exception:
+        operation.observe_field(info, started, queries, True)
+        raise
+    operation.observe_field(info, started, queries, False)
+    return value
+
+
+class OperationTimer:
+    """
+    Measure one GraphQL operation and collect the metrics of its fields.
+    """
+    def __init__(self, operation_ast, operation_name):
+        operation_type = operation_ast.operation.value if operation_ast is not None else 'unknown'
+        if operation_name is None and operation_ast is not None and operation_ast.name is not None:
+            operation_name = operation_ast.name.value
+        if not operation_name:
+            operation_name = 'anonymous'
+        elif operation_name not in known_operations():
+            operation_name = 'other'
+        self.key = (operation_type, operation_name)
+        self.sql_queries = 0
+        self.fields = {}
+        self.token = None
+        self.sample_fields = METRICS_ENABLED and random.random() < FIELD_SAMPLE_RATE
+        if METRICS_ENABLED:
+            install_query_counter(default_connection)  # In case it was opened before this module was imported
+            self.token = _current_operation.set(self)
+        self.started = time.perf_counter()
+
+    def observe_field(self, info, started, queries, error):
+        elapsed = time.perf_counter() - started
+        key = (info.parent_type.name, info.field_name)
+        series = self.fields.get(key)
+        if series is None:
+            series = self.fields[key] = new_series()
+        # Inlined observe(): this runs for every measured field
+        series[0] += 1
+        series[1] += elapsed
+        series[2] += error
+        series[3] += self.sql_queries - queries
+        series[4 + bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def finish(self, result):
+        if self.token is None:
+            return
+        _current_operation.reset(self.token)
+        error = result is None or bool(result.errors)
+        operation_metrics.observe(self.key, time.perf_counter() - self.started, error, self.sql_queries)
+        field_metrics.merge(self.fields)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    if extra:
+        labels = f'{labels},{extra}' if labels else extra
+    return '{' + labels + '}'
+
+
+def _render(lines, prefix, help_text, label_names, registry):
+    series = sorted(registry.collect().items())
+    lines.append(f'# HELP {prefix}_duration_seconds {help_text} latency.')
+    lines.append(f'# TYPE {prefix}_duration_seconds histogram')
+    for key, values in series:
+        cumulative = 0
+        for bound, count in zip((*registry.buckets, '+Inf'), values[4:]):
+            cumulative += count
+            le = 'le="{}"'.format(bound)
+            lines.append(f'{prefix}_duration_seconds_bucket{_labels(label_names, key, le)} {cumulative}')
+        lines.append(f'{prefix}_duration_seconds_sum{_labels(label_names, key)} {values[1]:.6f}')
+        lines.append(f'{prefix}_duration_seconds_count{_labels(label_names, key)} {values[0]}')
+    lines.append(f'# HELP {prefix}_errors_total {help_text} errors.')
+    lines.append(f'# TYPE {prefix}_errors_total counter')
+    for key, values in series:
+        lines.append(f'{prefix}_errors_total{_labels(label_names, key)} {values[2]}')
+    lines.append(f'# HELP {prefix}_sql_queries_total {help_text} SQL queries.')
+    lines.append(f'# TYPE {prefix}_sql_queries_total counter')
+    for key, values in series:
+        lines.append(f'{prefix}_sql_queries_total{_labels(label_names, key)} {values[3]}')
+
+
+# psycopg_pool statistics exported per database: (metric, statistic, type, help)
+POOL_METRICS = (
+    ('db_pool_max_size', 'pool_max', 'gauge', "Maximum connections of the pool."),
+    ('db_pool_size', 'pool_size', 'gauge', "Open connections of the pool."),
+    ('db_pool_available', 'pool_available', 'gauge', "Idle connections of the pool."),
+    ('db_pool_requests_waiting', 'requests_waiting', 'gauge', "Requests waiting for a connection."),
+    ('db_pool_requests_total', 'requests_num', 'counter', "Connections requested from the pool."),
+    ('db_pool_requests_queued_total', 'requests_queued', 'counter', "Requests that waited for a connection."),
+    ('db_pool_timeouts_total', 'requests_errors', 'counter', "Requests that got no connection in time."),
+    ('db_pool_connections_lost_total', 'connections_lost', 'counter', "Connections that failed the health check."),
+)
+
+
+def _pool_stats():
+    """Return {database alias: psycopg_pool statistics} for the pooled connections of this process."""
+    stats = {}
+    for alias in connections:
+        if not connections.settings[alias].get('OPTIONS', {}).get('pool'):
+            continue
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def _render_pools(lines):
+    pools = sorted(_pool_stats().items())
+    if not pools:
+        return
+    for name, statistic, kind, help_text in POOL_METRICS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, stats in pools:
+            lines.append(f'{name}{_labels(("database",), (alias,))} {stats.get(statistic, 0)}')
+    lines.append('# HELP db_pool_wait_seconds_total Time spent waiting for a connection.')
+    lines.append('# TYPE db_pool_wait_seconds_total counter')
+    for alias, stats in pools:
+        lines.append(f'db_pool_wait_seconds_total{_labels(("database",), (alias,))} {stats.get("requests_wait_ms", 0) / 1000:.3f}')
+    lines.append('# HELP db_pool_saturation Share of the maximum pool size in use.')
+    lines.append('# TYPE db_pool_saturation gauge')
+    for alias, stats in pools:
+        in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+        saturation = in_use / stats['pool_max'] if stats.get('pool_max') else 0
+        lines.append(f'db_pool_saturation{_labels(("database",), (alias,))} {saturation:.3f}')
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's GraphQL and connection pool metrics."""
+    lines = []
+    _render(lines, 'graphql_operation', 'GraphQL operation', ('type', 'operation'), operation_metrics)
+    _render(lines, 'graphql_field', 'GraphQL resolver', ('parent_type', 'field'), field_metrics)
+    _render_pools(lines)
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
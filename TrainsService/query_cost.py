@@ -0,0 +1,154 @@
+from django.conf import settings
+from graphql import GraphQLError, OperationType, Undefined
+from graphql.language import FieldNode, FragmentSpreadNode
+from graphql.type import get_named_type, get_nullable_type, is_list_type
+from graphql.utilities import value_from_ast
+from graphql.validation import ValidationRule
+
+from Train.pagination import DEFAULT_PAGE_SIZE
+from Train.timetable import MAX_TRANSFERS
+
+# Cost budget and depth limit for one operation (can be overridden in settings.py)
+MAX_QUERY_COST = getattr(settings, 'GRAPHQL_MAX_QUERY_COST', 50000)
+MAX_QUERY_DEPTH = getattr(settings, 'GRAPHQL_MAX_QUERY_DEPTH', 10)
+# Assumed size of lists that have no `first` argument
+DEFAULT_LIST_SIZE = getattr(settings, 'GRAPHQL_DEFAULT_LIST_SIZE', DEFAULT_PAGE_SIZE)
+
+# Lists without `first` whose length is given by an argument of the field: (type, field) -> argument
+LIST_SIZE_ARGUMENTS = {
+    ('Query', 'stationSuggest'): 'limit',
+    ('Query', 'seatAvailability'): 'trainIds',
+    ('SeatMapType', 'suggestedSeats'): 'count',
+}
+# Lists with a fixed upper bound: (type, field) -> length
+LIST_SIZES = {
+    ('JourneyType', 'legs'): MAX_TRANSFERS + 1,
+}
+
+
+def _page_size(field_node, field_def, variables):
+    """Return the `first` argument of a field, or None when the field has no such argument."""
+    if 'first' not in field_def.args:
+        return None
+    for argument in field_node.arguments:
+        if argument.name.value == 'first':
+            value = value_from_ast(argument.value, field_def.args['first'].type, variables)
+            if isinstance(value, int):
+                return max(value, 0)  # A negative `first` fails at execution: it must not lower the cost of its siblings
+    return DEFAULT_PAGE_SIZE
+
+
+def _list_size(parent_type, field_node, field_def, variables):
+    """Return the upper bound of a list field without `first`, or None when it has none."""
+    key = (parent_type.name, field_node.name.value)
+    if key in LIST_SIZES:
+        return LIST_SIZES[key]
+    if key not in LIST_SIZE_ARGUMENTS:
+        return None
+    name = LIST_SIZE_ARGUMENTS[key]
+    value = field_def.args[name].default_value
+    for argument in field_node.arguments:
+        if argument.name.value == name:
+            value = value_from_ast(argument.value, field_def.args[name].type, variables)
+    if isinstance(value, int):
+        return max(value, 0)
+    if isinstance(value, list):
+        return len(value)
+    return DEFAULT_LIST_SIZE if value is Undefined else 0
+
+
+def _is_model_type(graphql_type):
+    return getattr(getattr(getattr(graphql_type, 'graphene_type', None), '_meta', None), 'model', None) is not None
+
+
+def selection_cost(context, selection_set, parent_type, multiplier, variables, page_size=None, strict=False):
+    """
+    Estimate how many field values resolving `selection_set` produces.
+
+    Every field costs 1 for each time it is resolved. A list field multiplies
+    the cost of everything below it by its expected length: the `first`
+    argument of the field (or of the connection it belongs to), the argument
+    or bound of LIST_SIZE_ARGUMENTS / LIST_SIZES, or DEFAULT_LIST_SIZE.
+
+    With `strict`, a list of model objects that has none of these raises a
+    GraphQLError: nothing bounds how many rows it loads.
+    """
+    total = 0
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name.startswith('__'):
+                continue  # Introspection fields are free
+            field_def = parent_type.fields.get(name)
+            if field_def is None:
+                continue  # Reported by the standard FieldsOnCorrectType rule
+            size = _page_size(selection, field_def, variables)
+            field_multiplier = multiplier
+            if is_list_type(get_nullable_type(field_def.type)):
+                # `first: 0` is an empty list, not the default size
+                if size is None:
+                    size = page_size
+                if size is None:
+                    size = _list_size(parent_type, selection, field_def, variables)
+                if size is None:
+                    if strict and _is_model_type(get_named_type(field_def.type)):
+                        raise GraphQLError(
+                            f"'{parent_type.name}.{name}' is a list without a 'first' argument or another "
+                            f"upper bound, so its cost cannot be estimated.",
+                            selection,
+                        )
+                    size = DEFAULT_LIST_SIZE
+                field_multiplier *= size
+                size = None
+            total += field_multiplier
+            if selection.selection_set:
+                total += selection_cost(context, selection.selection_set, get_named_type(field_def.type),
+                                        field_multiplier, variables, size, strict)
+        else:
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = context.get_fragment(selection.name.value)
+                if fragment is None:
+                    continue
+            else:
+                fragment = selection
+            fragment_type = parent_type
+            if fragment.type_condition is not None:
+                fragment_type = context.schema.get_type(fragment.type_condition.name.value) or parent_type
+            total += selection_cost(context, fragment.selection_set, fragment_type, multiplier, variables, page_size, strict)
+    return total
+
+
+def query_cost_validator(max_cost=None, operation_name=None, variables=None, callback=None):
+    """
+    Build a validation rule rejecting operations whose estimated cost exceeds `max_cost`.
+
+    `callback` receives the computed cost of the executed operation.
+    """
+    max_cost = MAX_QUERY_COST if max_cost is None else max_cost
+
+    class QueryCostValidator(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            name = node.name.value if node.name else None
+            if operation_name is not None and name != operation_name:
+                return self.SKIP
+            root_type = self.context.schema.get_root_type(node.operation)
+            if root_type is None:
+                return self.SKIP
+            try:
+                # Mutation results echo their input, which bounds their lists
+                cost = selection_cost(self.context, node.selection_set, root_type, 1, variables or {},
+                                      strict=node.operation == OperationType.QUERY)
+            except GraphQLError as error:
+                self.report_error(error)
+                return self.SKIP
+            if callable(callback):
+                callback(cost)
+            if cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"'{name or 'anonymous'}' has an estimated cost of {cost}, "
+                    f"which exceeds the maximum query cost of {max_cost}.",
+                    node,
+                ))
+            return self.SKIP
+
+    return QueryCostValidator
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from graphql import ExecutionResult, OperationType, print_ast
+from graphql.language import FieldNode, FragmentSpreadNode
+from graphql.type import get_named_type
+from Train.models import Train, Station, RailwayCompany, TrainHall
+from Train.versioning import model_versions
+from .db_router import read_database
+from .document_cache import DOCUMENT_CACHE_SIZE, query_hash
+
+RESPONSE_CACHE_ENABLED = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_ENABLED', True)
+# Lifetime of a cached response (seconds); writes that bypass the commands are visible after it
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_TIMEOUT', 300)
+# Lifetime of responses read from a replica, which may predate the versions they are stored under
+RESPONSE_CACHE_REPLICA_TIMEOUT = getattr(settings, 'GRAPHQL_RESPONSE_CACHE_REPLICA_TIMEOUT', 10)
+
+RESPONSE_KEY = 'graphql:response:{}'
+
+# Types whose data changes without a version bump (seat holds and sales): never cached
+UNCACHED_TYPES = {'SeatInventoryType', 'SeatMapType'}
+
+# Models a field reads besides the type it returns: (type, field) -> models
+FIELD_MODELS = {
+    # Filters on station, company and hall names (TrainSearchRow)
+    ('Query', 'searchTrainsByPlace'): (Train, Station, RailwayCompany, TrainHall),
+    # Ranked by the number of trains per station
+    ('Query', 'stationSuggest'): (Station, Train),
+}
+
+
+def _dependencies(schema, document, operation_ast):
+    """
+    Return the models the operation's selection reads (from the
+    DjangoObjectTypes it selects and FIELD_MODELS), or None if it cannot be
+    cached.
+    """
+    fragments = {
+        definition.name.value: definition for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    models = set()
+
+    def visit(selection_set, parent_type):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_def = parent_type.fields.get(selection.name.value)
+                if field_def is None:
+                    continue  # Introspection fields
+                field_type = get_named_type(field_def.type)
+                if field_type.name in UNCACHED_TYPES:
+                    return False
+                models.update(FIELD_MODELS.get((parent_type.name, selection.name.value), ()))
+                model = getattr(getattr(getattr(field_type, 'graphene_type', None), '_meta', None), 'model', None)
+                if model is not None:
+                    models.add(model)
+                if selection.selection_set and not visit(selection.selection_set, field_type):
+                    return False
+            else:
+                fragment = fragments.get(selection.name.value) if isinstance(selection, FragmentSpreadNode) else selection
+                if fragment is None:
+                    continue
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = schema.get_type(fragment.type_condition.name.value) or parent_type
+                if not visit(fragment.selection_set, fragment_type):
+                    return False
+        return True
+
+    if not visit(operation_ast.selection_set, schema.query_type):
+        return None
+    return tuple(sorted(models, key=lambda model: model._meta.label))
+
+
+class ResponseCache:
+    """
+    Cache of query results in Django's cache, shared by every worker using
+    the same backend.
+
+    Entries are keyed by the normalised document, the operation name, the
+    variables and the current versions of the models the selection reads;
+    the Create/Update/Delete commands bump those versions, so a write makes
+    every response that depends on it unreachable. Mutations, and queries
+    selecting seat inventory, are never cached.
+    """
+    def __init__(self, maxsize=DOCUMENT_CACHE_SIZE, enabled=RESPONSE_CACHE_ENABLED):
+        self.enabled = enabled
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.plans = OrderedDict()  # {(schema, query hash, operation name): (document hash, models) or None}
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def _plan(self, schema, query, document, operation_ast, operation_name):
+        key = (id(schema), query_hash(query), operation_name)
+        with self.lock:
+            if key in self.plans:
+                self.plans.move_to_end(key)
+                return self.plans[key]
+        plan = None
+        models = _dependencies(schema, document, operation_ast)
+        if models is not None:
+            plan = (query_hash(print_ast(document)), models)
+        with self.lock:
+            self.plans[key] = plan
+            while len(self.plans) > self.maxsize:
+                self.plans.popitem(last=False)
+        return plan
+
+    def lookup(self, schema, query, document, operation_ast, operation_name, variables):
+        """
+        Return (cache key, cached ExecutionResult or None); the key is None
+        when the operation must not be cached.
+        """
+        if not self.enabled or operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None, None
+        plan = self._plan(schema, query, document, operation_ast, operation_name)
+        if plan is None:
+            with self.lock:
+                self.bypasses += 1
+            return None, None
+        document_hash, models = plan
+        key = hashlib.sha256(json.dumps(
+            [document_hash, operation_name, variables or {}, model_versions(*models)],
+            sort_keys=True, default=str,
+        ).encode('utf-8')).hexdigest()
+        data = cache.get(RESPONSE_KEY.format(key))
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return key, (ExecutionResult(data=data) if data is not None else None)
+
+    def store(self, key, result):
+        """Cache a successful result; call it inside the operation's replica_reads block."""
+        if key is None or result.errors or result.data is None:
+            return
+        replica = read_database() not in (None, DEFAULT_DB_ALIAS)
+        timeout = RESPONSE_CACHE_REPLICA_TIMEOUT if replica else RESPONSE_CACHE_TIMEOUT
+        cache.set(RESPONSE_KEY.format(key), result.data, timeout)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypasses': self.bypasses,
+            }
+
+
+# Shared instance for this process
+response_cache = ResponseCache()
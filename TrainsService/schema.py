@@ -10,4 +10,13 @@ class Mutation(Train.schema.Mutation, graphene.ObjectType):
     pass
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema = graphene.Schema(query=Query, mutation=Mutation)
+
+
+class AsyncQuery(Train.schema.AsyncQuery, graphene.ObjectType):
+    class Meta:
+        name = 'Query'
+
+
+# Schema for the async endpoint: async query resolvers, same types and mutations
+async_schema = graphene.Schema(query=AsyncQuery, mutation=Mutation)
@@ -89,12 +89,73 @@ DATABASES = {
     }
 }
 
+# Connection pooling: با psycopg 3 هر worker یک pool محدود از اتصال‌ها دارد (سازگار با WSGI و ASGI)
+# بدون psycopg_pool اتصال‌ها پایدار می‌مانند و پیش از استفاده‌ی دوباره بررسی می‌شوند
+try:
+    import psycopg_pool
+except ImportError:
+    psycopg_pool = None
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'True') == 'True' and psycopg_pool is not None
+if DATABASE_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10.0)),  # حداکثر انتظار برای اتصال آزاد (ثانیه)
+            'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 300.0)),
+            'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 3600.0)),
+            'check': psycopg_pool.ConnectionPool.check_connection,  # health check هنگام تحویل اتصال
+        },
+    }
+else:
+    # اتصال پایدار در ASGI امن نیست (asgi.py مقدار 0 را پیش‌فرض می‌کند)
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas: کوئری‌های GraphQL از replicaها خوانده می‌شوند و mutationها روی primary اجرا می‌شوند
+# DATABASE_REPLICA_HOSTS با کاما جدا می‌شود، مثلا replica1:5432,replica2 (برای SQLite مسیر فایل‌ها)
+DATABASE_REPLICAS = []
+for _index, _address in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    _replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if _replica['ENGINE'].endswith('sqlite3'):
+        _replica['NAME'] = _address
+    else:
+        _replica['HOST'], _, _replica['PORT'] = _address.partition(':')
+    DATABASES[f'replica{_index}'] = _replica
+    DATABASE_REPLICAS.append(f'replica{_index}')
+DATABASE_ROUTERS = ['TrainsService.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', 5.0))  # ثانیه
+DATABASE_REPLICA_CHECK_INTERVAL = float(os.environ.get('DATABASE_REPLICA_CHECK_INTERVAL', 5.0))
+DATABASE_REPLICA_STICKY_SECONDS = float(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 10.0))  # خواندن از primary بعد از mutation
+
+# Cache
+# در محیط production باید یک backend مشترک (مثلا Redis) تنظیم شود تا همه‌ی workerها نسخه‌ها را ببینند
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'trains-service'),
+    }
+}
+
 # ELASTICSEARCH_DSL = {
 #     'default': {
 #         'hosts': ['localhost:9200'],
 #     },
 # }
 
+# Search backend (همگام‌سازی از طریق جدول outbox و دستور drain_search_outbox)
+ELASTICSEARCH_HOSTS = os.environ.get('ELASTICSEARCH_HOSTS', 'http://localhost:9200').split(',')
+
+SEARCH_BACKEND = {
+    'BACKEND': os.environ.get('SEARCH_BACKEND', 'Train.search_backend.ElasticsearchBackend'),
+    'OPTIONS': {},
+}
+
+SEARCH_OUTBOX_BATCH_SIZE = int(os.environ.get('SEARCH_OUTBOX_BATCH_SIZE', 500))
+SEARCH_OUTBOX_POLL_INTERVAL = float(os.environ.get('SEARCH_OUTBOX_POLL_INTERVAL', 1.0))
+# rebuild ثبت شده‌ای که قدیمی‌تر از این باشد رها شده فرض می‌شود (ثانیه)
+SEARCH_REBUILD_TIMEOUT = int(os.environ.get('SEARCH_REBUILD_TIMEOUT', 24 * 3600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -115,10 +176,64 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# ثبت متریک‌های هر resolver و هر عملیات GraphQL (در مسیر /metrics)
+GRAPHQL_METRICS_ENABLED = os.environ.get('GRAPHQL_METRICS_ENABLED', 'True') == 'True'
+# سهم عملیات‌هایی که متریک resolverهایشان ثبت می‌شود، و نام عملیات‌هایی (جدا شده با کاما) که برچسب خودشان را می‌گیرند
+# (به‌جز نام‌های فایل persisted queries)؛ بقیه با برچسب other ثبت می‌شوند
+GRAPHQL_METRICS_FIELD_SAMPLE_RATE = float(os.environ.get('GRAPHQL_METRICS_FIELD_SAMPLE_RATE', 0.1))
+GRAPHQL_METRICS_OPERATIONS = [name for name in os.environ.get('GRAPHQL_METRICS_OPERATIONS', '').split(',') if name]
+
 GRAPHENE = {
     'SCHEMA': 'FlightsService.schema.schema',
+    'MIDDLEWARE': ['TrainsService.metrics.MetricsMiddleware'] if GRAPHQL_METRICS_ENABLED else [],
 }
 
+# حداکثر و پیش‌فرض تعداد آیتم‌ها در هر صفحه از کوئری‌های لیستی
+GRAPHQL_DEFAULT_PAGE_SIZE = int(os.environ.get('GRAPHQL_DEFAULT_PAGE_SIZE', 50))
+GRAPHQL_MAX_PAGE_SIZE = int(os.environ.get('GRAPHQL_MAX_PAGE_SIZE', 500))
+
+# محدودیت عمق و هزینه‌ی تخمینی هر کوئری GraphQL
+GRAPHQL_MAX_QUERY_DEPTH = int(os.environ.get('GRAPHQL_MAX_QUERY_DEPTH', 10))
+GRAPHQL_MAX_QUERY_COST = int(os.environ.get('GRAPHQL_MAX_QUERY_COST', 50000))
+
+# کش اسناد parse و validate شده و persisted queries
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.environ.get('GRAPHQL_DOCUMENT_CACHE_SIZE', 1000))
+GRAPHQL_PERSISTED_QUERIES_FILE = os.environ.get('GRAPHQL_PERSISTED_QUERIES_FILE')  # فایل JSON به شکل {sha256: query}
+GRAPHQL_PERSISTED_QUERIES_ONLY = os.environ.get('GRAPHQL_PERSISTED_QUERIES_ONLY', 'False') == 'True'
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = int(os.environ.get('GRAPHQL_PERSISTED_QUERY_TIMEOUT', 24 * 3600))  # مدت نگهداری کوئری‌های ثبت شده در زمان اجرا (ثانیه)
+
+# کش پاسخ کوئری‌ها در CACHES: مدت اعتبار پاسخ‌ها و پاسخ‌هایی که از replica خوانده شده‌اند (ثانیه)
+GRAPHQL_RESPONSE_CACHE_ENABLED = os.environ.get('GRAPHQL_RESPONSE_CACHE_ENABLED', 'True') == 'True'
+GRAPHQL_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('GRAPHQL_RESPONSE_CACHE_TIMEOUT', 300))
+GRAPHQL_RESPONSE_CACHE_REPLICA_TIMEOUT = int(os.environ.get('GRAPHQL_RESPONSE_CACHE_REPLICA_TIMEOUT', 10))
+
+# snapshot درون‌حافظه‌ای ایستگاه‌ها، شرکت‌ها و سالن‌ها (ثانیه)
+REFERENCE_DATA_CHECK_INTERVAL = float(os.environ.get('REFERENCE_DATA_CHECK_INTERVAL', 1.0))
+REFERENCE_DATA_MAX_AGE = float(os.environ.get('REFERENCE_DATA_MAX_AGE', 60.0))
+
+# فاصله‌ی بازشماری محبوبیت ایستگاه‌ها (تعداد قطارها) برای پیشنهاد ایستگاه (ثانیه)
+STATION_SUGGEST_POPULARITY_INTERVAL = float(os.environ.get('STATION_SUGGEST_POPULARITY_INTERVAL', 600.0))
+
+# تعداد ردیف‌ها در هر INSERT برای ایجاد گروهی قطارها
+TRAIN_BULK_CHUNK_SIZE = int(os.environ.get('TRAIN_BULK_CHUNK_SIZE', 1000))
+
+# مدت اعتبار رزرو موقت صندلی (ثانیه)، بیشترین مدتی که کاربر می‌تواند بخواهد، و تعداد رزروهای منقضی آزادشده در هر تراکنش
+SEAT_HOLD_TTL = int(os.environ.get('SEAT_HOLD_TTL', 600))
+SEAT_HOLD_MAX_TTL = int(os.environ.get('SEAT_HOLD_MAX_TTL', 3600))
+SEAT_HOLD_SWEEP_BATCH_SIZE = int(os.environ.get('SEAT_HOLD_SWEEP_BATCH_SIZE', 1000))
+
+# جدول زمانی درون‌حافظه‌ای مسیریاب سفر: فاصله‌ی بررسی تغییرات و مدت نگهداری تغییرات (ثانیه)
+TIMETABLE_CHECK_INTERVAL = float(os.environ.get('TIMETABLE_CHECK_INTERVAL', 1.0))
+TIMETABLE_CHANGE_RETENTION = int(os.environ.get('TIMETABLE_CHANGE_RETENTION', 3600))
+
+# تعداد thread های ساخت نسخه‌های کوچک لوگوی شرکت‌ها در هر پروسه و کیفیت WebP آن‌ها
+LOGO_WORKERS = int(os.environ.get('LOGO_WORKERS', 2))
+LOGO_QUALITY = int(os.environ.get('LOGO_QUALITY', 80))
+
+# خروجی جریانی جدول زمانی (/export/trains): توکن Bearer اختیاری و تعداد ردیف در هر بار خواندن از cursor
+TIMETABLE_EXPORT_TOKEN = os.environ.get('TIMETABLE_EXPORT_TOKEN')
+TIMETABLE_EXPORT_CHUNK_SIZE = int(os.environ.get('TIMETABLE_EXPORT_CHUNK_SIZE', 2000))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -19,16 +19,22 @@ from django.urls import path
 from django.urls import path
 from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
-from .schema import schema
+from .schema import schema, async_schema
 from django.shortcuts import redirect
-from graphene_file_upload.django import FileUploadGraphQLView
+from .views import TrainsGraphQLView, AsyncTrainsGraphQLView, graphql_cache_stats
+from .metrics import metrics_view
+from Train.views import export_trains
 from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
     path('', lambda request: redirect('/admin/')),
     path('admin/', admin.site.urls),
-    path("graphql/", csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/", csrf_exempt(TrainsGraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/async/", csrf_exempt(AsyncTrainsGraphQLView.as_view(schema=schema, async_schema=async_schema))),
+    path("graphql/cache-stats/", graphql_cache_stats),
+    path("metrics", metrics_view),
+    path("export/trains", export_trains),
 ]
 urlpatterns.extend(static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT))
 
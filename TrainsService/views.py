@@ -0,0 +1,312 @@
+import inspect
+import json
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from graphene.validation import depth_limit_validator
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import HttpError
+from graphene_file_upload.django import FileUploadGraphQLView
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate, validate_schema
+from graphql.validation import specified_rules
+from .db_router import is_sticky, replica_reads, stick_to_primary
+from .document_cache import document_cache, persisted_queries, query_hash
+from .metrics import OperationTimer, ResolverMiddlewareManager, sampled_middleware
+from .response_cache import response_cache
+from .query_cost import query_cost_validator, MAX_QUERY_COST, MAX_QUERY_DEPTH
+
+
+class TrainsGraphQLView(FileUploadGraphQLView):
+    """
+    GraphQL endpoint with depth limiting, query cost analysis, a parsed
+    document cache and persisted queries.
+
+    Operations deeper than GRAPHQL_MAX_QUERY_DEPTH or costlier than
+    GRAPHQL_MAX_QUERY_COST are rejected before execution, and the computed
+    cost is returned in `extensions.cost`.
+
+    Queries read from a replica (see db_router.py) unless the client ran a
+    mutation in the last DATABASE_REPLICA_STICKY_SECONDS seconds, and their
+    results are cached (see response_cache.py).
+    """
+    max_query_cost = MAX_QUERY_COST
+    max_query_depth = MAX_QUERY_DEPTH
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if getattr(request, 'graphql_mutation', False):
+            stick_to_primary(response)
+        return response
+
+    @staticmethod
+    def use_replica(request, operation_ast):
+        """Whether the operation may read from a replica; marks mutations for the sticky cookie."""
+        if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+            request.graphql_mutation = True
+            return False
+        return not is_sticky(request)
+
+    def get_static_validation_rules(self):
+        # Rules that do not depend on variables: their result is cached with the document
+        return (*specified_rules, depth_limit_validator(max_depth=self.max_query_depth))
+
+    @staticmethod
+    def get_persisted_query_hash(request, data):
+        extensions = data.get('extensions') or request.GET.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are not valid JSON."))
+        if not isinstance(extensions, dict):
+            return None
+        return (extensions.get('persistedQuery') or {}).get('sha256Hash')
+
+    def resolve_query(self, request, data, query):
+        """Return the query text, resolving persisted queries (new ones are registered once they validate)."""
+        sha256_hash = self.get_persisted_query_hash(request, data)
+        if sha256_hash:
+            if query:
+                persisted_queries.check(sha256_hash, query)
+                request.graphql_persisted_hash = sha256_hash
+                return query
+            query = persisted_queries.lookup(sha256_hash)
+            if query is None:
+                raise GraphQLError("PersistedQueryNotFound")
+            return query
+        if query and persisted_queries.only and query_hash(query) not in persisted_queries.allowlist:
+            raise GraphQLError("Only persisted queries are allowed.")
+        return query
+
+    def prepare_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        Resolve, parse and validate the request.
+
+        Returns (document, operation_ast, None) when the operation can run, or
+        (None, None, result) with the ExecutionResult (or None for GraphiQL) to answer with.
+        """
+        try:
+            query = self.resolve_query(request, data, query)
+        except GraphQLError as error:
+            return None, None, ExecutionResult(errors=[error])
+
+        if not query:
+            if show_graphiql:
+                return None, None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+        request.graphql_query = query
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return None, None, ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, validation_errors = document_cache.get(schema, query, self.get_static_validation_rules())
+        if document is None or validation_errors:
+            return None, None, ExecutionResult(data=None, errors=validation_errors)
+        persisted_hash = getattr(request, 'graphql_persisted_hash', None)
+        if persisted_hash:
+            persisted_queries.register(persisted_hash, query)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None, None, None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        def record_cost(cost):
+            request.graphql_query_cost = cost
+
+        # The cost depends on variables (`first`), so it is checked for every request
+        validation_errors = validate(schema, document, [
+            query_cost_validator(self.max_query_cost, operation_name, variables, callback=record_cost)
+        ])
+        if validation_errors:
+            return None, None, ExecutionResult(data=None, errors=validation_errors)
+        return document, operation_ast, None
+
+    def get_middleware(self, request):
+        middleware = sampled_middleware(super().get_middleware(request))
+        return ResolverMiddlewareManager(*middleware) if middleware else None
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        document, operation_ast, result = self.prepare_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if document is None:
+            return result
+
+        timer = OperationTimer(operation_ast, operation_name)
+        try:
+            cache_key, result = response_cache.lookup(
+                self.schema.graphql_schema, request.graphql_query, document, operation_ast, operation_name, variables
+            )
+            if result is None:
+                with replica_reads(self.use_replica(request, operation_ast)):
+                    result = self.execute_document(request, document, operation_ast, variables, operation_name)
+                    response_cache.store(cache_key, result)
+        finally:
+            timer.finish(result)  # Also resets the current operation when the cache raises
+        return result
+
+    def execute_document(self, request, document, operation_ast, variables, operation_name):
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def json_encode(self, request, d, pretty=False):
+        cost = getattr(request, 'graphql_query_cost', None)
+        if cost is not None:
+            d.setdefault('extensions', {})['cost'] = {'estimated': cost, 'maximum': self.max_query_cost}
+        return super().json_encode(request, d, pretty)
+
+
+class AsyncTrainsGraphQLView(TrainsGraphQLView):
+    """
+    Async GraphQL endpoint for ASGI servers (e.g. uvicorn).
+
+    Queries run against `async_schema`, whose resolvers use Django's async
+    ORM; the executor awaits independent sibling fields concurrently, and no
+    thread is held while a query waits on the database. Mutations keep their
+    synchronous command handlers and run in a worker thread.
+    """
+    async_schema = None
+
+    def __init__(self, async_schema=None, **kwargs):
+        kwargs.setdefault('graphiql', False)
+        super().__init__(**kwargs)
+        self.async_schema = async_schema or self.async_schema
+        assert self.async_schema is not None, "An async schema is required for AsyncTrainsGraphQLView."
+
+    async def get(self, request, *args, **kwargs):
+        return await self.dispatch(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.dispatch(request, *args, **kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+            data = self.parse_body(request)
+            result, status_code = await self.get_response_async(request, data)
+            response = HttpResponse(status=status_code, content=result, content_type="application/json")
+            if getattr(request, 'graphql_mutation', False):
+                stick_to_primary(response)
+            return response
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.execute_graphql_request_async(request, data, query, variables, operation_name)
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        return self.json_encode(request, response), status_code
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        # Persisted queries and the response cache read and write Django's cache: keep that
+        # I/O off the event loop (as the cache's own aget()/aset() do)
+        document, operation_ast, result = await sync_to_async(self.prepare_request, thread_sensitive=False)(
+            request, data, query, variables, operation_name
+        )
+        if document is None:
+            return result
+
+        timer = OperationTimer(operation_ast, operation_name)
+        try:
+            cache_key, result = await sync_to_async(response_cache.lookup, thread_sensitive=False)(
+                self.async_schema.graphql_schema, request.graphql_query, document, operation_ast, operation_name, variables
+            )
+            if result is None:
+                with replica_reads(self.use_replica(request, operation_ast)):
+                    result = await self.execute_document_async(request, document, operation_ast, variables, operation_name)
+                    await sync_to_async(response_cache.store, thread_sensitive=False)(cache_key, result)
+        finally:
+            timer.finish(result)  # Also resets the current operation when the cache raises
+        return result
+
+    async def execute_document_async(self, request, document, operation_ast, variables, operation_name):
+        try:
+            if operation_ast is not None and operation_ast.operation == OperationType.MUTATION:
+                # Mutations run serially anyway; keep them on the sync schema and command handlers
+                request.graphql_async = False
+                execute_options = self.get_execute_options(request, variables, operation_name)
+                return await sync_to_async(execute)(self.schema.graphql_schema, document, **execute_options)
+
+            request.graphql_async = True
+            execute_options = self.get_execute_options(request, variables, operation_name)
+            result = execute(self.async_schema.graphql_schema, document, **execute_options)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def graphql_cache_stats(request):
+    """Hit and miss counters of the document cache, persisted queries and response cache (this process)."""
+    return JsonResponse({
+        'documents': document_cache.stats(),
+        'persisted_queries': persisted_queries.stats(),
+        'responses': response_cache.stats(),
+    })
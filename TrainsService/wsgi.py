@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TrainsService.settings')
 
 application = get_wsgi_application()
+
+# Fail at startup rather than silently skip replicas the database user cannot monitor
+from TrainsService.db_router import check_replicas  # Reads the settings
+
+check_replicas()